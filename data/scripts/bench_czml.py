@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Benchmark build_czml.py on seeded synthetic projects.
+
+For each scale N a project is generated into a scratch directory:
+
+  buildings_1650.json   - N / 10 parametric buildings of every GENERATORS
+                          type, a third with per-period "maps" overrides
+                          (with --designs K, each type's dimensions come from
+                          K repeated designs, like a town of terraced houses)
+  buildings/*.json      - N / 100 custom buildings (at least one)
+  unified_sites.geojson - N reference features (points, lines, multi-lines
+                          and polygons) from the entity_styles sources
+  sites.json            - N / 10 curated sites
+
+and then built in a fresh Python process, timing each stage separately
+(load_project_config, expand_buildings, process_unified_sites,
+process_sites, serialization) plus an end-to-end `build` (what
+build_czml.py --no-cache does). Every stage records wall and CPU time,
+peak RSS, packets and output bytes.
+
+Usage:
+    python scripts/bench_czml.py                         # 1k, 10k, 100k
+    python scripts/bench_czml.py --scales 1k,1M --output bench.json
+    python scripts/bench_czml.py --baseline bench.json   # exit 1 on regressions
+    python scripts/bench_czml.py --scales 100k --designs 20  # repeated building types
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import build_czml as bc
+
+DEFAULT_SCALES = (1_000, 10_000, 100_000)
+
+# Time and memory may grow this much over the baseline before a regression is
+# flagged; differences under the noise floor are ignored
+REGRESSION_TOLERANCE = 0.2
+WALL_NOISE_FLOOR = 0.05  # seconds
+RSS_NOISE_FLOOR = 10  # MB
+
+# Synthetic projects sit in the example project's bounds
+BOUNDS = {"west": -2.75, "south": 53.35, "east": -1.90, "north": 53.70}
+
+MATERIALS = ["wall", "stone", "timber"]
+CUSTOM_MATERIALS = ["wall", "roof", "tower", "stone", "timber"]
+CURATED_LAYERS = ["roman", "medieval", "ownership"]
+
+# Parameters per generator type: name -> (low, high)
+GENERATOR_PARAMS = {
+    "house": {"length": (5, 25), "width": (4, 12), "height": (4, 14)},
+    "church": {"naveLength": (25, 60), "naveWidth": (10, 35), "naveHeight": (10, 20),
+               "towerSize": (6, 12), "towerHeight": (20, 45), "aisleWidth": (3, 8)},
+    "neoclassical_church": {"naveLength": (20, 40), "naveWidth": (10, 20), "naveHeight": (8, 15),
+                            "towerSize": (5, 10), "towerHeight": (15, 30),
+                            "wingDepth": (3, 6), "wingWidth": (4, 8)},
+    "chapel": {"length": (10, 20), "width": (6, 10), "height": (5, 9), "towerHeight": (8, 14)},
+    "bridge": {"span": (20, 80), "width": (4, 8), "height": (5, 10), "numArches": (2, 7)},
+    "courtyard": {"length": (30, 60), "width": (25, 50), "wingDepth": (6, 10), "height": (8, 14)},
+}
+
+
+def parse_scale(value):
+    """'1k' -> 1000, '1M' -> 1000000."""
+    units = {"k": 1_000, "m": 1_000_000}
+    value = value.strip()
+    if value[-1:].lower() in units:
+        return int(float(value[:-1]) * units[value[-1].lower()])
+    return int(value)
+
+
+def format_scale(n):
+    for unit, size in (("M", 1_000_000), ("k", 1_000)):
+        if n >= size and n % size == 0:
+            return f"{n // size}{unit}"
+    return str(n)
+
+
+# =============================================================================
+# Synthetic Project
+# =============================================================================
+
+def random_point(rng):
+    return [round(rng.uniform(BOUNDS["west"], BOUNDS["east"]), 6),
+            round(rng.uniform(BOUNDS["south"], BOUNDS["north"]), 6)]
+
+
+def random_years(rng):
+    start = rng.randint(0, 1900)
+    return start, rng.choice([2100, min(2100, start + rng.randint(10, 400))])
+
+
+def random_ring(rng, center, radius_deg, vertices):
+    ring = []
+    for k in range(vertices):
+        angle = 2 * math.pi * k / vertices
+        r = radius_deg * rng.uniform(0.6, 1.0)
+        ring.append([round(center[0] + r * math.cos(angle), 7), round(center[1] + r * math.sin(angle) * 0.6, 7)])
+    return ring + [ring[0]]
+
+
+def map_overrides(rng, building, periods):
+    """Per-period position overrides like the hand-fitted ones in buildings_1650.json."""
+    maps = {}
+    for period in rng.sample(periods, rng.randint(1, min(3, len(periods)))):
+        cx, cy = building["center"]
+        override = {"center": [round(cx + rng.uniform(-3e-4, 3e-4), 6), round(cy + rng.uniform(-2e-4, 2e-4), 6)]}
+        if rng.random() < 0.5:
+            override["rotation"] = building["rotation"] + rng.uniform(-20, 20)
+        if rng.random() < 0.3:
+            override["scale"] = round(rng.uniform(0.7, 1.5), 2)
+        maps[period] = override
+    return maps
+
+
+def make_designs(rng, count):
+    """`count` sets of dimensions per generator type, for projects of repeated buildings."""
+    return {kind: [{name: rng.randint(low, high) for name, (low, high) in params.items()}
+                   for _ in range(count)]
+            for kind, params in GENERATOR_PARAMS.items()}
+
+
+def make_building(rng, i, kind, periods, designs=None):
+    start, stop = random_years(rng)
+    building = {
+        "id": f"bench_{kind}_{i}",
+        "name": f"Bench {kind.replace('_', ' ').title()} {i}",
+        "type": kind,
+        "center": random_point(rng),
+        "rotation": rng.choice([0, -15, 30, 45, 90, rng.uniform(-180, 180)]),
+        "material": rng.choice(MATERIALS),
+        "startYear": start,
+        "endYear": stop,
+    }
+    if designs and kind in designs:
+        building.update(rng.choice(designs[kind]))
+    else:
+        for name, (low, high) in GENERATOR_PARAMS.get(kind, {}).items():
+            building[name] = rng.randint(low, high)
+    if rng.random() < 1 / 3:
+        building["maps"] = map_overrides(rng, building, periods)
+    return building
+
+
+def make_custom_building(rng, i, periods):
+    building = make_building(rng, i, "custom", periods)
+    building["maps"] = map_overrides(rng, building, periods)
+    building["entities"] = [
+        {
+            "id": f"{building['id']}_part_{k}",
+            "name": f"{building['name']} - Part {k + 1}",
+            "type": "polygon",
+            "coords": random_ring(rng, building["center"], 2e-4, rng.randint(4, 12))[:-1],
+            "height": 0,
+            "extrudedHeight": rng.randint(3, 20),
+            "material": rng.choice(CUSTOM_MATERIALS),
+        }
+        for k in range(rng.randint(1, 6))
+    ]
+    return building
+
+
+def make_feature(rng, i, sources):
+    start, stop = random_years(rng)
+    center = random_point(rng)
+    kind = rng.random()
+    if kind < 0.4:
+        geometry = {"type": "Point", "coordinates": center}
+    elif kind < 0.65:
+        steps = rng.randint(2, 40)
+        geometry = {"type": "LineString", "coordinates": [
+            [round(center[0] + k * 2e-4, 7), round(center[1] + rng.uniform(-1e-4, 1e-4) + k * 1e-4, 7)]
+            for k in range(steps)]}
+    elif kind < 0.75:
+        geometry = {"type": "MultiLineString", "coordinates": [
+            [[round(center[0] + j * 1e-3 + k * 2e-4, 7), round(center[1] + k * 1e-4, 7)] for k in range(rng.randint(2, 10))]
+            for j in range(rng.randint(2, 4))]}
+    else:
+        geometry = {"type": "Polygon", "coordinates": [random_ring(rng, center, 5e-4, rng.randint(4, 60))]}
+    return {
+        "type": "Feature",
+        "properties": {"name": f"Feature {i}", "source": rng.choice(sources),
+                       "start_year": start, "end_year": stop},
+        "geometry": geometry,
+    }
+
+
+def write_feature_collection(path, features):
+    """Stream features into a FeatureCollection without holding them in memory."""
+    with open(path, "w") as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for n, feature in enumerate(features):
+            if n:
+                f.write(",\n")
+            f.write(json.dumps(feature))
+        f.write("\n]}\n")
+
+
+def generate_project(out_dir, scale, seed=0, designs=None):
+    """Write a synthetic project for `scale` into out_dir; return input counts and bytes."""
+    rng = random.Random(seed)
+    out_dir = Path(out_dir)
+    (out_dir / "buildings").mkdir(parents=True, exist_ok=True)
+
+    template = json.loads(bc.PROJECT_FILE.read_text()) if bc.PROJECT_FILE.exists() else {}
+    project = {**template, "name": f"Benchmark {format_scale(scale)}", "bounds": BOUNDS,
+               "entities": "entities.czml"}
+    project.setdefault("mapPeriods", bc.DEFAULT_MAP_PERIODS)
+    (out_dir / "project.json").write_text(json.dumps(project, indent=2))
+    periods = [p["id"] for p in project["mapPeriods"]]
+
+    styles = bc.load_json(bc.ENTITY_STYLES_FILE) or {"groups": {}, "layers": {}}
+    (out_dir / "entity_styles.json").write_text(json.dumps(styles, indent=2))
+    sources = sorted({layer["source"] for layer in styles.get("layers", {}).values() if "source" in layer}) or ["he"]
+
+    kinds = sorted(bc.GENERATORS)
+    n_buildings = scale // 10
+    patterns = make_designs(random.Random(seed), designs) if designs else None
+    buildings = [make_building(rng, i, kinds[i % len(kinds)], periods, patterns) for i in range(n_buildings)]
+    (out_dir / "buildings_1650.json").write_text(json.dumps({"buildings": buildings}))
+
+    n_custom = max(1, scale // 100)
+    for i in range(n_custom):
+        (out_dir / "buildings" / f"bench_custom_{i}.json").write_text(
+            json.dumps(make_custom_building(rng, i, periods)))
+
+    write_feature_collection(out_dir / "unified_sites.geojson",
+                             (make_feature(rng, i, sources) for i in range(scale)))
+
+    n_sites = scale // 10
+    sites = []
+    for i in range(n_sites):
+        feature = make_feature(rng, i, ["curated"])
+        feature["properties"]["layer"] = rng.choice(CURATED_LAYERS)
+        sites.append(feature)
+    (out_dir / "sites.json").write_text(json.dumps({"type": "FeatureCollection", "features": sites}))
+
+    size = sum(p.stat().st_size for p in out_dir.rglob("*") if p.is_file())
+    return {"buildings": n_buildings, "custom_buildings": n_custom, "features": scale,
+            "sites": n_sites, "bytes": size}
+
+
+# =============================================================================
+# Measurement
+# =============================================================================
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux); elsewhere peaks are cumulative."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+class Stage:
+    """Time a block: wall and CPU seconds, peak RSS, and packets/bytes it reports.
+
+    Time added to `excluded_wall`/`excluded_cpu` (serialization, see consume)
+    is left out of the stage's own figures.
+    """
+
+    def __init__(self, results, name):
+        self.results = results
+        self.name = name
+        self.packets = 0
+        self.bytes = 0
+        self.excluded_wall = 0.0
+        self.excluded_cpu = 0.0
+
+    def __enter__(self):
+        reset_peak_rss()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall - self.excluded_wall
+        self.results[self.name] = {
+            "wall_s": round(wall, 4),
+            "cpu_s": round(time.process_time() - self.cpu - self.excluded_cpu, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "packets_per_s": round(self.packets / wall) if wall and self.packets else None,
+        }
+        return False
+
+
+def consume(stage, packets, serialization):
+    """Drain a packet generator, timing serialization apart from generation."""
+    for packet in packets:
+        wall, cpu = time.perf_counter(), time.process_time()
+        text = bc.serialize_packet(packet)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stage.excluded_wall += wall
+        stage.excluded_cpu += cpu
+        serialization["wall_s"] += wall
+        serialization["cpu_s"] += cpu
+        stage.packets += 1
+        stage.bytes += len(text.encode())
+    serialization["packets"] += stage.packets
+    serialization["bytes"] += stage.bytes
+
+
+def expand_batches(buildings, default_color, config):
+    """Yield every building's packets, expanded in the build's batches (see batched_producers)."""
+    for start in range(0, len(buildings), bc.BUILDING_BATCH_SIZE):
+        for packets in bc.expand_buildings(buildings[start:start + bc.BUILDING_BATCH_SIZE], default_color, config):
+            yield from packets
+
+
+def run_stages(project_dir):
+    """Run each build stage against a generated project; return {stage: measurements}."""
+    bc.use_project_dir(project_dir, Path(project_dir) / "unified_sites.geojson")
+    results = {}
+    serialization = {"wall_s": 0.0, "cpu_s": 0.0, "packets": 0, "bytes": 0}
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    with quiet:
+        with Stage(results, "load_project_config"):
+            project_config = bc.load_project_config()
+            layers_config = bc.load_layers_config()
+            config = bc.make_build_config(project_config)
+
+        buildings = (bc.load_json(bc.BUILDINGS_1650_FILE) or {}).get("buildings", [])
+        buildings += [bc.load_custom_building(p) for p in sorted(bc.BUILDINGS_DIR.glob("*.json"))]
+        default_color = bc.hex_to_rgba(layers_config["entities3d_color"])
+        with Stage(results, "expand_buildings") as stage:
+            consume(stage, expand_batches([b for b in buildings if b is not None], default_color, config),
+                    serialization)
+        templates = bc.FOOTPRINT_TEMPLATES.stats()
+        lookups = templates["hits"] + templates["misses"]
+        results["expand_buildings"]["template_hit_rate"] = round(templates["hits"] / lookups, 4) if lookups else None
+        start = 1 + stage.packets
+
+        with Stage(results, "process_unified_sites") as stage:
+            consume(stage, bc.process_unified_sites(
+                bc.iter_geojson_features(bc.UNIFIED_FILE), layers_config["source_to_style"], start), serialization)
+        start += stage.packets
+
+        with Stage(results, "process_sites") as stage:
+            consume(stage, bc.process_sites(bc.load_json(bc.SITES_FILE), layers_config, start), serialization)
+
+        wall = serialization["wall_s"]
+        results["serialization"] = {
+            "wall_s": round(wall, 4),
+            "cpu_s": round(serialization["cpu_s"], 4),
+            "packets": serialization["packets"],
+            "bytes": serialization["bytes"],
+            "packets_per_s": round(serialization["packets"] / wall) if wall else None,
+        }
+
+        bc.FOOTPRINT_TEMPLATES.clear()  # the end-to-end build starts cold
+        with Stage(results, "build") as stage:
+            bc.build_project(bc.parse_args(["--no-cache"]))
+            stage.bytes = bc.OUTPUT_FILE.stat().st_size
+            stage.packets = serialization["packets"]
+    return results
+
+
+# =============================================================================
+# Regression Check
+# =============================================================================
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """List regressions of results against a baseline run, as readable strings."""
+    previous = {run["scale"]: run for run in baseline.get("runs", [])}
+    regressions = []
+    for run in results["runs"]:
+        before = previous.get(run["scale"])
+        if not before:
+            continue
+        for stage, now in run["stages"].items():
+            then = before["stages"].get(stage)
+            if not then:
+                continue
+            for metric, floor in (("wall_s", WALL_NOISE_FLOOR), ("peak_rss_mb", RSS_NOISE_FLOOR), ("bytes", 0)):
+                if metric not in now or metric not in then:
+                    continue
+                old, new = then[metric], now[metric]
+                if new > old * (1 + tolerance) and new - old > floor:
+                    regressions.append(f"{format_scale(run['scale'])} {stage} {metric}: {old} -> {new} "
+                                       f"(+{(new / old - 1) * 100 if old else math.inf:.0f}%)")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'scale':>6}  {'stage':<22} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'packets':>10} {'MB out':>8}")
+    for run in results["runs"]:
+        for stage, m in run["stages"].items():
+            print(f"{format_scale(run['scale']):>6}  {stage:<22} {m['wall_s']:>8.3f} {m.get('cpu_s', 0):>8.3f} "
+                  f"{m['peak_rss_mb'] if 'peak_rss_mb' in m else '-':>8} {m['packets']:>10} {m['bytes'] / 1e6:>8.1f}")
+        rate = run["stages"].get("expand_buildings", {}).get("template_hit_rate")
+        if rate is not None:
+            print(f"{format_scale(run['scale']):>6}  footprint templates reused for {rate:.1%} of buildings")
+
+
+def run_scale(scale, seed, work_dir, keep=False, designs=None):
+    """Generate a project and benchmark it in a fresh interpreter."""
+    project_dir = Path(tempfile.mkdtemp(prefix=f"bench_{format_scale(scale)}_", dir=work_dir))
+    try:
+        start = time.perf_counter()
+        inputs = generate_project(project_dir, scale, seed, designs)
+        inputs["generate_s"] = round(time.perf_counter() - start, 3)
+        child = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--run-stages", str(project_dir)],
+                               check=True, capture_output=True, text=True)
+        return {"scale": scale, "inputs": inputs, "stages": json.loads(child.stdout)}
+    finally:
+        if keep:
+            print(f"  kept {project_dir}")
+        else:
+            shutil.rmtree(project_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark build_czml.py on synthetic projects.")
+    parser.add_argument("--scales", default=",".join(map(format_scale, DEFAULT_SCALES)),
+                        help="comma-separated scales, e.g. 1k,10k,100k,1M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--designs", type=int, metavar="K",
+                        help="draw each building type's dimensions from K designs instead of at random")
+    parser.add_argument("--output", help="write results as JSON (usable later as a --baseline)")
+    parser.add_argument("--baseline", help="compare with a saved results file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help=f"allowed growth over the baseline (default {REGRESSION_TOLERANCE})")
+    parser.add_argument("--work-dir", help="where synthetic projects are generated (default: system temp)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated projects")
+    parser.add_argument("--run-stages", metavar="DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_stages:
+        print(json.dumps(run_stages(args.run_stages)))
+        return 0
+
+    results = {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": bc.np is not None,
+        "seed": args.seed,
+        "designs": args.designs,
+        "runs": [],
+    }
+    for scale in map(parse_scale, args.scales.split(",")):
+        print(f"Benchmarking {format_scale(scale)}...", file=sys.stderr)
+        results["runs"].append(run_scale(scale, args.seed, args.work_dir, args.keep, args.designs))
+    print_table(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Wrote {args.output}")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,21 +7,81 @@ Reads:
   - buildings_1650.json (parametric buildings)
   - buildings/*.json (custom buildings)
   - sites.json (curated GeoJSON)
-  - unified_sites.geojson (reference data)
+  - unified_sites.geojson (reference data, clipped to the project bounds; .geojsonl / .geojsons also accepted)
   - entity_styles.json (colors and groups for data sources)
 
 Outputs:
   - entities.czml (native Cesium format)
+  - entities/manifest.json + one CZML shard per map period (--shard-periods)
+  - entity_tiles/index.json + one CZML document per quadtree tile (--tiles)
+  - tiles3d/<period>/tileset.json + batched glTF tiles for buildings (--3dtiles)
+  - entities.timeindex, entity ids by availability year (--time-index)
+  - entities.geom, every position as one binary float array (--geometry-buffer)
 
 Usage:
-    python scripts/build_czml.py
+    python scripts/build_czml.py             # incremental build (uses .czml_cache/)
+    python scripts/build_czml.py --plan      # report what would be rebuilt
+    python scripts/build_czml.py --no-cache  # full rebuild, cache untouched
+    python scripts/build_czml.py --watch     # rebuild on every input change
+    python scripts/build_czml.py --project public/data/projects/my-region
+    python scripts/build_czml.py --all-projects -j 4  # every project, 4 at a time
+    python scripts/build_czml.py --profile   # per-stage timings -> build_profile.json
+                                             # (open in chrome://tracing or Perfetto)
+    python scripts/build_czml.py --shard-periods  # per-period shards; point
+                                                  # "entities" at entities/manifest.json
+    python scripts/build_czml.py --tiles [N]      # quadtree tiles of <= N packets; point
+                                                  # "entities" at entity_tiles/index.json
+    python scripts/build_czml.py --compact        # quantized, minified output with
+                                                  # precompressed .gz/.br sidecars
+    python scripts/build_czml.py --coalesce       # merge identical per-period packets
+    python scripts/build_czml.py --3dtiles        # buildings as 3D Tiles; add the entries
+                                                  # in tiles3d/layers.json to "layers"
+    python scripts/build_czml.py --simplify 5,25,100  # reference LODs at these tolerances (m)
+    python scripts/build_czml.py --dedupe 10      # merge reference duplicates within 10 m
+    python scripts/build_czml.py --time-index     # year -> entities index; query with
+                                                  # scripts/temporal_index.py
+    python scripts/build_czml.py --geometry-buffer  # positions as mappable floats; read
+                                                    # with scripts/geometry_buffer.py
 """
 
+import argparse
+import contextlib
+import cProfile
+import gzip
+import hashlib
+import io
 import json
 import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from itertools import chain, repeat
 from pathlib import Path
 from datetime import datetime
 
+from geometry_buffer import GeometryBufferBuilder
+from sidecars import iso_year
+from temporal_index import TemporalIndexBuilder
+from tiles3d import TilesetWriter
+
+try:
+    import numpy as np
+except ImportError:  # Geometry falls back to the pure-Python path
+    np = None
+
+try:
+    import brotli
+except ImportError:  # --compact then writes .gz sidecars only
+    brotli = None
+
 # Project paths (scripts are in data/scripts/)
 PROJECT_DIR = Path(__file__).parent.parent.parent
 DATA_DIR = PROJECT_DIR / "public" / "data" / "projects" / "example"
@@ -34,9 +94,75 @@ SITES_FILE = DATA_DIR / "sites.json"
 UNIFIED_FILE = PROJECT_DIR / "public" / "data" / "unified_sites.geojson"
 ENTITY_STYLES_FILE = DATA_DIR / "entity_styles.json"
 
+# Batch builds (--all-projects): every <name>/project.json under PROJECTS_DIR
+PROJECTS_DIR = PROJECT_DIR / "public" / "data" / "projects"
+
+# Buildings expanded together by the vectorized geometry kernel
+BUILDING_BATCH_SIZE = 256
+
+# Footprint templates kept per process (LRU), one per generator type and
+# repeated set of dimensions
+TEMPLATE_CACHE_SIZE = 4096
+
+# Newline-delimited GeoJSON / GeoJSONSeq (RFC 8142) extensions
+GEOJSON_SEQ_SUFFIXES = {".geojsonl", ".geojsons", ".geojsonseq", ".ndjson", ".jsonl"}
+
 # Output
 OUTPUT_FILE = DATA_DIR / "entities.czml"
 
+# Per-period shards (--shard-periods)
+SHARD_DIR = DATA_DIR / "entities"
+
+# Quadtree tiles (--tiles)
+TILE_DIR = DATA_DIR / "entity_tiles"
+TILE_MAX_PACKETS = 2000
+TILE_MAX_DEPTH = 16
+
+# Compact output (--compact): decimal places kept for degrees (1e-7 deg ~ 1 cm)
+# and for heights in meters
+COMPACT_PRECISION = 7
+COMPACT_HEIGHT_PRECISION = 2
+# Brotli quality 11 is ~20% smaller than 9 but ~60x slower; sidecars are
+# rewritten on every build
+BROTLI_QUALITY = 9
+
+# Baked building tilesets (--3dtiles)
+TILES3D_DIR = DATA_DIR / "tiles3d"
+
+# Reference layer LODs (--simplify): a level simplified to tolerance T meters is
+# shown from T * factor meters away, where T is about 2 px on a 1080p screen
+SIMPLIFY_TOLERANCES = (5, 25, 100)
+SIMPLIFY_DISTANCE_FACTOR = 500
+
+# Reference layer de-duplication (--dedupe): features of the same geometry type and
+# category whose bounding boxes are within this many meters, whose years overlap
+# and whose names (when both have one) are at least this similar
+DEDUPE_DISTANCE = 10
+DEDUPE_NAME_SIMILARITY = 0.8
+
+# Year -> active entities index (--time-index, see temporal_index.py)
+TIME_INDEX_FILE = DATA_DIR / "entities.timeindex"
+
+# Binary positions (--geometry-buffer, see geometry_buffer.py)
+GEOMETRY_BUFFER_FILE = DATA_DIR / "entities.geom"
+
+# Watch mode (--watch): input polling interval and the quiet period before a
+# rebuild, in seconds
+WATCH_POLL_INTERVAL = 0.05
+WATCH_DEBOUNCE = 0.05
+
+# Profiling (--profile): spans kept as Chrome trace events, and rows printed
+TRACE_MAX_EVENTS = 200_000
+PROFILE_SUMMARY_ROWS = 15
+
+# Incremental build cache (per-source packet fragments)
+CACHE_DIR = DATA_DIR / ".czml_cache"
+CACHE_VERSION = 1
+
+# Scripts whose code shapes the output; any edit to them invalidates the cache
+BUILDER_FILES = [Path(__file__).with_name(name) for name in (
+    "build_czml.py", "geometry_buffer.py", "sidecars.py", "temporal_index.py", "tiles3d.py")]
+
 # Default values (overridden by project.json if present)
 DEFAULT_MAP_PERIODS = [
     {"id": "roman", "start": 0, "stop": 410, "geoCorrect": True},
@@ -56,42 +182,220 @@ DEFAULT_MATERIAL_COLORS = {
     "timber": [139, 115, 85, 255],     # #8B7355 - oak brown
 }
 
-# These will be set from project.json in load_project_config()
-MAP_PERIODS = {}
-GEO_CORRECT_PERIODS = set()
-MATERIAL_COLORS = {}
+
+def use_project_dir(data_dir, unified_file=None):
+    """Point every input and output path at another project directory.
+
+    The module-level paths default to the example project; unified_file
+    defaults to the shared public/data/unified_sites.geojson.
+    """
+    global DATA_DIR, PROJECT_FILE, BUILDINGS_1650_FILE, BUILDINGS_DIR, SITES_FILE, UNIFIED_FILE
+    global ENTITY_STYLES_FILE, OUTPUT_FILE, SHARD_DIR, TILE_DIR, TILES3D_DIR, TIME_INDEX_FILE, CACHE_DIR
+    global GEOMETRY_BUFFER_FILE
+    DATA_DIR = Path(data_dir)
+    PROJECT_FILE = DATA_DIR / "project.json"
+    BUILDINGS_1650_FILE = DATA_DIR / "buildings_1650.json"
+    BUILDINGS_DIR = DATA_DIR / "buildings"
+    SITES_FILE = DATA_DIR / "sites.json"
+    UNIFIED_FILE = Path(unified_file) if unified_file else PROJECT_DIR / "public" / "data" / "unified_sites.geojson"
+    ENTITY_STYLES_FILE = DATA_DIR / "entity_styles.json"
+    OUTPUT_FILE = DATA_DIR / "entities.czml"
+    SHARD_DIR = DATA_DIR / "entities"
+    TILE_DIR = DATA_DIR / "entity_tiles"
+    TILES3D_DIR = DATA_DIR / "tiles3d"
+    TIME_INDEX_FILE = DATA_DIR / "entities.timeindex"
+    GEOMETRY_BUFFER_FILE = DATA_DIR / "entities.geom"
+    CACHE_DIR = DATA_DIR / ".czml_cache"
 
 
 def load_project_config():
     """Load project configuration from project.json.
 
-    Sets global MAP_PERIODS, GEO_CORRECT_PERIODS, and MATERIAL_COLORS.
-    Falls back to defaults if project.json doesn't exist.
+    Returns the parsed project.json, or None if it doesn't exist; pass it
+    to make_build_config() for the map periods and material colors.
     """
-    global MAP_PERIODS, GEO_CORRECT_PERIODS, MATERIAL_COLORS
-
     project_config = None
     if PROJECT_FILE.exists():
-        with open(PROJECT_FILE) as f:
+        with span("load.json"), open(PROJECT_FILE) as f:
             project_config = json.load(f)
         print(f"Loaded project config: {project_config.get('name', 'Unknown')}")
 
+    return project_config
+
+
+def make_build_config(project_config):
+    """Derive map periods and material colors from project.json, with defaults.
+
+    The result is passed explicitly to the building functions (and pickled to
+    worker processes) rather than read from module globals.
+    """
     # Load map periods
     periods_list = (project_config.get("mapPeriods") if project_config
                     else DEFAULT_MAP_PERIODS)
-    MAP_PERIODS = {
+    map_periods = {
         p["id"]: {"start": p["start"], "stop": p["stop"]}
         for p in periods_list
     }
-    GEO_CORRECT_PERIODS = {
+    geo_correct_periods = {
         p["id"] for p in periods_list if p.get("geoCorrect", True)
     }
 
     # Load material colors
-    MATERIAL_COLORS = (project_config.get("materialColors") if project_config
+    material_colors = (project_config.get("materialColors") if project_config
                        else DEFAULT_MATERIAL_COLORS)
 
-    return project_config
+    return {
+        "map_periods": map_periods,
+        "geo_correct_periods": geo_correct_periods,
+        "material_colors": material_colors,
+    }
+
+
+# =============================================================================
+# Instrumentation (--profile)
+# =============================================================================
+#
+# Hot functions open a span(name); while no Profiler is installed this costs a
+# global lookup and returns a shared no-op. Spans opened in --jobs worker
+# processes are not recorded.
+
+PROFILER = None
+
+
+class _NullSpan:
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Time a block under `name` if profiling; set .items on the result to count work done."""
+    return PROFILER.span(name) if PROFILER is not None else _NULL_SPAN
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "items", "wall", "cpu", "child_wall", "base", "peak")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.items = None
+
+    def __enter__(self):
+        stack = self.profiler.stack
+        if self.profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:  # reset_peak() below would lose the enclosing span's peak
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.base = self.peak = current
+        self.child_wall = 0.0
+        stack.append(self)
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        wall = end - self.wall
+        cpu = time.process_time() - self.cpu
+        stack = self.profiler.stack
+        stack.pop()
+        allocated = 0
+        if self.profiler.memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            allocated = self.peak - self.base
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        if stack:
+            stack[-1].child_wall += wall
+        self.profiler.record(self, wall, cpu, allocated, end)
+        return False
+
+
+class Profiler:
+    """Aggregate span timings and keep a Chrome trace of them.
+
+    Per span name: calls, inclusive wall and CPU seconds, self wall seconds
+    (minus nested spans), items and items/s, and with `memory` the most
+    memory (tracemalloc) any one call allocated above what it started with. The first TRACE_MAX_EVENTS spans
+    are also kept as Chrome trace events.
+    """
+
+    def __init__(self, memory=False):
+        self.stats = {}
+        self.events = []
+        self.dropped = 0
+        self.stack = []
+        self.memory = memory
+        self.origin = time.perf_counter()
+        if memory:
+            tracemalloc.start()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def record(self, span, wall, cpu, allocated, end):
+        stats = self.stats.get(span.name)
+        if stats is None:
+            stats = self.stats[span.name] = {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "self_s": 0.0,
+                                             "items": 0, "peak_alloc_bytes": 0}
+        stats["calls"] += 1
+        stats["wall_s"] += wall
+        stats["cpu_s"] += cpu
+        stats["self_s"] += wall - span.child_wall
+        stats["items"] += span.items if span.items is not None else 1
+        if allocated > stats["peak_alloc_bytes"]:
+            stats["peak_alloc_bytes"] = allocated
+        if len(self.events) < TRACE_MAX_EVENTS:
+            event = {"name": span.name, "cat": span.name.partition(".")[0], "ph": "X", "pid": os.getpid(),
+                     "tid": 0, "ts": round((end - wall - self.origin) * 1e6, 1), "dur": round(wall * 1e6, 1)}
+            if span.items is not None:
+                event["args"] = {"items": span.items}
+            self.events.append(event)
+        else:
+            self.dropped += 1
+
+    def report(self):
+        stages = {}
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1]["self_s"]):
+            stages[name] = {
+                "calls": stats["calls"],
+                "wall_s": round(stats["wall_s"], 6),
+                "cpu_s": round(stats["cpu_s"], 6),
+                "self_s": round(stats["self_s"], 6),
+                "items": stats["items"],
+                "items_per_s": round(stats["items"] / stats["wall_s"], 1) if stats["wall_s"] else None,
+            }
+            if self.memory:
+                stages[name]["peak_alloc_mb"] = round(stats["peak_alloc_bytes"] / 1e6, 3)
+        return {
+            "displayTimeUnit": "ms",
+            "stages": stages,
+            "droppedEvents": self.dropped,
+            "traceEvents": self.events,
+        }
+
+    def write(self, path):
+        """Write the report; the file loads in chrome://tracing and Perfetto as is."""
+        if self.memory:
+            tracemalloc.stop()
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f)
+        print(f"Profile: {path}")
+        print(f"  {'stage':<28} {'calls':>9} {'wall s':>9} {'self s':>9} {'items/s':>11}")
+        for name, stats in list(report["stages"].items())[:PROFILE_SUMMARY_ROWS]:
+            rate = stats["items_per_s"]
+            print(f"  {name:<28} {stats['calls']:>9} {stats['wall_s']:>9.3f} {stats['self_s']:>9.3f} "
+                  f"{'-' if rate is None else f'{rate:.0f}':>11}")
 
 
 # =============================================================================
@@ -114,7 +418,7 @@ def parse_availability(building):
         return availability_interval(start, end)
 
 
-def get_entity_color(entity, building_color):
+def get_entity_color(entity, building_color, config):
     """Get color for an entity, supporting both old and new formats.
 
     Priority:
@@ -127,12 +431,12 @@ def get_entity_color(entity, building_color):
         return entity["color"]
     elif "material" in entity:
         # Old format - lookup from material name
-        return MATERIAL_COLORS.get(entity["material"], building_color)
+        return config["material_colors"].get(entity["material"], building_color)
     else:
         return building_color
 
 
-def get_building_color(building, default_color):
+def get_building_color(building, default_color, config):
     """Get default color for a building.
 
     Supports:
@@ -142,7 +446,7 @@ def get_building_color(building, default_color):
     if "color" in building:
         return building["color"]
     elif "material" in building:
-        return MATERIAL_COLORS.get(building["material"], default_color)
+        return config["material_colors"].get(building["material"], default_color)
     else:
         return default_color
 
@@ -173,15 +477,20 @@ def coords_to_cartographic(coords, height=0):
     return result
 
 
-def make_polygon_packet(id, name, coords, height, extruded_height, color_rgba, availability_str, group="curated", properties=None):
-    """Create a CZML packet for a polygon entity."""
+def make_polygon_packet(id, name, coords, height, extruded_height, color_rgba, availability_str, group="curated", properties=None,
+                        cartographic=None):
+    """Create a CZML packet for a polygon entity.
+
+    `cartographic` may be given instead of `coords` when the flat
+    [lon, lat, h, ...] list has already been produced (geometry kernel).
+    """
     packet = {
         "id": id,
         "name": name,
         "availability": availability_str,
         "polygon": {
             "positions": {
-                "cartographicDegrees": coords_to_cartographic(coords)
+                "cartographicDegrees": cartographic if cartographic is not None else coords_to_cartographic(coords)
             },
             "height": height,
             "extrudedHeight": extruded_height,
@@ -204,6 +513,60 @@ def make_polygon_packet(id, name, coords, height, extruded_height, color_rgba, a
     return packet
 
 
+class PolygonRecord:
+    """A building polygon in one map period, kept flat until it is serialized.
+
+    Building expansion yields these instead of make_polygon_packet() dicts:
+    lonlat is a flat [lon, lat, ...] array('d'), or a view of the geometry
+    kernel's per-period buffer, and names, colors and availability strings
+    are interned so a building's periods share them. serialize_packet()
+    writes a record straight to CZML text; to_packet() gives the dict.
+    """
+    __slots__ = ("id", "name", "availability", "lonlat", "height", "extruded_height", "color")
+
+    def __init__(self, id, name, availability, lonlat, height, extruded_height, color):
+        self.id = id
+        self.name = name
+        self.availability = availability
+        self.lonlat = lonlat
+        self.height = height
+        self.extruded_height = extruded_height
+        self.color = color
+
+    def cartographic(self):
+        """Flat [lon, lat, 0, ...] positions, as make_polygon_packet() writes them."""
+        result = [0] * (len(self.lonlat) // 2 * 3)
+        result[0::3] = self.lonlat[0::2]
+        result[1::3] = self.lonlat[1::2]
+        return result
+
+    def to_packet(self):
+        return make_polygon_packet(
+            id=self.id,
+            name=self.name,
+            coords=None,
+            cartographic=self.cartographic(),
+            height=self.height,
+            extruded_height=self.extruded_height,
+            color_rgba=list(self.color),
+            availability_str=self.availability,
+            group="curated"
+        )
+
+
+_INTERNED_COLORS = {}
+
+
+def intern_name(name):
+    return sys.intern(name) if type(name) is str else name
+
+
+def intern_color(color):
+    """One shared tuple per distinct RGBA color."""
+    color = tuple(color)
+    return _INTERNED_COLORS.setdefault(color, color)
+
+
 def make_point_packet(id, name, lon, lat, color_rgba, availability_str, group="curated", properties=None):
     """Create a CZML packet for a point entity."""
     packet = {
@@ -282,37 +645,47 @@ def rotate_point(x, y, angle_deg):
 
 def offsets_to_coords(cx, cy, offsets, rotation):
     """Convert meter offsets from center to lon/lat coordinates."""
+    rad = math.radians(rotation)
+    cos_r = math.cos(rad)
+    sin_r = math.sin(rad)
+    lon_m = 111000 * math.cos(math.radians(cy))
+
     coords = []
     for x, y in offsets:
-        rx, ry = rotate_point(x, y, rotation)
-        lon = cx + to_lon_deg(rx, cy)
-        lat = cy + to_lat_deg(ry)
-        coords.append([lon, lat])
+        rx = x * cos_r - y * sin_r
+        ry = x * sin_r + y * cos_r
+        coords.append([cx + rx / lon_m, cy + ry / 111000])
     return coords
 
 
-def transform_coords(coords, original_center, target_center, original_rotation, target_rotation, scale=1.0):
-    """Transform coordinates from original position to target position."""
+def transform_lonlat(lonlat, original_center, target_center, original_rotation, target_rotation, scale=1.0):
+    """Transform flat [lon, lat, ...] coordinates from original position to target position.
+
+    Returns a new array('d').
+    """
     delta_lng = target_center[0] - original_center[0]
     delta_lat = target_center[1] - original_center[1]
     delta_rotation = target_rotation - original_rotation
 
+    result = array("d", lonlat)
     if delta_rotation == 0 and scale == 1.0:
-        return [[lng + delta_lng, lat + delta_lat] for lng, lat in coords]
+        result[0::2] = array("d", [lng + delta_lng for lng in lonlat[0::2]])
+        result[1::2] = array("d", [lat + delta_lat for lat in lonlat[1::2]])
+        return result
 
     radians = math.radians(delta_rotation)
     cos_r = math.cos(radians)
     sin_r = math.sin(radians)
 
-    result = []
-    for lng, lat in coords:
-        rel_lng = lng - original_center[0]
-        rel_lat = lat - original_center[1]
+    for i in range(0, len(lonlat), 2):
+        rel_lng = lonlat[i] - original_center[0]
+        rel_lat = lonlat[i + 1] - original_center[1]
         rel_lng *= scale
         rel_lat *= scale
         rot_lng = rel_lng * cos_r - rel_lat * sin_r
         rot_lat = rel_lng * sin_r + rel_lat * cos_r
-        result.append([target_center[0] + rot_lng, target_center[1] + rot_lat])
+        result[i] = target_center[0] + rot_lng
+        result[i + 1] = target_center[1] + rot_lat
 
     return result
 
@@ -323,11 +696,9 @@ def transform_coords(coords, original_center, target_center, original_rotation,
 
 def generate_simple_building(building):
     """Generate a simple rectangular building."""
-    cx, cy = building["center"]
     hL = building["length"] / 2
     hW = building["width"] / 2
     height = building["height"]
-    rotation = building.get("rotation", 0)
 
     entities = []
     walls = [[-hL, -hW], [hL, -hW], [hL, hW], [-hL, hW]]
@@ -335,7 +706,7 @@ def generate_simple_building(building):
         "id": f"{building['id']}_walls",
         "name": f"{building['name']}",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, walls, rotation),
+        "offsets": walls,
         "height": 0,
         "extrudedHeight": height,
         "material": "wall"
@@ -345,9 +716,6 @@ def generate_simple_building(building):
 
 def generate_church(building):
     """Generate a medieval church with tower, nave, and aisles."""
-    cx, cy = building["center"]
-    rotation = building.get("rotation", 0)
-
     nave_length = building.get("naveLength", 40)
     nave_width = building.get("naveWidth", 12)
     nave_height = building.get("naveHeight", 15)
@@ -365,7 +733,7 @@ def generate_church(building):
         "id": f"{building['id']}_nave",
         "name": f"{building['name']} - Nave",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, nave, rotation),
+        "offsets": nave,
         "height": 0,
         "extrudedHeight": nave_height,
         "material": "wall"
@@ -378,7 +746,7 @@ def generate_church(building):
         "id": f"{building['id']}_tower",
         "name": f"{building['name']} - Tower",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, tower, rotation),
+        "offsets": tower,
         "height": 0,
         "extrudedHeight": tower_height,
         "material": "tower"
@@ -390,7 +758,7 @@ def generate_church(building):
         "id": f"{building['id']}_north_aisle",
         "name": f"{building['name']} - North Aisle",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, n_aisle, rotation),
+        "offsets": n_aisle,
         "height": 0,
         "extrudedHeight": nave_height * 0.7,
         "material": "wall"
@@ -402,7 +770,7 @@ def generate_church(building):
         "id": f"{building['id']}_south_aisle",
         "name": f"{building['name']} - South Aisle",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, s_aisle, rotation),
+        "offsets": s_aisle,
         "height": 0,
         "extrudedHeight": nave_height * 0.7,
         "material": "wall"
@@ -416,7 +784,7 @@ def generate_church(building):
         "id": f"{building['id']}_chancel",
         "name": f"{building['name']} - Chancel",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, chancel, rotation),
+        "offsets": chancel,
         "height": 0,
         "extrudedHeight": nave_height * 0.9,
         "material": "wall"
@@ -427,9 +795,6 @@ def generate_church(building):
 
 def generate_bridge(building):
     """Generate a medieval stone bridge with arches."""
-    cx, cy = building["center"]
-    rotation = building.get("rotation", 0)
-
     span = building.get("span", 50)
     width = building.get("width", 6)
     height = building.get("height", 8)
@@ -445,7 +810,7 @@ def generate_bridge(building):
         "id": f"{building['id']}_deck",
         "name": f"{building['name']} - Deck",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, deck, rotation),
+        "offsets": deck,
         "height": height - 1,
         "extrudedHeight": height,
         "material": "stone"
@@ -461,7 +826,7 @@ def generate_bridge(building):
             "id": f"{building['id']}_pier_{i}",
             "name": f"{building['name']} - Pier {i+1}",
             "type": "polygon",
-            "coords": offsets_to_coords(cx, cy, pier, rotation),
+            "offsets": pier,
             "height": -2,
             "extrudedHeight": height - 1,
             "material": "stone"
@@ -474,7 +839,7 @@ def generate_bridge(building):
             "id": f"{building['id']}_parapet_{side}",
             "name": f"{building['name']} - {side.title()} Parapet",
             "type": "polygon",
-            "coords": offsets_to_coords(cx, cy, parapet, rotation),
+            "offsets": parapet,
             "height": height,
             "extrudedHeight": height + 1.2,
             "material": "stone"
@@ -485,9 +850,6 @@ def generate_bridge(building):
 
 def generate_neoclassical_church(building):
     """Generate a neoclassical church."""
-    cx, cy = building["center"]
-    rotation = building.get("rotation", 0)
-
     nave_length = building.get("naveLength", 30)
     nave_width = building.get("naveWidth", 15)
     nave_height = building.get("naveHeight", 12)
@@ -506,7 +868,7 @@ def generate_neoclassical_church(building):
         "id": f"{building['id']}_body",
         "name": f"{building['name']} - Body",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, body, rotation),
+        "offsets": body,
         "height": 0,
         "extrudedHeight": nave_height,
         "material": "wall"
@@ -519,7 +881,7 @@ def generate_neoclassical_church(building):
         "id": f"{building['id']}_wing_north",
         "name": f"{building['name']} - North Wing",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, north_wing, rotation),
+        "offsets": north_wing,
         "height": 0,
         "extrudedHeight": nave_height * 0.8,
         "material": "wall"
@@ -530,7 +892,7 @@ def generate_neoclassical_church(building):
         "id": f"{building['id']}_wing_south",
         "name": f"{building['name']} - South Wing",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, south_wing, rotation),
+        "offsets": south_wing,
         "height": 0,
         "extrudedHeight": nave_height * 0.8,
         "material": "wall"
@@ -543,7 +905,7 @@ def generate_neoclassical_church(building):
         "id": f"{building['id']}_tower",
         "name": f"{building['name']} - Tower",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, tower, rotation),
+        "offsets": tower,
         "height": nave_height,
         "extrudedHeight": tower_height,
         "material": "tower"
@@ -554,9 +916,6 @@ def generate_neoclassical_church(building):
 
 def generate_chapel(building):
     """Generate a simple chapel."""
-    cx, cy = building["center"]
-    rotation = building.get("rotation", 0)
-
     length = building.get("length", 15)
     width = building.get("width", 8)
     height = building.get("height", 7)
@@ -571,7 +930,7 @@ def generate_chapel(building):
         "id": f"{building['id']}_body",
         "name": f"{building['name']} - Body",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, body, rotation),
+        "offsets": body,
         "height": 0,
         "extrudedHeight": height,
         "material": "wall"
@@ -583,7 +942,7 @@ def generate_chapel(building):
         "id": f"{building['id']}_tower",
         "name": f"{building['name']} - Tower",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, tower, rotation),
+        "offsets": tower,
         "height": 0,
         "extrudedHeight": tower_height,
         "material": "wall"
@@ -594,9 +953,6 @@ def generate_chapel(building):
 
 def generate_courtyard_building(building):
     """Generate a medieval courtyard building."""
-    cx, cy = building["center"]
-    rotation = building.get("rotation", 0)
-
     outer_length = building.get("length", 40)
     outer_width = building.get("width", 35)
     wing_depth = building.get("wingDepth", 8)
@@ -619,7 +975,7 @@ def generate_courtyard_building(building):
             "id": f"{building['id']}_{name}_wing",
             "name": f"{building['name']} - {name.title()} Wing",
             "type": "polygon",
-            "coords": offsets_to_coords(cx, cy, coords, rotation),
+            "offsets": coords,
             "height": 0,
             "extrudedHeight": height,
             "material": "wall"
@@ -630,7 +986,7 @@ def generate_courtyard_building(building):
         "id": f"{building['id']}_gatehouse",
         "name": f"{building['name']} - Gatehouse",
         "type": "polygon",
-        "coords": offsets_to_coords(cx, cy, gate, rotation),
+        "offsets": gate,
         "height": height,
         "extrudedHeight": height + 5,
         "material": "wall"
@@ -649,18 +1005,302 @@ GENERATORS = {
 }
 
 
+# The building fields each generator reads; buildings that agree on them share
+# a footprint template. Generators missing here are called for every building.
+TEMPLATE_PARAMS = {
+    "house": ("length", "width", "height"),
+    "church": ("naveLength", "naveWidth", "naveHeight", "towerSize", "towerHeight", "aisleWidth"),
+    "neoclassical_church": ("naveLength", "naveWidth", "naveHeight", "towerSize", "towerHeight",
+                            "wingDepth", "wingWidth"),
+    "chapel": ("length", "width", "height", "towerHeight"),
+    "bridge": ("span", "width", "height", "numArches"),
+    "courtyard": ("length", "width", "wingDepth", "height"),
+}
+
+
+class FootprintTemplate:
+    """A generator's entities with the building's own id and name stripped.
+
+    Generators prefix every id and name with the building's, so generating
+    with both empty leaves the suffixes. `offsets` holds every vertex as one
+    flat [x, y, ...] array('d') for the vectorized kernel. Everything else
+    is kept as tuples of numbers and strings, which the garbage collector
+    stops tracking, so a full cache doesn't slow down every collection.
+    """
+
+    __slots__ = ("parts", "offsets")
+
+    def __init__(self, entities):
+        self.parts = tuple(
+            (entity.pop("id"), entity.pop("name"),
+             tuple((key, tuple(map(tuple, value)) if key == "offsets" else value) for key, value in entity.items()))
+            for entity in entities
+        )
+        self.offsets = array("d", chain.from_iterable(chain.from_iterable(
+            dict(fields)["offsets"] for _, _, fields in self.parts)))
+
+    def instantiate(self, building):
+        """The entities the generator would return for `building`.
+
+        Offsets are tuples shared with the template.
+        """
+        building_id, building_name = building["id"], building["name"]
+        entities = []
+        for id_suffix, name_suffix, fields in self.parts:
+            entity = {"id": f"{building_id}{id_suffix}", "name": f"{building_name}{name_suffix}"}
+            entity.update(fields)
+            entities.append(entity)
+        return entities
+
+
+_MISSING = object()
+
+
+class FootprintTemplates:
+    """LRU cache of FootprintTemplates keyed by generator type and TEMPLATE_PARAMS.
+
+    A key is cached the second time it is seen, so a project of one-off
+    buildings pays for a set lookup per building rather than for templates
+    that are never reused. Each process (--jobs worker) has its own.
+    """
+
+    def __init__(self, maxsize=TEMPLATE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.templates = OrderedDict()
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, building_type, building):
+        """Return the building's template, or None if it has none (yet)."""
+        params = TEMPLATE_PARAMS.get(building_type)
+        if params is None:
+            return None
+        key = (building_type, tuple(map(building.get, params, repeat(_MISSING))))
+        template = self.templates.get(key)
+        if template is not None:
+            self.templates.move_to_end(key)
+            self.hits += 1
+            return template
+
+        self.misses += 1
+        if key not in self.seen:
+            if len(self.seen) >= 4 * self.maxsize:
+                self.seen.clear()
+            self.seen.add(key)
+            return None
+        dimensions = {name: value for name, value in zip(params, key[1]) if value is not _MISSING}
+        template = FootprintTemplate(run_generator(building_type, {**dimensions, "id": "", "name": ""}))
+        self.templates[key] = template
+        if len(self.templates) > self.maxsize:
+            self.templates.popitem(last=False)
+        return template
+
+    def stats(self, before=None):
+        """{"hits", "misses", "size"}, counted since `before` (an earlier stats()) if given."""
+        stats = {"hits": self.hits, "misses": self.misses, "size": len(self.templates)}
+        if before:
+            stats["hits"] -= before["hits"]
+            stats["misses"] -= before["misses"]
+        return stats
+
+    def clear(self):
+        self.templates.clear()
+        self.seen.clear()
+        self.hits = self.misses = 0
+
+
+FOOTPRINT_TEMPLATES = FootprintTemplates()
+
+
+def run_generator(building_type, building):
+    with span(f"generator.{building_type}") as timed:
+        entities = GENERATORS[building_type](building)
+        timed.items = len(entities)
+    return entities
+
+
+def building_footprints(building):
+    """Return (entities, template or None) for a parametric building; see generate_footprints."""
+    building_type = building.get("type", "house")
+    if building_type not in GENERATORS:
+        building_type = "house"
+    template = FOOTPRINT_TEMPLATES.get(building_type, building)
+    if template is not None:
+        return template.instantiate(building), template
+    return run_generator(building_type, building), None
+
+
+def generate_footprints(building):
+    """Generate a building's entities as meter offsets around its center, unrotated."""
+    return building_footprints(building)[0]
+
+
 def generate_building(building):
     """Generate entities for a building based on its type."""
-    building_type = building.get("type", "house")
-    generator = GENERATORS.get(building_type, generate_simple_building)
-    return generator(building)
+    cx, cy = building["center"]
+    rotation = building.get("rotation", 0)
+
+    entities = generate_footprints(building)
+    for entity in entities:
+        entity["coords"] = offsets_to_coords(cx, cy, entity.pop("offsets"), rotation)
+    return entities
+
+
+# =============================================================================
+# Vectorized Geometry Kernel (NumPy)
+# =============================================================================
+#
+# Places and period-transforms every vertex of a batch of buildings as array
+# operations. Each element goes through the same IEEE operations in the same
+# order as offsets_to_coords/transform_lonlat, so results are bit-identical to
+# the pure-Python path, which remains the fallback when NumPy isn't installed.
+
+def expand_buildings(buildings, default_color, config):
+    """Yield the packet list (PolygonRecords) for each building, in order."""
+    if np is None:
+        for building in buildings:
+            yield building_packets(building, default_color, config)
+        return
+
+    buildings = list(buildings)
+    entities = []
+    templates = []
+    for building in buildings:
+        if building.get("type") == "custom":
+            entities.append(building["entities"])
+            templates.append(None)
+        else:
+            building_entities, template = building_footprints(building)
+            entities.append(building_entities)
+            templates.append(template)
+    with span("expand.positions") as timed:
+        positions = _batch_positions(buildings, entities, templates, config)
+        timed.items = len(buildings)
+
+    for b, building in enumerate(buildings):
+        with span("expand.periods") as timed:
+            building_color = get_building_color(building, default_color, config)
+            start_year = building.get("startYear", 0)
+            end_year = building.get("endYear", 2100)
+
+            # Per-entity attributes don't change between periods
+            parts = []
+            base = 0
+            for entity in entities[b]:
+                n = len(entity["offsets"] if "offsets" in entity else entity["coords"])
+                parts.append((entity["id"], intern_name(entity.get("name", "")), 2 * base, 2 * (base + n),
+                              entity.get("height", 0), entity.get("extrudedHeight", 0),
+                              intern_color(get_entity_color(entity, building_color, config))))
+                base += n
+
+            packets = []
+            for period_id, period in config["map_periods"].items():
+                period_start = max(start_year, period["start"])
+                period_end = min(end_year, period["stop"])
+                if period_start > period_end:
+                    continue
+
+                avail = sys.intern(availability_interval(period_start, period_end))
+                lonlat, offsets = positions[period_id]
+                first = 2 * offsets[b]
+                for entity_id, name, lo, hi, height, extruded_height, color in parts:
+                    packets.append(PolygonRecord(f"{entity_id}__{period_id}", name, avail,
+                                                 lonlat[first + lo:first + hi], height, extruded_height, color))
+            timed.items = len(packets)
+        yield coalesce_packets(packets, config["coalesce"]) if config.get("coalesce") else packets
+
+
+def _batch_positions(buildings, entities, templates, config):
+    """Compute flattened positions for every vertex in every period.
+
+    Buildings with a FootprintTemplate take their offsets from it in one
+    copy. Returns {period_id: (lonlat, offsets)} where lonlat is a
+    memoryview of a [lon, lat, ...] array('d') over all vertices of the
+    batch and offsets[b] is building b's first vertex index.
+    """
+    points = array("d")
+    counts = []
+    placement = []      # per building: [cx, cy, cos, sin, lon_m], identity for custom coords
+    for building, building_entities, template in zip(buildings, entities, templates):
+        if template is not None:
+            points.extend(template.offsets)
+            counts.append(len(template.offsets) // 2)
+        else:
+            n = len(points)
+            for entity in building_entities:
+                vertices = entity["offsets"] if "offsets" in entity else entity["coords"]
+                points.extend(chain.from_iterable(vertices))
+            counts.append((len(points) - n) // 2)
+
+        if building.get("type") == "custom":
+            placement.append([0.0, 0.0, 1.0, 0.0, 0.0])
+        else:
+            cx, cy = building["center"]
+            rad = math.radians(building.get("rotation", 0))
+            placement.append([cx, cy, math.cos(rad), math.sin(rad), 111000 * math.cos(math.radians(cy))])
+
+    xy = np.array(points).reshape(-1, 2)
+    owner = np.repeat(np.arange(len(buildings)), counts)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).tolist()
+
+    # Place parametric footprints: rotate meter offsets, convert to degrees
+    placement = np.array(placement)
+    placed = np.flatnonzero(placement[owner, 4])
+    cx, cy, cos_r, sin_r, lon_m = placement[owner[placed]].T
+    x, y = xy[placed, 0], xy[placed, 1]
+    xy[placed, 0] = cx + (x * cos_r - y * sin_r) / lon_m
+    xy[placed, 1] = cy + (x * sin_r + y * cos_r) / 111000
+    lon, lat = xy[:, 0], xy[:, 1]
+
+    # Per-period translate/rotate/scale; only buildings with "maps" overrides
+    # can move, everything else is translated by a zero delta.
+    mapped = [b for b, building in enumerate(buildings) if building.get("maps")]
+    centers = np.array([building["center"] for building in buildings], dtype=float).reshape(-1, 2)
+    flat = np.zeros((len(xy), 2))
+    positions = {}
+    for period_id in config["map_periods"]:
+        delta = np.zeros((len(buildings), 2))
+        moved = []
+        for b in mapped:
+            building = buildings[b]
+            pos = get_position_for_period(building, period_id, config)
+            ocx, ocy = building["center"]
+            tcx, tcy = pos["center"]
+            delta_rotation = pos["rotation"] - building.get("rotation", 0)
+            scale = pos["scale"]
+            if delta_rotation == 0 and scale == 1.0:
+                delta[b] = (tcx - ocx, tcy - ocy)
+            else:
+                radians = math.radians(delta_rotation)
+                moved.append([b, tcx, tcy, math.cos(radians), math.sin(radians), scale])
+
+        flat[:, 0] = lon + delta[owner, 0]
+        flat[:, 1] = lat + delta[owner, 1]
+        if moved:
+            moved = np.array(moved)
+            lookup = np.full(len(buildings), -1)
+            lookup[moved[:, 0].astype(int)] = np.arange(len(moved))
+            idx = np.flatnonzero(lookup[owner] >= 0)
+            m = lookup[owner[idx]]
+            _, tcx, tcy, cos_d, sin_d, scale = moved[m].T
+            rel_lng = (lon[idx] - centers[owner[idx], 0]) * scale
+            rel_lat = (lat[idx] - centers[owner[idx], 1]) * scale
+            flat[idx, 0] = tcx + (rel_lng * cos_d - rel_lat * sin_d)
+            flat[idx, 1] = tcy + (rel_lng * sin_d + rel_lat * cos_d)
+
+        lonlat = array("d")
+        lonlat.frombytes(flat.tobytes())
+        positions[period_id] = (memoryview(lonlat), offsets)
+
+    return positions
 
 
 # =============================================================================
 # Period Expansion
 # =============================================================================
 
-def get_position_for_period(building, period_id):
+def get_position_for_period(building, period_id, config):
     """Get the position for a building in a specific map period.
 
     Uses "maps" to define per-period position adjustments:
@@ -678,7 +1318,7 @@ def get_position_for_period(building, period_id):
             "scale": map_data.get("scale", 1.0)
         }
 
-    if period_id in GEO_CORRECT_PERIODS:
+    if period_id in config["geo_correct_periods"]:
         if "modern" in maps:
             map_data = maps["modern"]
             return {
@@ -694,61 +1334,133 @@ def get_position_for_period(building, period_id):
     }
 
 
-def expand_building_to_czml(building, base_entities, default_color):
-    """Expand a building into CZML packets for each relevant map period.
+def expand_building_to_czml(building, base_entities, default_color, config):
+    """Expand a building into a PolygonRecord per entity per relevant map period.
 
     Supports both old format (startYear/endYear, material strings) and
     new format (availability ISO, inline colors).
     """
     # Get building's default color (supports both formats)
-    building_color = get_building_color(building, default_color)
+    building_color = get_building_color(building, default_color, config)
 
     # Parse date range (supports both formats)
     start_year = building.get("startYear", 0)
     end_year = building.get("endYear", 2100)
 
+    # Per-entity attributes don't change between periods
+    parts = [
+        (entity["id"], intern_name(entity.get("name", "")), array("d", chain.from_iterable(entity["coords"])),
+         entity.get("height", 0), entity.get("extrudedHeight", 0),
+         intern_color(get_entity_color(entity, building_color, config)))
+        for entity in base_entities
+    ]
+
     packets = []
     original_center = building["center"]
     original_rotation = building.get("rotation", 0)
 
-    for period_id, period in MAP_PERIODS.items():
+    for period_id, period in config["map_periods"].items():
         period_start = max(start_year, period["start"])
         period_end = min(end_year, period["stop"])
 
         if period_start > period_end:
             continue
 
-        pos = get_position_for_period(building, period_id)
-        avail = availability_interval(period_start, period_end)
+        pos = get_position_for_period(building, period_id, config)
+        avail = sys.intern(availability_interval(period_start, period_end))
 
-        for entity in base_entities:
-            transformed_coords = transform_coords(
-                entity["coords"],
+        for entity_id, name, lonlat, height, extruded_height, color in parts:
+            transformed = transform_lonlat(
+                lonlat,
                 original_center,
                 pos["center"],
                 original_rotation,
                 pos["rotation"],
                 pos["scale"]
             )
-
-            # Get entity color (supports both material strings and inline colors)
-            entity_color = get_entity_color(entity, building_color)
-
-            packet = make_polygon_packet(
-                id=f"{entity['id']}__{period_id}",
-                name=entity.get("name", ""),
-                coords=transformed_coords,
-                height=entity.get("height", 0),
-                extruded_height=entity.get("extrudedHeight", 0),
-                color_rgba=entity_color,
-                availability_str=avail,
-                group="curated"
-            )
-            packets.append(packet)
+            packets.append(PolygonRecord(f"{entity_id}__{period_id}", name, avail,
+                                         transformed, height, extruded_height, color))
 
     return packets
 
 
+def coalesce_packets(packets, mode="runs"):
+    """Merge one building's per-period packets that share the same geometry.
+
+    Each entity is emitted once per period with an "{id}__{period_id}" id;
+    only the positions (and availability) can differ between periods. Runs
+    of contiguous periods with identical positions become one packet whose
+    availability spans the run, with id "{id}__{first}..{last}" (single
+    periods keep their id). Periods are contiguous when one's interval
+    stops where the next starts or the next starts the following year, as
+    adjacent map periods do; a run never bridges a gap, so no entity shows
+    in a year it didn't before. With mode "intervals" an entity whose
+    geometry does change becomes a single packet "{id}" with
+    interval-valued positions, and an availability list if its periods
+    have gaps; Cesium treats such polygons as time-dynamic, so "runs" is
+    the default. Takes PolygonRecords; those merged into interval-valued
+    packets come back as dicts.
+    """
+    entities = {}
+    for record in packets:
+        base, _, period_id = record.id.rpartition("__")
+        entities.setdefault(base, []).append((period_id, record))
+
+    coalesced = []
+    for base, entries in entities.items():
+        runs = []
+        spans = []
+        for period_id, record in entries:
+            previous = runs[-1][-1][1] if runs else None
+            if previous is not None and _contiguous(previous, record):
+                spans[-1].append((period_id, record))
+                if previous.lonlat == record.lonlat:
+                    runs[-1].append((period_id, record))
+                    continue
+            else:
+                spans.append([(period_id, record)])
+            runs.append([(period_id, record)])
+
+        if mode == "intervals" and len(runs) > 1:
+            intervals = [
+                {"interval": _merged_availability(run), "cartographicDegrees": run[0][1].cartographic()}
+                for run in runs
+            ]
+            packet = entries[0][1].to_packet()
+            packet["id"] = base
+            availability = [_merged_availability(span) for span in spans]
+            packet["availability"] = availability[0] if len(availability) == 1 else availability
+            packet["polygon"]["positions"] = intervals
+            coalesced.append(packet)
+            continue
+
+        for run in runs:
+            record = run[0][1]
+            if len(run) > 1:
+                record.id = f"{base}__{run[0][0]}..{run[-1][0]}"
+                record.availability = _merged_availability(run)
+            coalesced.append(record)
+    return coalesced
+
+
+def _contiguous(previous, record):
+    """Whether record's availability carries straight on from previous's."""
+    stop = previous.availability.partition("/")[2]
+    start = record.availability.partition("/")[0]
+    return start == stop or iso_year(start) == iso_year(stop) + 1
+
+
+def _merged_availability(entries):
+    """One availability interval from the first entry's start to the last entry's stop.
+
+    The entries are contiguous (see _contiguous), so this covers every year
+    they covered and no other.
+    """
+    start = entries[0][1].availability.partition("/")[0]
+    stop = entries[-1][1].availability.partition("/")[2]
+    return f"{start}/{stop}"
+
+
 # =============================================================================
 # Data Loaders
 # =============================================================================
@@ -756,12 +1468,162 @@ def expand_building_to_czml(building, base_entities, default_color):
 def load_json(path):
     """Load JSON file, return None if not found."""
     try:
-        with open(path) as f:
+        with span("load.json"), open(path) as f:
             return json.load(f)
     except FileNotFoundError:
         return None
 
 
+def find_unified_file():
+    """Locate the reference layer, preferring unified_sites.geojson over sequence variants."""
+    for suffix in (".geojson", ".geojsonl", ".geojsons"):
+        path = UNIFIED_FILE.with_suffix(suffix)
+        if path.exists():
+            return path
+    return UNIFIED_FILE
+
+
+def iter_geojson_features(path, chunk_size=1 << 16):
+    """Yield GeoJSON features from a file one at a time.
+
+    Accepts a FeatureCollection (streamed from its "features" array, so
+    memory is bounded by the largest single feature rather than the file),
+    newline-delimited GeoJSON, or RFC 8142 GeoJSONSeq. Yields nothing if the
+    file doesn't exist.
+    """
+    try:
+        f = open(path, encoding="utf-8-sig")
+    except FileNotFoundError:
+        return
+
+    with f:
+        head = f.read(1)
+        while head and head in " \t\r\n":
+            head = f.read(1)
+        if head == "\x1e" or Path(path).suffix.lower() in GEOJSON_SEQ_SUFFIXES:
+            yield from _iter_geojson_lines(head, f)
+        elif head:
+            yield from _iter_feature_collection(head, f, chunk_size)
+
+
+def _iter_geojson_lines(head, f):
+    """Yield features from newline-delimited GeoJSON or GeoJSONSeq records."""
+    for n, line in enumerate(_prepend(head, f), 1):
+        line = line.strip().lstrip("\x1e")
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"  Warning: Skipping malformed GeoJSON record on line {n}: {e}")
+            continue
+        if record.get("type") == "FeatureCollection":
+            yield from record.get("features", [])
+        else:
+            yield record
+
+
+def _prepend(head, f):
+    """Iterate lines of f with an already-consumed first character restored."""
+    first = f.readline()
+    yield head + first
+    yield from f
+
+
+class _JsonStream:
+    """Minimal pull tokenizer over a text stream for walking one JSON document.
+
+    Values are decoded with json's raw_decode once they are fully buffered, so
+    only the value currently being parsed needs to be in memory.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, head, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = head
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        data = self.f.read(size or self.chunk_size)
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        if not data:
+            self.eof = True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ("" at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"Invalid GeoJSON: expected {chars!r}, found {ch or 'end of file'!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        return self.raw_value()[0]
+
+    def raw_value(self):
+        """Decode the next complete JSON value; return it with its source text."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # Grow geometrically so a large feature isn't re-scanned per chunk
+                self._fill(max(self.chunk_size, len(self.buf) - self.pos))
+                continue
+            if end == len(self.buf) and not self.eof:
+                # A number may continue in the next chunk
+                self._fill()
+                continue
+            text = self.buf[self.pos:end]
+            self.pos = end
+            return value, text
+
+
+def _iter_feature_collection(head, f, chunk_size):
+    """Stream features out of a FeatureCollection's "features" array."""
+    stream = _JsonStream(head, f, chunk_size)
+    stream.expect("{")
+    members = {}
+    if stream.peek() == "}":
+        return
+
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "features":
+            stream.expect("[")
+            if stream.peek() != "]":
+                while True:
+                    yield stream.value()
+                    if stream.expect(",]") == "]":
+                        break
+            else:
+                stream.expect("]")
+        else:
+            members[key] = stream.value()
+        if stream.expect(",}") == "}":
+            break
+
+    # A bare Feature document is a one-feature collection
+    if members.get("type") == "Feature":
+        yield members
+
+
 def load_layers_config():
     """Load layer configuration for colors and groups."""
     layers_config = load_json(ENTITY_STYLES_FILE) or {"groups": {}, "layers": {}}
@@ -792,31 +1654,52 @@ def load_layers_config():
     }
 
 
-def process_buildings(buildings_data, custom_buildings, default_color_hex):
-    """Process all buildings and return CZML packets."""
-    packets = []
-    default_color = hex_to_rgba(default_color_hex)
-
-    # Process parametric buildings from buildings_1650.json
-    if buildings_data:
-        for building in buildings_data.get("buildings", []):
-            print(f"  Building: {building['name']}")
-            if building.get("type") == "custom":
-                base_entities = building["entities"]
-            else:
-                base_entities = generate_building(building)
-            packets.extend(expand_building_to_czml(building, base_entities, default_color))
+def building_packets(building, default_color, config):
+    """Generate all CZML packets for one building (parametric or custom)."""
+    if building.get("type") == "custom":
+        base_entities = building["entities"]
+    else:
+        base_entities = generate_building(building)
+    with span("expand.periods") as timed:
+        packets = expand_building_to_czml(building, base_entities, default_color, config)
+        timed.items = len(packets)
+    return coalesce_packets(packets, config["coalesce"]) if config.get("coalesce") else packets
 
-    # Process custom buildings from buildings/*.json
-    for building in custom_buildings:
-        print(f"  Custom: {building['name']}")
-        if building.get("type") == "custom":
-            base_entities = building["entities"]
-        else:
-            base_entities = generate_building(building)
-        packets.extend(expand_building_to_czml(building, base_entities, default_color))
 
-    return packets
+def expand_building_chunk(buildings, default_color, config):
+    """Expand a chunk of buildings into serialized packets, one list per building.
+
+    This is the unit of work for --jobs. Everything it depends on is passed
+    in, so it behaves the same in a worker process as in the parent. None
+    entries (files that failed to load) yield an empty list.
+    """
+    loaded = [b for b in buildings if b is not None]
+    expanded = expand_buildings(loaded, default_color, config)
+    return [
+        [serialize_packet(p, config.get("compact")) for p in next(expanded)] if b is not None else []
+        for b in buildings
+    ]
+
+
+def ordered_map(fn, tasks, jobs, *args):
+    """Yield fn(task, *args) for each task in order, over a process pool when jobs > 1.
+
+    At most 2 * jobs tasks are in flight, so results never pile up in memory
+    faster than the caller consumes them.
+    """
+    if jobs <= 1:
+        for task in tasks:
+            yield fn(task, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(pool.submit(fn, task, *args))
+            if len(in_flight) >= 2 * jobs:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
 
 
 def process_geojson_feature(feature, color_hex, group, index):
@@ -873,30 +1756,375 @@ def process_geojson_feature(feature, color_hex, group, index):
     return None
 
 
-def process_unified_sites(unified_data, source_to_style, start_index):
-    """Process unified_sites.geojson into CZML packets."""
+def _farthest(points, first, last):
+    """Index and distance of the point between first and last farthest from their chord."""
+    (ax, ay), (bx, by) = points[first], points[last]
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if np is not None and last - first > 32:
+        px = points[first + 1:last, 0] - ax
+        py = points[first + 1:last, 1] - ay
+        t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0) if length_sq else 0.0
+        dist = np.hypot(px - t * dx, py - t * dy)
+        k = int(dist.argmax())
+        return first + 1 + k, float(dist[k])
+    worst, worst_dist = first + 1, -1.0
+    for i in range(first + 1, last):
+        px, py = points[i][0] - ax, points[i][1] - ay
+        t = max(0.0, min(1.0, (px * dx + py * dy) / length_sq)) if length_sq else 0.0
+        dist = math.hypot(px - t * dx, py - t * dy)
+        if dist > worst_dist:
+            worst, worst_dist = i, dist
+    return worst, worst_dist
+
+
+def dp_significance(points, first, last, floor, significance):
+    """Fill in each point's Douglas-Peucker significance between first and last.
+
+    A point's significance is the largest tolerance at which Douglas-Peucker
+    keeps it (its split distance, capped by its parent's), so one pass serves
+    every level: simplifying to tolerance T keeps the points above T. Points
+    below `floor` are left at 0.
+    """
+    stack = [(first, last, math.inf)]
+    while stack:
+        first, last, parent = stack.pop()
+        if last - first < 2:
+            continue
+        i, dist = _farthest(points, first, last)
+        if dist <= floor:
+            continue
+        dist = min(dist, parent)
+        significance[i] = dist
+        stack.extend(((first, i, dist), (i, last, dist)))
+
+
+def simplification_significance(coords, closed, floor):
+    """Douglas-Peucker significance for [[lon, lat], ...] measured in local meters.
+
+    Closed rings are split at the vertex farthest from the start, so both
+    halves keep a non-degenerate chord.
+    """
+    lat0 = math.radians(coords[0][1])
+    kx, ky = 111320 * math.cos(lat0), 110540
+    points = [(c[0] * kx, c[1] * ky) for c in coords]
+    last = len(points) - 1
+    significance = [0.0] * len(points)
+    significance[0] = significance[last] = math.inf
+    split = [last]
+    if closed:
+        ax, ay = points[0]
+        far = max(range(len(points)), key=lambda i: (points[i][0] - ax) ** 2 + (points[i][1] - ay) ** 2)
+        if 0 < far < last:
+            significance[far] = math.inf
+            split = [far, last]
+    if np is not None:
+        points = np.array(points)
+    for first, end in zip([0] + split, split):
+        dp_significance(points, first, end, floor, significance)
+    return significance
+
+
+def _segments_cross(p1, p2, p3, p4):
+    def orient(a, b, c):
+        return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    d1, d2 = orient(p3, p4, p1), orient(p3, p4, p2)
+    d3, d4 = orient(p1, p2, p3), orient(p1, p2, p4)
+    return d1 * d2 < 0 and d3 * d4 < 0
+
+
+def ring_is_simple(ring):
+    """True if a closed ring has at least three distinct vertices and no crossing edges.
+
+    Edges are bucketed on a grid of about one edge per cell, so only edges
+    sharing a cell are tested against each other.
+    """
+    if len(ring) < 4 or len(set(map(tuple, ring[:-1]))) < 3:
+        return False
+    edges = list(zip(ring, ring[1:]))
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    size = max(max(xs) - min(xs), max(ys) - min(ys)) / math.sqrt(len(edges)) or 1.0
+    x0, y0 = min(xs), min(ys)
+    buckets = {}
+    last = len(edges) - 1
+    for i, (a, b) in enumerate(edges):
+        tested = set()
+        for cx in range(int((min(a[0], b[0]) - x0) / size), int((max(a[0], b[0]) - x0) / size) + 1):
+            for cy in range(int((min(a[1], b[1]) - y0) / size), int((max(a[1], b[1]) - y0) / size) + 1):
+                bucket = buckets.setdefault((cx, cy), [])
+                for j in bucket:
+                    if j in tested or i - j == 1 or (j == 0 and i == last):
+                        continue  # neighbours share a vertex
+                    tested.add(j)
+                    if _segments_cross(a, b, *edges[j]):
+                        return False
+                bucket.append(i)
+    return True
+
+
+def simplify_coords(coords, significance, tolerance, closed):
+    """Keep the points of coords whose significance exceeds a tolerance in meters.
+
+    A ring that would self-intersect or collapse is retried at half the
+    tolerance, so a level never changes a polygon's topology; None means no
+    valid simplification was found.
+    """
+    for threshold in (tolerance, tolerance / 2):
+        simplified = [c for c, sig in zip(coords, significance) if sig > threshold]
+        if not closed or ring_is_simple(simplified):
+            return simplified
+    return None
+
+
+def lod_packets(packet, tolerances):
+    """Split a reference polygon/polyline packet into distance-banded LOD packets.
+
+    Level 0 keeps the full geometry (and the packet id) and is shown up close;
+    each coarser level is simplified to the next tolerance, shown from
+    tolerance * SIMPLIFY_DISTANCE_FACTOR meters, with id "{id}~lod{n}". Levels
+    that don't drop any vertices are folded into the previous one.
+    """
+    kind = "polygon" if "polygon" in packet else "polyline" if "polyline" in packet else None
+    if kind is None or not tolerances:
+        return [packet]
+    flat = packet[kind]["positions"]["cartographicDegrees"]
+    coords = [flat[i:i + 3] for i in range(0, len(flat), 3)]
+    closed = kind == "polygon"
+    if closed and coords[0] != coords[-1]:
+        coords.append(coords[0])
+
+    levels = [(0, coords)]
+    if len(coords) > 2:
+        significance = simplification_significance(coords, closed, min(tolerances) / 2)
+        for tolerance in tolerances:
+            simplified = simplify_coords(coords, significance, tolerance, closed)
+            if simplified and len(simplified) < len(levels[-1][1]):
+                levels.append((tolerance * SIMPLIFY_DISTANCE_FACTOR, simplified))
+    if len(levels) == 1:
+        return [packet]
+
     packets = []
-    if not unified_data:
-        return packets
+    for n, (near, level_coords) in enumerate(levels):
+        graphics = dict(packet[kind])
+        if n:
+            graphics["positions"] = {"cartographicDegrees": [v for c in level_coords for v in c]}
+        far = levels[n + 1][0] if n + 1 < len(levels) else 1e12
+        graphics["distanceDisplayCondition"] = {"distanceDisplayCondition": [near, far]}
+        level = {**packet, kind: graphics}
+        if n:
+            level["id"] = f"{packet['id']}~lod{n}"
+        packets.append(level)
+    return packets
+
+
+def geometry_bbox(coords):
+    """(west, south, east, north) of nested GeoJSON coordinates, or None if empty."""
+    west = south = math.inf
+    east = north = -math.inf
+    stack = [coords]
+    while stack:
+        item = stack.pop()
+        if not item:
+            continue
+        if isinstance(item[0], (int, float)):
+            west, east = min(west, item[0]), max(east, item[0])
+            south, north = min(south, item[1]), max(north, item[1])
+        else:
+            stack.extend(item)
+    return (west, south, east, north) if west <= east else None
+
+
+def feature_bbox(feature):
+    """Bounding box of a GeoJSON feature's geometry, or None if it has none."""
+    return geometry_bbox((feature.get("geometry") or {}).get("coordinates"))
+
+
+def bbox_outside(bbox, bounds):
+    """True if `bbox` misses the project `bounds`; features without a bbox are never outside."""
+    return bool(bounds and bbox and (bbox[2] < bounds["west"] or bbox[0] > bounds["east"]
+                                     or bbox[3] < bounds["south"] or bbox[1] > bounds["north"]))
+
+
+def feature_years(props):
+    """(start, end) years of a feature, with the defaults process_geojson_feature uses."""
+    return props.get("start_year", 0), props.get("end_year", 2100)
+
+
+def feature_kind(feature):
+    """Dedupe key of a feature: its geometry type and category ("category" or "type")."""
+    props = feature.get("properties") or {}
+    return feature["geometry"].get("type"), props.get("category", props.get("type"))
+
+
+def normalize_name(name):
+    """Lower-cased name with punctuation dropped and whitespace collapsed, or "" if unnamed."""
+    return " ".join(re.sub(r"[^\w\s]", " ", str(name or "").lower()).split())
+
+
+def similar_names(a, b, threshold=DEDUPE_NAME_SIMILARITY):
+    """True if two normalized names could name the same site; an unnamed feature matches any."""
+    if not a or not b or a == b or a in b or b in a:
+        return True
+    return SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+class DuplicateIndex:
+    """Grid index over kept features for finding near-duplicates.
+
+    Bounding boxes are projected to local meters and bucketed by their centre
+    on a grid of `distance`-sized cells, so two boxes whose edges are all
+    within `distance` of each other are always in neighbouring cells and each
+    lookup only tests a handful of candidates. Candidates must also share the
+    kind (see feature_kind), overlap in years and have similar names.
+    """
+
+    def __init__(self, distance, lat0):
+        self.distance = distance
+        self.kx, self.ky = 111320 * math.cos(math.radians(lat0)), 110540
+        self.cells = {}
+        self.boxes = array("d")
+        self.years = []
+        self.names = []
+
+    def _project(self, bbox):
+        west, south, east, north = bbox
+        return west * self.kx, south * self.ky, east * self.kx, north * self.ky
+
+    def _cell(self, box):
+        return (int(math.floor((box[0] + box[2]) / 2 / self.distance)),
+                int(math.floor((box[1] + box[3]) / 2 / self.distance)))
+
+    def find(self, kind, bbox, years, name=""):
+        """Slot of a kept feature of this kind near bbox whose years overlap, or None.
+
+        `name` is a normalize_name result.
+        """
+        box = self._project(bbox)
+        cx, cy = self._cell(box)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for slot in self.cells.get((kind, cx + dx, cy + dy), ()):
+                    start, end = self.years[slot]
+                    if start > years[1] or end < years[0]:
+                        continue
+                    if not similar_names(name, self.names[slot]):
+                        continue
+                    other = self.boxes[4 * slot:4 * slot + 4]
+                    if all(abs(a - b) <= self.distance for a, b in zip(box, other)):
+                        return slot
+        return None
+
+    def add(self, kind, bbox, years, name=""):
+        """Index a kept feature, returning its slot."""
+        box = self._project(bbox)
+        slot = len(self.years)
+        self.boxes.extend(box)
+        self.years.append(years)
+        self.names.append(name)
+        self.cells.setdefault((kind, *self._cell(box)), []).append(slot)
+        return slot
+
+
+def filter_unified_sites(read_features, bounds=None, dedupe=None, stats=None):
+    """Yield reference features that fall in `bounds` with near-duplicates merged.
+
+    `read_features` returns a fresh feature iterator and is called once per
+    pass. Features whose bounding box misses the project bounds are dropped.
+    With `dedupe` (meters) a first pass indexes the features in a
+    DuplicateIndex and folds each one into an earlier feature of the same
+    geometry type and category within that distance whose years overlap and
+    whose name is similar; the survivor takes the union of their years and
+    lists its own and the merged sources in "merged_sources". Matching uses
+    each survivor's own years, so a merge never widens what it will match
+    next. Clipped/merged counts are added to `stats`.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("clipped", 0)
+    stats.setdefault("merged", 0)
+
+    def in_bounds(feature):
+        bbox = feature_bbox(feature)
+        if bbox_outside(bbox, bounds):
+            return None
+        return bbox or False
+
+    merged_into = {}  # feature number -> survivor feature number
+    survivors = {}  # survivor feature number -> [start, end, merged sources]
+    if dedupe:
+        index = None
+        slots = []  # index slot -> (survivor feature number, its source)
+        for n, feature in enumerate(read_features()):
+            bbox = in_bounds(feature)
+            if not bbox:
+                continue
+            if index is None:
+                lat0 = (bounds["south"] + bounds["north"]) / 2 if bounds else bbox[1]
+                index = DuplicateIndex(dedupe, lat0)
+            props = feature.get("properties") or {}
+            kind = feature_kind(feature)
+            years = feature_years(props)
+            name = normalize_name(props.get("name"))
+            slot = index.find(kind, bbox, years, name)
+            if slot is None:
+                slots.append((n, props.get("source", "unknown")))
+                index.add(kind, bbox, years, name)
+                continue
+            target, source = slots[slot]
+            merged_into[n] = target
+            survivor = survivors.setdefault(target, [*index.years[slot], {source}])
+            survivor[0], survivor[1] = min(survivor[0], years[0]), max(survivor[1], years[1])
+            survivor[2].add(props.get("source", "unknown"))
+
+    for n, feature in enumerate(read_features()):
+        if in_bounds(feature) is None:
+            stats["clipped"] += 1
+            continue
+        if n in merged_into:
+            stats["merged"] += 1
+            continue
+        if n in survivors:
+            start, end, sources = survivors[n]
+            props = dict(feature.get("properties") or {})
+            props["start_year"], props["end_year"] = start, end
+            props["merged_sources"] = sorted(sources)
+            feature = {**feature, "properties": props}
+        yield feature
+
+
+def process_unified_sites(features, source_to_style, start_index, simplify=None):
+    """Process unified_sites.geojson, yielding CZML packets.
+
+    `features` is any iterable of GeoJSON features (normally the streaming
+    iter_geojson_features reader); a parsed FeatureCollection dict also works.
+    With `simplify` (tolerances in meters) lines and polygons are emitted as
+    distance-banded levels of detail (see lod_packets).
+    """
+    if not features:
+        return
+    if isinstance(features, dict):
+        features = features.get("features", [])
 
-    features = unified_data.get("features", [])
     for i, feature in enumerate(features):
         props = feature.get("properties", {})
         source = props.get("source", "unknown")
         style = source_to_style.get(source, {"color": "#888888", "group": "reference"})
 
-        packet = process_geojson_feature(feature, style["color"], style["group"], start_index + i)
-        if packet:
-            packets.append(packet)
-
-    return packets
+        with span("geojson.feature"):
+            packet = process_geojson_feature(feature, style["color"], style["group"], start_index + i)
+        if packet and simplify:
+            with span("simplify") as timed:
+                levels = lod_packets(packet, simplify)
+                timed.items = len(levels)
+            yield from levels
+        elif packet:
+            yield packet
 
 
 def process_sites(sites_data, layers_config, start_index):
-    """Process sites.json into CZML packets."""
-    packets = []
+    """Process sites.json, yielding CZML packets."""
     if not sites_data:
-        return packets
+        return
 
     layer_defs = load_json(ENTITY_STYLES_FILE) or {}
     layer_defs = layer_defs.get("layers", {})
@@ -910,30 +2138,937 @@ def process_sites(sites_data, layers_config, start_index):
         color = layer_def.get("color", "#888888")
         group = layer_def.get("group", "curated")
 
-        packet = process_geojson_feature(feature, color, group, start_index + i)
+        with span("geojson.feature"):
+            packet = process_geojson_feature(feature, color, group, start_index + i)
         if packet:
-            packets.append(packet)
+            yield packet
 
-    return packets
+
+# =============================================================================
+# CZML Output
+# =============================================================================
+
+def quantize_positions(positions, compact):
+    """Round a flat [lon, lat, h, ...] list to the compact precision."""
+    digits, height_digits = compact["precision"], compact["height_precision"]
+    return [
+        round(v, digits) if i % 3 != 2 else quantize_height(v, height_digits)
+        for i, v in enumerate(positions)
+    ]
+
+
+def quantize_height(value, digits):
+    value = round(value, digits)
+    return int(value) if value == int(value) else value
+
+
+def quantize_packet(packet, compact):
+    """Round a packet's positions and heights in place; return the packet."""
+    for kind in ("polygon", "polyline"):
+        if kind in packet:
+            graphics = packet[kind]
+            positions = graphics["positions"]
+            for interval in positions if isinstance(positions, list) else [positions]:
+                interval["cartographicDegrees"] = quantize_positions(interval["cartographicDegrees"], compact)
+            for field in ("height", "extrudedHeight"):
+                if isinstance(graphics.get(field), float):
+                    graphics[field] = quantize_height(graphics[field], compact["height_precision"])
+    if "position" in packet:
+        position = packet["position"]
+        position["cartographicDegrees"] = quantize_positions(position["cartographicDegrees"], compact)
+    return packet
+
+
+def serialize_packet(packet, compact=None):
+    """Serialize one packet (a dict or PolygonRecord) as a CZML document list item.
+
+    By default the text matches json.dump(czml, indent=2) exactly. With a
+    compact profile (config["compact"]) positions are quantized and the JSON
+    is minified.
+    """
+    with span("serialize"):
+        if type(packet) is PolygonRecord:
+            if not compact:
+                return serialize_polygon_record(packet)
+            packet = packet.to_packet()
+        if compact:
+            return json.dumps(quantize_packet(packet, compact), separators=(",", ":"))
+        return "  " + json.dumps(packet, indent=2).replace("\n", "\n  ")
+
+
+def _polygon_record_template():
+    """str.format() template of a serialized make_polygon_packet(), plus each list field's indent.
+
+    Derived from the real packet so the fast path can't drift from it.
+    """
+    fields = {"id": "id", "name": "name", "availability_str": "availability", "cartographic": "positions",
+              "height": "height", "extruded_height": "extruded_height", "color_rgba": "rgba"}
+    packet = make_polygon_packet(coords=None, **{arg: f"@{field}@" for arg, field in fields.items()})
+    template = ("  " + json.dumps(packet, indent=2).replace("\n", "\n  ")).replace("{", "{{").replace("}", "}}")
+    indents = {}
+    for field in fields.values():
+        token = json.dumps(f"@{field}@")
+        line = next(line for line in template.splitlines() if token in line)
+        indents[field] = len(line) - len(line.lstrip(" "))
+        template = template.replace(token, "{" + field + "}")
+    return template, indents
+
+
+POLYGON_RECORD_TEMPLATE, _POLYGON_RECORD_INDENTS = _polygon_record_template()
+_POSITIONS_OPEN = "[\n" + " " * (_POLYGON_RECORD_INDENTS["positions"] + 2)
+_POSITIONS_SEP = ",\n" + " " * (_POLYGON_RECORD_INDENTS["positions"] + 2)
+_POSITIONS_CLOSE = "\n" + " " * _POLYGON_RECORD_INDENTS["positions"] + "]"
+_RGBA_TEXT = {}
+
+
+def serialize_polygon_record(record):
+    """serialize_packet(record.to_packet()) without building the dict."""
+    lonlat = record.lonlat
+    if lonlat:
+        sep = _POSITIONS_SEP
+        positions = (_POSITIONS_OPEN
+                     + sep.join([f"{lon!r}{sep}{lat!r}{sep}0" for lon, lat in zip(lonlat[0::2], lonlat[1::2])])
+                     + _POSITIONS_CLOSE)
+    else:
+        positions = "[]"
+    rgba = _RGBA_TEXT.get(record.color)
+    if rgba is None:
+        indent = "\n" + " " * _POLYGON_RECORD_INDENTS["rgba"]
+        rgba = _RGBA_TEXT[record.color] = json.dumps(list(record.color), indent=2).replace("\n", indent)
+    return POLYGON_RECORD_TEMPLATE.format(
+        id=json.dumps(record.id),
+        name=json.dumps(record.name),
+        availability=json.dumps(record.availability),
+        positions=positions,
+        height=json.dumps(record.height),
+        extruded_height=json.dumps(record.extruded_height),
+        rgba=rgba,
+    )
+
+
+class PacketStream:
+    """Write serialized packets to a file as a comma-separated run of list items."""
+
+    def __init__(self, f, compact=None):
+        self.f = f
+        self.compact = compact
+        self.separator = "," if compact else ",\n"
+        self.count = 0
+
+    def write(self, packet):
+        """Append a packet dict, or a packet already passed through serialize_packet."""
+        self.write_text(packet if isinstance(packet, str) else serialize_packet(packet, self.compact))
+
+    def write_text(self, text, count=1):
+        """Append already-serialized packets (one, or a spliced fragment of `count`)."""
+        if not count:
+            return
+        if self.count:
+            self.f.write(self.separator)
+        self.f.write(text)
+        self.count += count
+
+    def write_file(self, path, count):
+        """Append a fragment file without loading it into memory."""
+        if not count:
+            return
+        if self.count:
+            self.f.write(self.separator)
+        with open(path) as src:
+            shutil.copyfileobj(src, self.f, 1 << 20)
+        self.count += count
+
+
+class CzmlWriter(PacketStream):
+    """Stream a CZML document to disk packet by packet.
+
+    The document packet must be written first. Output goes to a temp file that
+    replaces the target on a clean exit, so a failed build never leaves a
+    truncated entities.czml behind. Compact documents also get precompressed
+    sidecars (see write_sidecars); otherwise stale sidecars are removed.
+    """
+
+    def __init__(self, path, compact=None):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        super().__init__(None, compact)
+
+    def __enter__(self):
+        self.f = open(self.tmp, "w", buffering=1 << 20)
+        self.f.write("[" if self.compact else "[\n")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.f.write("]" if self.compact else "\n]")
+        self.f.close()
+        if exc_type is None:
+            os.replace(self.tmp, self.path)
+            if self.compact:
+                write_sidecars(self.path)
+            else:
+                remove_sidecars(self.path)
+        else:
+            self.tmp.unlink(missing_ok=True)
+        return False
+
+
+SIDECAR_SUFFIXES = (".gz", ".br")
+
+
+def write_sidecars(path):
+    """Write <path>.gz (and <path>.br if brotli is installed) for static hosting.
+
+    Sidecars are written atomically and deterministically (no gzip mtime),
+    so unchanged output produces byte-identical sidecars.
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".gz.tmp")
+    with open(path, "rb") as src, open(tmp, "wb") as raw:
+        with gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=9, mtime=0) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    os.replace(tmp, path.with_name(path.name + ".gz"))
+
+    if brotli is None:
+        path.with_name(path.name + ".br").unlink(missing_ok=True)
+        return
+    tmp = path.with_name(path.name + ".br.tmp")
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY, lgwin=22)
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        while chunk := src.read(1 << 20):
+            dst.write(compressor.process(chunk))
+        dst.write(compressor.finish())
+    os.replace(tmp, path.with_name(path.name + ".br"))
+
+
+def remove_sidecars(path):
+    for suffix in SIDECAR_SUFFIXES:
+        Path(path).with_name(Path(path).name + suffix).unlink(missing_ok=True)
+
+
+def packet_id(packet):
+    """Return the id of a packet dict or of a serialized packet ("id" is always the first key)."""
+    if not isinstance(packet, str):
+        return packet["id"]
+    start = packet.index('"id":') + 5
+    while packet[start] in " \t\r\n":
+        start += 1
+    return json.JSONDecoder().raw_decode(packet, start)[0]
+
+
+def iter_fragment(path, compact=None):
+    """Yield each serialized packet in a cached fragment file, streaming it from disk."""
+    with open(path) as f:
+        yield from iter_fragment_packets(f, compact)
+
+
+def iter_fragment_packets(f, compact=None):
+    """Yield each serialized packet in a fragment read from a text file object."""
+    indent = "" if compact else "  "
+    stream = _JsonStream("", f, 1 << 16)
+    while True:
+        ch = stream.peek()
+        if not ch:
+            return
+        if ch == ",":
+            stream.pos += 1
+            continue
+        yield indent + stream.raw_value()[1]
+
+
+PACKET_ID_RE = re.compile(r'("id":\s*"(?:[^"\\]|\\.)*_)(\d+)((?:~lod\d+)?")')
+
+
+def renumber_packet(text, offset):
+    """Shift the index in a serialized packet's "{source}_{index}" id by `offset`.
+
+    The id is always a packet's first key, so only the first match is touched.
+    """
+    return PACKET_ID_RE.sub(lambda m: f"{m[1]}{int(m[2]) + offset}{m[3]}", text, count=1)
+
+
+class ShardedCzmlWriter:
+    """Route packets into one CZML document per map period plus a common shard.
+
+    Building packets carry a "__{period_id}" id suffix and go to that
+    period's shard (runs merged by --coalesce, "__{first}..{last}", go to
+    every shard they cover); everything else (reference and curated sites,
+    interval-valued entities) goes to common.czml, which the viewer loads
+    alongside whichever period is current. Each shard starts with the document packet. manifest.json lists
+    every shard's year range, entity count and size.
+    """
+
+    def __init__(self, out_dir, document, config):
+        self.dir = Path(out_dir)
+        self.document = document
+        self.periods = config["map_periods"]
+        self.compact = config.get("compact")
+        self.writers = {}
+        self.count = 0
+
+    def __enter__(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for shard in [*self.periods, "common"]:
+            writer = CzmlWriter(self.dir / f"{shard}.czml", self.compact).__enter__()
+            writer.write(self.document)
+            self.writers[shard] = writer
+        return self
+
+    def shards_for(self, packet):
+        _, _, suffix = packet_id(packet).rpartition("__")
+        first, _, last = suffix.partition("..")
+        order = list(self.periods)
+        if first not in self.periods or (last and last not in self.periods):
+            return ["common"]
+        return order[order.index(first):order.index(last or first) + 1]
+
+    def write(self, packet):
+        if not isinstance(packet, str):
+            packet = serialize_packet(packet, self.compact)
+        for shard in self.shards_for(packet):
+            self.writers[shard].write(packet)
+        self.count += 1
+
+    def write_text(self, text, count=1):
+        self.write(text)
+
+    def write_file(self, path, count):
+        for text in iter_fragment(path, self.compact):
+            self.write(text)
+
+    def __exit__(self, exc_type, exc, tb):
+        for writer in self.writers.values():
+            writer.__exit__(exc_type, exc, tb)
+        if exc_type is not None:
+            return False
+
+        def entry(shard):
+            path = self.dir / f"{shard}.czml"
+            return {"url": path.name, "entities": self.writers[shard].count - 1,
+                    "bytes": path.stat().st_size}
+
+        manifest = {
+            "version": 1,
+            "shards": [
+                {"id": period_id, "start": period["start"], "stop": period["stop"], **entry(period_id)}
+                for period_id, period in self.periods.items()
+            ],
+            "common": entry("common"),
+        }
+        with open(self.dir / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Drop shards of periods that no longer exist
+        for path in self.dir.glob("*.czml"):
+            if path.stem not in self.writers:
+                path.unlink()
+                remove_sidecars(path)
+        return False
+
+
+def packet_positions(packet):
+    """Return the flat cartographicDegrees list of a packet's geometry, or None.
+
+    Interval-valued positions (--coalesce intervals) are concatenated.
+    """
+    for kind in ("polygon", "polyline"):
+        if kind in packet:
+            positions = packet[kind]["positions"]
+            if isinstance(positions, list):
+                return [v for interval in positions for v in interval["cartographicDegrees"]]
+            return positions["cartographicDegrees"]
+    if "position" in packet:
+        return packet["position"]["cartographicDegrees"]
+    return None
+
+
+def packet_extent(packet):
+    """Return (west, south, east, north, start_year, stop_year) for a packet.
+
+    Bbox entries are None for packets without geometry; the years are
+    -inf/inf when the packet has no availability.
+    """
+    if isinstance(packet, str):
+        packet = json.loads(packet)
+    start, stop = -math.inf, math.inf
+    if "availability" in packet:
+        availability = packet["availability"]
+        intervals = [availability] if isinstance(availability, str) else availability
+        start = min(iso_year(interval.partition("/")[0]) for interval in intervals)
+        stop = max(iso_year(interval.partition("/")[2]) for interval in intervals)
+    positions = packet_positions(packet)
+    if not positions:
+        return None, None, None, None, start, stop
+    lons, lats = positions[0::3], positions[1::3]
+    return min(lons), min(lats), max(lons), max(lats), start, stop
+
+
+class TiledCzmlWriter:
+    """Split packets into quadtree tiles over the project bounds.
+
+    Packets are spooled to disk with their bbox and year span as they
+    arrive; on exit the bounds are subdivided until no tile holds more than
+    `max_packets` packets (each packet goes to the quadrant containing its
+    bbox centre). Every leaf becomes a CZML document named by its quadkey,
+    and index.json lists each tile's content bbox, year span and size so
+    the viewer can fetch only the tiles in view.
+    """
+
+    def __init__(self, out_dir, document, bounds=None, max_packets=TILE_MAX_PACKETS, compact=None):
+        self.dir = Path(out_dir)
+        self.document = document
+        self.compact = compact
+        self.bounds = bounds
+        self.max_packets = max_packets
+        self.offsets = array("q")
+        self.extents = [array("d") for _ in range(6)]  # west, south, east, north, start, stop
+        self.count = 0
+
+    def __enter__(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.spool_path = self.dir / "tiles.spool"
+        self.spool = open(self.spool_path, "w+b")
+        return self
+
+    def write(self, packet):
+        extent = packet_extent(packet)
+        text = packet if isinstance(packet, str) else serialize_packet(packet, self.compact)
+        self.offsets.append(self.spool.tell())
+        self.spool.write(text.encode())
+        for column, value in zip(self.extents, extent):
+            column.append(math.nan if value is None else value)
+        self.count += 1
+
+    def write_text(self, text, count=1):
+        self.write(text)
+
+    def write_file(self, path, count):
+        for text in iter_fragment(path, self.compact):
+            self.write(text)
+
+    def root_cell(self):
+        if self.bounds:
+            b = self.bounds
+            return b["west"], b["south"], b["east"], b["north"]
+        west, south, east, north = (
+            [v for v in column if not math.isnan(v)] for column in self.extents[:4])
+        if not west:
+            return -180.0, -90.0, 180.0, 90.0
+        return min(west), min(south), max(east), max(north)
+
+    def leaves(self, cell):
+        """Yield (quadkey, cell, packet indices) for each non-empty leaf tile."""
+        west, south, east, north = self.extents[:4]
+        xs = array("d", ((w + e) / 2 for w, e in zip(west, east)))
+        ys = array("d", ((s + n) / 2 for s, n in zip(south, north)))
+        for i in range(self.count):
+            if math.isnan(xs[i]):  # no geometry: root centre
+                xs[i], ys[i] = (cell[0] + cell[2]) / 2, (cell[1] + cell[3]) / 2
+
+        stack = [("", cell, list(range(self.count)))]
+        while stack:
+            key, (w, s, e, n), items = stack.pop()
+            if len(items) <= self.max_packets or len(key) >= TILE_MAX_DEPTH:
+                if items:
+                    yield key, (w, s, e, n), items
+                continue
+            mx, my = (w + e) / 2, (s + n) / 2
+            quadrants = ([], [], [], [])  # quadkey digits: 0 NW, 1 NE, 2 SW, 3 SE
+            for i in items:
+                quadrants[(ys[i] < my) * 2 + (xs[i] >= mx)].append(i)
+            cells = ((w, my, mx, n), (mx, my, e, n), (w, s, mx, my), (mx, s, e, my))
+            for digit in (3, 2, 1, 0):
+                stack.append((key + str(digit), cells[digit], quadrants[digit]))
+
+    def tile_entry(self, key, cell, items):
+        """Write one tile document and return its index entry."""
+        path = self.dir / f"{key or 'root'}.czml"
+        with CzmlWriter(path, self.compact) as writer:
+            writer.write(self.document)
+            for i in items:
+                start = self.offsets[i]
+                end = self.offsets[i + 1] if i + 1 < self.count else self.spool_end
+                self.spool.seek(start)
+                writer.write_text(self.spool.read(end - start).decode())
+
+        def extreme(column, pick):
+            values = [column[i] for i in items if not math.isnan(column[i])]
+            value = pick(values) if values else None
+            return None if value is None or math.isinf(value) else value
+
+        def year_or_none(value):
+            return None if value is None else int(value)
+
+        west, south, east, north, start, stop = self.extents
+        bbox = [extreme(west, min), extreme(south, min), extreme(east, max), extreme(north, max)]
+        if None in bbox:
+            bbox = list(cell)
+        return {
+            "id": key,
+            "url": path.name,
+            "bbox": bbox,
+            "cell": list(cell),
+            "start": year_or_none(extreme(start, min)),
+            "stop": year_or_none(extreme(stop, max)),
+            "entities": len(items),
+            "bytes": path.stat().st_size,
+        }
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                return False
+            self.spool_end = self.spool.tell()
+            root = self.root_cell()
+            tiles = [self.tile_entry(*leaf) for leaf in self.leaves(root)]
+            index = {
+                "version": 1,
+                "bounds": dict(zip(("west", "south", "east", "north"), root)),
+                "maxPackets": self.max_packets,
+                "tiles": tiles,
+            }
+            with open(self.dir / "index.json", "w") as f:
+                json.dump(index, f, indent=2)
+
+            # Drop tiles left over from a previous subdivision
+            written = {tile["url"] for tile in tiles}
+            for path in self.dir.glob("*.czml"):
+                if path.name not in written:
+                    path.unlink()
+                    remove_sidecars(path)
+            print(f"  Wrote {len(tiles)} tiles (max {self.max_packets} packets per tile)")
+            return False
+        finally:
+            self.spool.close()
+            self.spool_path.unlink(missing_ok=True)
+
+
+# Every packet this script emits has its availability (an interval, or a list
+# of them) before any graphics or properties, so the first match in
+# serialized text is the packet's own
+AVAILABILITY_RE = re.compile(r'"availability":\s*("[^"]*"|\[[^\]]*\])')
+
+
+class TemporalIndexWriter:
+    """Pass packets through to a CZML writer, indexing their availability.
+
+    Accepts the same write/write_text/write_file calls as the writer it
+    wraps; save() writes the temporal index (see temporal_index.py) once the
+    build has succeeded.
+    """
+
+    def __init__(self, path, stream):
+        self.path = Path(path)
+        self.stream = stream
+        self.compact = stream.compact
+        self.index = TemporalIndexBuilder()
+
+    @property
+    def count(self):
+        return self.stream.count
+
+    def add_text(self, text):
+        match = AVAILABILITY_RE.search(text)
+        self.index.add(packet_id(text), json.loads(match.group(1)) if match else None)
+
+    def write(self, packet):
+        if isinstance(packet, str):
+            self.add_text(packet)
+        else:
+            self.index.add(packet["id"], packet.get("availability"))
+        self.stream.write(packet)
+
+    def write_text(self, text, count=1):
+        if count == 1:
+            self.add_text(text)
+        else:
+            for packet in json.loads("[" + text + "]"):
+                self.index.add(packet["id"], packet.get("availability"))
+        self.stream.write_text(text, count)
+
+    def write_file(self, path, count):
+        for text in iter_fragment(path, self.compact):
+            self.add_text(text)
+        self.stream.write_file(path, count)
+
+    def save(self):
+        self.index.write(self.path)
+        print(f"  Indexed {len(self.index.ids)} entities by year: {self.path.name}")
+
+
+class GeometryBufferWriter:
+    """Pass packets through to a CZML writer, copying their positions.
+
+    Wraps a writer like TemporalIndexWriter does (the two can be stacked);
+    save() writes the geometry buffer (see geometry_buffer.py) once the
+    build has succeeded. Serialized packets are parsed once here, so the
+    buffer holds exactly the (possibly quantized) numbers in the CZML.
+    """
+
+    def __init__(self, path, stream, float_size=8):
+        self.path = Path(path)
+        self.stream = stream
+        self.compact = stream.compact
+        self.buffer = GeometryBufferBuilder(float_size)
+
+    @property
+    def count(self):
+        return self.stream.count
+
+    def write(self, packet):
+        self.buffer.add_packet(json.loads(packet) if isinstance(packet, str) else packet)
+        self.stream.write(packet)
+
+    def write_text(self, text, count=1):
+        for packet in json.loads("[" + text + "]"):
+            self.buffer.add_packet(packet)
+        self.stream.write_text(text, count)
+
+    def write_file(self, path, count):
+        for text in iter_fragment(path, self.compact):
+            self.buffer.add_packet(json.loads(text))
+        self.stream.write_file(path, count)
+
+    def save(self):
+        self.buffer.write(self.path)
+        print(f"  Wrote {len(self.buffer.values) // 3} positions of {len(set(self.buffer.ids))} entities: "
+              f"{self.path.name}")
 
 
 # =============================================================================
-# Main
+# Build Cache
 # =============================================================================
 
-def main():
-    print("Building CZML...")
+def content_hash(*parts):
+    """Stable SHA-256 over JSON-serializable parts."""
+    return hash_parts(hashlib.sha256(), parts).hexdigest()
 
-    # Load project configuration (sets MAP_PERIODS, MATERIAL_COLORS, etc.)
-    project_config = load_project_config()
-    project_name = project_config.get("name", "Historical GIS") if project_config else "Historical GIS"
-    default_year = project_config.get("defaultYear", 1650) if project_config else 1650
 
-    # Load layer configuration
-    layers_config = load_layers_config()
+def hash_parts(h, parts):
+    """Feed JSON-serializable parts to a hasher, as content_hash does; return it."""
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, separators=(",", ":")).encode())
+        h.update(b"\0")
+    return h
+
+
+def file_digest(path, previous=None):
+    """Return {"mtime_ns", "size", "sha256"} for a file, or None if it doesn't exist.
+
+    The hash is reused from `previous` when mtime and size are unchanged, so
+    unchanged multi-hundred-MB inputs cost a stat() rather than a full read.
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+
+    if previous and previous.get("mtime_ns") == st.st_mtime_ns and previous.get("size") == st.st_size:
+        return previous
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": h.hexdigest()}
+
+
+def build_config_hash(config):
+    """Hash everything besides the input files that affects generated packets."""
+    styles = load_json(ENTITY_STYLES_FILE)
+    builder = [hashlib.sha256(path.read_bytes()).hexdigest() for path in BUILDER_FILES]
+    return content_hash(
+        CACHE_VERSION,
+        builder,
+        config["map_periods"],
+        sorted(config["geo_correct_periods"]),
+        config["material_colors"],
+        config.get("compact"),
+        config.get("coalesce"),
+        config.get("simplify"),
+        config.get("clip"),
+        config.get("dedupe"),
+        styles,
+    )
+
+
+class BuildCache:
+    """Persistent store of serialized packet fragments keyed by content hash.
 
-    # Initialize CZML document
-    czml = [{
+    Layout:
+        .czml_cache/manifest.json      - file digests, fragment packet counts
+        .czml_cache/fragments/<key>    - serialized packets for one source
+    """
+
+    def __init__(self, cache_dir, config_hash, enabled=True):
+        self.dir = cache_dir
+        self.fragments_dir = cache_dir / "fragments"
+        self.config_hash = config_hash
+        self.key_prefix = hash_parts(hashlib.sha256(), [config_hash])
+        self.enabled = enabled
+
+        manifest = (load_json(cache_dir / "manifest.json") if enabled else None) or {}
+        if manifest.get("version") != CACHE_VERSION or manifest.get("config") != config_hash:
+            manifest = {}
+        self.previous = manifest
+        self.files = {}
+        self.counts = {}
+        self.sources = {}
+        self.summary = {}  # filled in by build_project
+
+    def digest(self, path):
+        """Digest an input file, reusing the previous hash if the file is untouched."""
+        name = os.path.relpath(path, self.dir)
+        digest = file_digest(path, self.previous.get("files", {}).get(name))
+        if digest:
+            self.files[name] = digest
+        return digest
+
+    def key(self, *parts):
+        return hash_parts(self.key_prefix.copy(), parts).hexdigest()
+
+    def previous_source(self, name, sha256):
+        """Return the fragment keys recorded for a multi-building file if its hash is unchanged."""
+        entry = self.previous.get("sources", {}).get(name)
+        if entry and entry["sha256"] == sha256:
+            return entry["keys"]
+        return None
+
+    def record_source(self, name, sha256, keys):
+        self.sources[name] = {"sha256": sha256, "keys": keys}
+
+    def has(self, key):
+        return (self.enabled and key in self.previous.get("fragments", {})
+                and (self.fragments_dir / key).exists())
+
+    def copy_into(self, key, stream, offset=0):
+        """Splice a cached fragment into an output stream; return its packet count.
+
+        With `offset` the fragment's packet ids are renumbered (see renumber_packet).
+        """
+        count = self.previous["fragments"][key]
+        self.counts[key] = count
+        if offset:
+            with open(self.fragments_dir / key) as f:
+                for packet in iter_fragment_packets(f, stream.compact):
+                    stream.write_text(renumber_packet(packet, offset))
+        else:
+            stream.write_file(self.fragments_dir / key, count)
+        return count
+
+    def record(self, key, produce, stream, offset=0):
+        """Stream freshly produced packets to the output and into a new fragment.
+
+        The fragment keeps the ids as produced; the output gets them shifted by `offset`.
+        """
+        self.fragments_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.fragments_dir / f"{key}.tmp"
+        with open(tmp, "w") as f:
+            fragment = PacketStream(f, stream.compact)
+            for packet in produce():
+                text = packet if isinstance(packet, str) else serialize_packet(packet, stream.compact)
+                stream.write_text(renumber_packet(text, offset) if offset else text)
+                fragment.write_text(text)
+        os.replace(tmp, self.fragments_dir / key)
+        self.counts[key] = fragment.count
+        return fragment.count
+
+    def save(self):
+        """Write the manifest and drop fragments no longer referenced by any source."""
+        if not self.enabled:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "version": CACHE_VERSION,
+            "config": self.config_hash,
+            "files": self.files,
+            "sources": self.sources,
+            "fragments": self.counts,
+        }
+        tmp = self.dir / "manifest.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.dir / "manifest.json")
+
+        for fragment in self.fragments_dir.glob("*"):
+            if fragment.name not in self.counts:
+                fragment.unlink()
+
+
+def batched_producers(loaders, default_color, config, jobs=1, batch_size=BUILDING_BATCH_SIZE):
+    """Wrap building loaders as per-building producers that expand in chunks.
+
+    Chunks of `batch_size` buildings are expanded by expand_building_chunk,
+    serially or across `jobs` worker processes, and merged back in input
+    order so the output is byte-identical either way. Producers must be
+    called in order; each returns its building's serialized packets.
+    """
+    def chunks():
+        for start in range(0, len(loaders), batch_size):
+            yield [load() for load in loaders[start:start + batch_size]]
+
+    results = (
+        packets
+        for chunk in ordered_map(expand_building_chunk, chunks(), jobs, default_color, config)
+        for packets in chunk
+    )
+    return [lambda: next(results) for _ in loaders]
+
+
+class ResidentCache(BuildCache):
+    """Build cache for --watch that keeps every fragment in memory.
+
+    Fragments are held as (text, count) in the on-disk fragment format, so a
+    single-file build splices each one with one write. Fragments missing from
+    memory are read once from the on-disk cache; new ones are kept only in
+    memory, and the on-disk cache is left as it was.
+    """
+
+    def __init__(self, cache_dir, config_hash, enabled=True):
+        super().__init__(cache_dir, config_hash, enabled)
+        self.fragments = {}
+
+    def has(self, key):
+        return key in self.fragments or super().has(key)
+
+    def copy_into(self, key, stream, offset=0):
+        if key not in self.fragments:
+            text = (self.fragments_dir / key).read_text()
+            self.fragments[key] = (text, self.previous["fragments"][key])
+        text, count = self.fragments[key]
+        if isinstance(stream, PacketStream) and not offset:
+            stream.write_text(text, count)
+        else:  # writers that route packets one at a time, or renumbered ids
+            for packet in iter_fragment_packets(io.StringIO(text), stream.compact):
+                stream.write_text(renumber_packet(packet, offset) if offset else packet)
+        self.counts[key] = count
+        return count
+
+    def record(self, key, produce, stream, offset=0):
+        fragment = PacketStream(io.StringIO(), stream.compact)
+        for packet in produce():
+            text = packet if isinstance(packet, str) else serialize_packet(packet, stream.compact)
+            stream.write_text(renumber_packet(text, offset) if offset else text)
+            fragment.write_text(text)
+        self.fragments[key] = (fragment.f.getvalue(), fragment.count)
+        self.counts[key] = fragment.count
+        return fragment.count
+
+    def save(self):
+        """Make this build the baseline for the next one and drop unused fragments."""
+        self.previous = {
+            "version": CACHE_VERSION,
+            "config": self.config_hash,
+            "files": self.files,
+            "sources": self.sources,
+            "fragments": self.counts,
+        }
+        self.fragments = {key: self.fragments[key] for key in self.counts}
+        self.rollback()
+
+    def rollback(self):
+        """Forget what a (failed) build recorded; the previous baseline stays."""
+        self.files = {}
+        self.counts = {}
+        self.sources = {}
+
+
+def collect_building_sources(cache, default_color, config, jobs=1):
+    """List building sources in output order as (label, key, produce) tuples.
+
+    buildings_1650.json contributes one source per building, so editing one
+    entry only regenerates that entry. Each buildings/*.json file is one source.
+    If buildings_1650.json is unchanged, its previous keys are reused without
+    parsing the file at all. Sources missing from the cache are expanded
+    together in batches.
+    """
+    sources = []
+
+    digest = cache.digest(BUILDINGS_1650_FILE)
+    if digest:
+        name = BUILDINGS_1650_FILE.name
+        keys = cache.previous_source(name, digest["sha256"])
+        if keys is None or not all(cache.has(key) for key, _ in keys):
+            buildings_data = load_json(BUILDINGS_1650_FILE) or {}
+            keys = []
+            for building in buildings_data.get("buildings", []):
+                key = cache.key("building", building)
+                keys.append([key, building["name"]])
+                sources.append((f"Building: {building['name']}", key, lambda b=building: b))
+        else:
+            sources.extend((f"Building: {label}", key, None) for key, label in keys)
+        cache.record_source(name, digest["sha256"], keys)
+
+    if BUILDINGS_DIR.exists():
+        for building_file in sorted(BUILDINGS_DIR.glob("*.json")):
+            digest = cache.digest(building_file)
+            key = cache.key("custom", digest["sha256"])
+            sources.append((f"Custom: {building_file.name}", key,
+                            lambda p=building_file: load_custom_building(p)))
+
+    misses = [i for i, (_, key, loader) in enumerate(sources) if loader and not cache.has(key)]
+    producers = batched_producers([sources[i][2] for i in misses], default_color, config, jobs)
+    produce = dict(zip(misses, producers))
+    return [(label, key, produce.get(i)) for i, (label, key, _) in enumerate(sources)]
+
+
+def load_custom_building(building_file):
+    """Load one buildings/*.json file, or return None with a warning."""
+    try:
+        with span("load.json"), open(building_file) as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"  Warning: Could not load {building_file.name}: {e}")
+        return None
+
+
+def emit_source(cache, key, produce, stream, offset=0):
+    """Write one source to the output stream; return (rebuilt, count).
+
+    Cached fragments are copied straight from disk; anything else is
+    regenerated and streamed to the output and the cache as it is produced.
+    Sources numbered from 0 get their ids shifted by `offset` on the way out,
+    so their fragments stay valid wherever they land in the output.
+    """
+    if key is not None and (cache.has(key) or produce is None):
+        return False, cache.copy_into(key, stream, offset)
+
+    before = stream.count
+    if cache.enabled:
+        cache.record(key, produce, stream, offset)
+    else:
+        for packet in produce():
+            if offset:
+                text = packet if isinstance(packet, str) else serialize_packet(packet, stream.compact)
+                packet = renumber_packet(text, offset)
+            stream.write(serialize_packet(packet, stream.compact) if type(packet) is PolygonRecord else packet)
+    return True, stream.count - before
+
+
+def plan_source(cache, key, produce, cheap=False):
+    """Return (rebuilt, count) for a source without writing anything.
+
+    Cheap sources (buildings) are still generated in memory so that later
+    packet ids stay known; for expensive ones (reference layers) count is None.
+    """
+    if key is not None and (cache.has(key) or produce is None):
+        count = cache.previous["fragments"][key]
+        cache.counts[key] = count
+        return False, count
+    if cheap:
+        return True, sum(1 for _ in produce())
+    return True, None
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def make_document_packet(project_config):
+    """Create the CZML document packet (name and clock) for a project."""
+    project_name = project_config.get("name", "Historical GIS") if project_config else "Historical GIS"
+    default_year = project_config.get("defaultYear", 1650) if project_config else 1650
+    return {
         "id": "document",
         "name": project_name,
         "version": "1.0",
@@ -942,53 +3077,470 @@ def main():
             "currentTime": f"{default_year:04d}-07-01T00:00:00Z",
             "multiplier": 1
         }
-    }]
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build entities.czml from project data.")
+    parser.add_argument("--plan", action="store_true",
+                        help="report which sources would be rebuilt, without writing anything")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore and don't update the incremental build cache")
+    parser.add_argument("--profile", nargs="?", const="build_profile.json", metavar="PATH",
+                        help="time every build stage and write a JSON report that is also a Chrome "
+                             "trace (default build_profile.json)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, also record tracemalloc allocation peaks "
+                             "(several times slower, so timings are inflated)")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="also write a cProfile dump of the build to PATH")
+    parser.add_argument("--watch", action="store_true",
+                        help="rebuild whenever an input file changes, keeping the cache in memory")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N",
+                        help="generate buildings on N worker processes (0 = one per CPU); "
+                             "with --all-projects, build N projects at a time")
+    projects = parser.add_mutually_exclusive_group()
+    projects.add_argument("--project", metavar="DIR",
+                          help="build the project in DIR instead of public/data/projects/example")
+    projects.add_argument("--all-projects", action="store_true",
+                          help="build every public/data/projects/*/project.json, "
+                               "splitting the reference layer among them in one pass")
+    layout = parser.add_mutually_exclusive_group()
+    layout.add_argument("--shard-periods", action="store_true",
+                        help="write one CZML shard per map period plus entities/manifest.json")
+    layout.add_argument("--tiles", type=int, nargs="?", const=TILE_MAX_PACKETS, metavar="N",
+                        help=f"write quadtree tiles of at most N packets (default {TILE_MAX_PACKETS}) "
+                             "plus entity_tiles/index.json")
+    parser.add_argument("--coalesce", nargs="?", const="runs", choices=["runs", "intervals"],
+                        help="merge per-period packets with identical geometry (default: runs); "
+                             "'intervals' also folds changing geometry into interval-valued positions")
+    parser.add_argument("--simplify", nargs="?", const=SIMPLIFY_TOLERANCES, metavar="T1,T2,...",
+                        type=lambda value: tuple(sorted(float(t) for t in value.split(","))),
+                        help="emit simplified levels of detail for reference lines/polygons at these "
+                             f"tolerances in meters (default {','.join(map(str, SIMPLIFY_TOLERANCES))})")
+    parser.add_argument("--dedupe", type=float, nargs="?", const=DEDUPE_DISTANCE, metavar="METERS",
+                        help="merge reference features of the same type and category within METERS "
+                             f"(default {DEDUPE_DISTANCE}) whose years overlap and names are similar")
+    parser.add_argument("--no-clip", action="store_true",
+                        help="keep reference features outside the project bounds")
+    parser.add_argument("--3dtiles", dest="tiles3d", action="store_true",
+                        help="bake buildings into per-period 3D Tiles (tiles3d/) instead of CZML entities")
+    parser.add_argument("--time-index", action="store_true",
+                        help="also write entities.timeindex, an interval tree of entity availability")
+    parser.add_argument("--geometry-buffer", nargs="?", const=64, type=int, choices=[32, 64], metavar="BITS",
+                        help="also write entities.geom, every position as one little-endian float "
+                             "array (default 64-bit; 32 halves it at ~2 cm precision)")
+    parser.add_argument("--compact", action="store_true",
+                        help="quantize positions, minify JSON and write .gz/.br sidecars")
+    parser.add_argument("--precision", type=int, metavar="DIGITS",
+                        help=f"decimal places kept for degrees with --compact (default {COMPACT_PRECISION}, ~1 cm)")
+    args = parser.parse_args(argv)
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.watch and args.plan:
+        parser.error("--watch and --plan can't be combined")
+    if args.all_projects and (args.watch or args.profile or args.cprofile):
+        parser.error("--all-projects can't be combined with --watch or profiling")
+    if args.tiles is not None and args.tiles < 1:
+        parser.error("--tiles must be at least 1")
+    if args.dedupe is not None and args.dedupe <= 0:
+        parser.error("--dedupe must be positive")
+    if args.precision is not None and not args.compact:
+        parser.error("--precision only applies with --compact")
+    if args.precision is None:
+        args.precision = COMPACT_PRECISION
+    return args
+
+
+def build_project(args, cache_class=BuildCache, previous=None):
+    """Run one build (or --plan) and return its cache.
+
+    `previous` is the cache returned by the last build; it is reused (instead
+    of creating a `cache_class`) while the build config is unchanged.
+    """
+    print("Planning CZML build..." if args.plan else "Building CZML...")
+
+    # Load project configuration
+    project_config = load_project_config()
+
+    # Load layer configuration
+    layers_config = load_layers_config()
+    config = make_build_config(project_config)
+    config["coalesce"] = args.coalesce
+    config["simplify"] = args.simplify
+    config["clip"] = None if args.no_clip or not project_config else project_config.get("bounds")
+    config["dedupe"] = args.dedupe
+    if args.compact:
+        config["compact"] = {"precision": args.precision, "height_precision": COMPACT_HEIGHT_PRECISION}
+        if brotli is None:
+            print("  brotli not installed; writing .gz sidecars only")
+    default_color = hex_to_rgba(layers_config["entities3d_color"])
+    config_hash = build_config_hash(config)
+    if previous is not None and previous.config_hash == config_hash:
+        cache = previous
+    else:
+        cache = cache_class(CACHE_DIR, config_hash, enabled=not args.no_cache)
+
+    document = make_document_packet(project_config)
+    sources = []
+    rebuilt = []
+    stream = building_stream = None
+    total = 1
+
+    def add(label, key, produce, cheap=False, sink=None, offset=0):
+        """Emit (or plan) one source and advance the running packet count.
+
+        `offset` shifts the ids of a source numbered from 0 (see emit_source).
+        """
+        nonlocal total
+        sources.append(label)
+        with span(f"source.{label.partition(':')[0].lower()}") as timed:
+            if args.plan:
+                was_rebuilt, count = plan_source(cache, key, produce, cheap=cheap)
+            else:
+                was_rebuilt, count = emit_source(cache, key, produce, sink or stream, offset)
+            timed.items = count or 0
+        if was_rebuilt:
+            rebuilt.append(label)
+            if not args.plan:
+                print(f"  {label}")
+        total = None if count is None or total is None else total + count
+        return count or 0
+
+    def build():
+        # Buildings
+        print("Processing buildings...")
+        templates = FOOTPRINT_TEMPLATES.stats()
+        building_count = sum(add(*source, cheap=True, sink=building_stream)
+                             for source in collect_building_sources(cache, default_color, config, args.jobs))
+        print(f"  Added {building_count} building entities")
+        templates = FOOTPRINT_TEMPLATES.stats(templates)
+        if templates["hits"]:  # generated in this process (not by --jobs workers)
+            print(f"  Footprint templates: {templates['hits']} of {templates['hits'] + templates['misses']} "
+                  f"buildings reused one ({templates['size']} cached)")
+
+        # Unified sites (ids are numbered from the running packet count, applied after the cache)
+        print("Processing unified sites...")
+        unified_count = 0
+        unified_file = find_unified_file()
+        digest = cache.digest(unified_file)
+        filtered = {}
+        if digest:
+            def read_unified():
+                return iter_geojson_features(unified_file)
+
+            def unified_features():
+                if not (config.get("clip") or config.get("dedupe")):
+                    return read_unified()
+                return filter_unified_sites(read_unified, config.get("clip"), config.get("dedupe"), filtered)
+
+            key = cache.key("unified", digest["sha256"])
+            unified_count = add(f"Unified: {unified_file.name}", key, lambda: process_unified_sites(
+                unified_features(), layers_config["source_to_style"], 0, config.get("simplify")), offset=total)
+        if filtered:
+            print(f"  Clipped {filtered['clipped']} outside project bounds, merged {filtered['merged']} duplicates")
+        print(f"  Added {unified_count} unified site entities")
+
+        # Curated sites
+        print("Processing curated sites...")
+        sites_count = 0
+        digest = cache.digest(SITES_FILE)
+        if digest:
+            key = cache.key("sites", digest["sha256"])
+            sites_count = add(f"Sites: {SITES_FILE.name}", key, lambda: process_sites(
+                load_json(SITES_FILE), layers_config, 0), offset=total)
+        print(f"  Added {sites_count} curated site entities")
+
+    if args.plan:
+        build()
+        for label in rebuilt:
+            print(f"  rebuild  {label}")
+        print(f"Plan: {len(rebuilt)} of {len(sources)} sources would be rebuilt "
+              f"({len(sources) - len(rebuilt)} cached)")
+        cache.summary = {"sources": len(sources), "rebuilt": len(rebuilt), "entities": None}
+        return cache
+
+    # Packets stream straight to disk as they are produced
+    if args.shard_periods:
+        print(f"Writing shards: {SHARD_DIR}")
+        writer = ShardedCzmlWriter(SHARD_DIR, document, config)
+    elif args.tiles:
+        print(f"Writing tiles: {TILE_DIR}")
+        bounds = project_config.get("bounds") if project_config else None
+        writer = TiledCzmlWriter(TILE_DIR, document, bounds, args.tiles, config.get("compact"))
+    else:
+        print(f"Writing: {OUTPUT_FILE}")
+        writer = CzmlWriter(OUTPUT_FILE, config.get("compact"))
+    if args.tiles3d:
+        print(f"Writing 3D Tiles: {TILES3D_DIR}")
+        try:  # layer urls are site paths when the project is under public/
+            url_prefix = "/" + TILES3D_DIR.resolve().relative_to(PROJECT_DIR.resolve() / "public").as_posix() + "/"
+        except ValueError:
+            url_prefix = ""
+        buildings_writer = TilesetWriter(TILES3D_DIR, config, url_prefix=url_prefix)
+    else:
+        buildings_writer = contextlib.nullcontext()
+    with writer as stream, buildings_writer as building_stream:
+        if isinstance(writer, CzmlWriter):
+            stream.write(document)
+        indexes = []
+        if args.time_index:
+            stream = TemporalIndexWriter(TIME_INDEX_FILE, stream)
+            indexes.append(stream)
+        if args.geometry_buffer:
+            stream = GeometryBufferWriter(GEOMETRY_BUFFER_FILE, stream, args.geometry_buffer // 8)
+            indexes.append(stream)
+        building_stream = building_stream or stream
+        build()
+        for index in indexes:
+            index.save()
+    cache.save()
+
+    print(f"Rebuilt {len(rebuilt)} of {len(sources)} sources ({len(sources) - len(rebuilt)} cached)")
+    if args.tiles3d:
+        print(f"Done! {total - 1 - building_stream.count} total entities in CZML, "
+              f"{building_stream.count} building packets baked into 3D Tiles")
+    else:
+        print(f"Done! {total - 1} total entities in CZML")
+    cache.summary = {"sources": len(sources), "rebuilt": len(rebuilt), "entities": total - 1}
+    return cache
+
 
-    # Load and process buildings
-    print("Processing buildings...")
-    buildings_data = load_json(BUILDINGS_1650_FILE)
-    custom_buildings = []
+def watched_files():
+    """Every input file a build reads (existing or not)."""
+    paths = [PROJECT_FILE, ENTITY_STYLES_FILE, BUILDINGS_1650_FILE, SITES_FILE, find_unified_file()]
     if BUILDINGS_DIR.exists():
-        for building_file in sorted(BUILDINGS_DIR.glob("*.json")):
+        paths.extend(sorted(BUILDINGS_DIR.glob("*.json")))
+    return paths
+
+
+def snapshot_files():
+    """{path: (mtime_ns, size)} for the watched inputs that exist."""
+    snapshot = {}
+    for path in watched_files():
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[path] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+def watch(args):
+    """Rebuild whenever an input changes, keeping fragments resident in memory.
+
+    Inputs are polled every WATCH_POLL_INTERVAL seconds; a change is built
+    once the files have been stable for WATCH_DEBOUNCE seconds, so an editor
+    writing a file in several steps triggers a single rebuild. Only sources
+    whose inputs changed are regenerated (see ResidentCache) and the output
+    is replaced atomically as in a normal build.
+    """
+    cache = None
+    state = snapshot_files()
+    try:
+        cache = build_project(args, ResidentCache)
+    except Exception as e:
+        print(f"Build failed: {e}")
+    print(f"Watching {DATA_DIR} for changes (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            current = snapshot_files()
+            if current == state:
+                continue
+            while True:
+                time.sleep(WATCH_DEBOUNCE)
+                settled = snapshot_files()
+                if settled == current:
+                    break
+                current = settled
+            changed = sorted(path.name for path in state.keys() | current.keys()
+                             if state.get(path) != current.get(path))
+            state = current
+
+            start = time.perf_counter()
             try:
-                with open(building_file) as f:
-                    custom_buildings.append(json.load(f))
+                cache = build_project(args, ResidentCache, cache)
             except Exception as e:
-                print(f"  Warning: Could not load {building_file.name}: {e}")
+                print(f"Build failed: {e}")
+                if cache is not None:
+                    cache.rollback()
+                continue
+            print(f"Rebuilt in {(time.perf_counter() - start) * 1000:.0f} ms ({', '.join(changed)})")
+    except KeyboardInterrupt:
+        print("Stopped watching")
 
-    building_packets = process_buildings(
-        buildings_data,
-        custom_buildings,
-        layers_config["entities3d_color"]
-    )
-    czml.extend(building_packets)
-    print(f"  Added {len(building_packets)} building entities")
-
-    # Load and process unified sites
-    print("Processing unified sites...")
-    unified_data = load_json(UNIFIED_FILE)
-    unified_packets = process_unified_sites(
-        unified_data,
-        layers_config["source_to_style"],
-        len(czml)
-    )
-    czml.extend(unified_packets)
-    print(f"  Added {len(unified_packets)} unified site entities")
-
-    # Load and process curated sites
-    print("Processing curated sites...")
-    sites_data = load_json(SITES_FILE)
-    sites_packets = process_sites(sites_data, layers_config, len(czml))
-    czml.extend(sites_packets)
-    print(f"  Added {len(sites_packets)} curated site entities")
-
-    # Write output
-    print(f"Writing: {OUTPUT_FILE}")
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(czml, f, indent=2)
-
-    total_entities = len(czml) - 1  # Exclude document packet
-    print(f"Done! {total_entities} total entities in CZML")
+
+# =============================================================================
+# Batch builds (--all-projects)
+# =============================================================================
+#
+# Each project is built by build_project() once use_project_dir() has pointed
+# the module paths at it, so a process builds one project at a time. The
+# reference layer is streamed once, in the parent, and split into one
+# GeoJSONSeq file per project of the features inside its bounds
+# (split_unified_sites); workers are handed their project directory and that
+# file, so the layer is parsed once and nothing ever holds all of it in memory.
+
+
+def find_projects(projects_dir=None):
+    """Project directories (folders with a project.json) under PROJECTS_DIR, by name."""
+    return sorted(path.parent for path in Path(projects_dir or PROJECTS_DIR).glob("*/project.json"))
+
+
+def project_clip_bounds(data_dir, args):
+    """The bounds a batch build of `data_dir` clips the reference layer to, or None."""
+    if args.no_clip:
+        return None
+    try:
+        with open(Path(data_dir) / "project.json") as f:
+            return json.load(f).get("bounds")
+    except (OSError, ValueError):  # the build itself reports a broken project.json
+        return None
+
+
+def split_unified_sites(unified_file, bounds, out_dir):
+    """Split the reference layer into one file per project in a single streaming pass.
+
+    `bounds` maps a name to project bounds. Each feature goes, one JSON line
+    each, to out_dir/<name>/unified_sites.geojsonl for every project its
+    bounding box doesn't miss, using the same test as filter_unified_sites(),
+    so a project clips its split file to exactly what it would have kept
+    from the whole layer. Returns ({name: path}, {name: features kept},
+    total features read).
+    """
+    paths, files, kept = {}, {}, dict.fromkeys(bounds, 0)
+    total = 0
+    try:
+        for name in bounds:
+            paths[name] = Path(out_dir) / name / "unified_sites.geojsonl"
+            paths[name].parent.mkdir(parents=True)
+            files[name] = open(paths[name], "w", encoding="utf-8")
+        for feature in iter_geojson_features(unified_file):
+            total += 1
+            bbox = feature_bbox(feature)
+            line = None
+            for name, box in bounds.items():
+                if not bbox_outside(bbox, box):
+                    if line is None:
+                        line = json.dumps(feature, ensure_ascii=False) + "\n"
+                    files[name].write(line)
+                    kept[name] += 1
+    finally:
+        for f in files.values():
+            f.close()
+    return paths, kept, total
+
+
+def build_batch_project(project, args):
+    """Build one project of a batch; the unit of work for --all-projects.
+
+    `project` is (project directory, its reference layer file). The build's output is captured rather than printed so
+    concurrent builds don't interleave, and a failed build is reported
+    instead of raised.
+    """
+    data_dir, unified_file = project
+    use_project_dir(data_dir, unified_file)
+    log = io.StringIO()
+    summary, error = {}, None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log):
+            summary = build_project(args).summary
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"name": Path(data_dir).name, "seconds": time.perf_counter() - start,
+            "summary": summary, "error": error, "log": log.getvalue()}
+
+
+def build_all_projects(args):
+    """Build every project under PROJECTS_DIR, args.jobs projects at a time.
+
+    Buildings are generated serially within each project. Returns True if
+    every project built.
+    """
+    projects = find_projects()
+    if not projects:
+        print(f"No projects found under {PROJECTS_DIR}")
+        return False
+
+    start = time.perf_counter()
+    jobs = min(args.jobs, len(projects))
+    project_args = argparse.Namespace(**{**vars(args), "jobs": 1})
+    unified_file = find_unified_file()
+    # Projects that don't clip read the whole layer; there's no point copying it
+    bounds = {str(n): clip for n, clip in enumerate(project_clip_bounds(path, args) for path in projects) if clip}
+    with tempfile.TemporaryDirectory(prefix="build_czml_") as split_dir:
+        split, kept = {}, {}
+        if bounds and unified_file.exists():
+            print(f"Splitting {unified_file.name} for {len(bounds)} projects...")
+            split, kept, total = split_unified_sites(unified_file, bounds, split_dir)
+            print(f"  Read {total} features in {time.perf_counter() - start:.2f} s")
+        tasks = [(path, split.get(str(n), unified_file)) for n, path in enumerate(projects)]
+
+        print(f"Building {len(projects)} projects on {jobs} process{'es' if jobs > 1 else ''}...")
+        results = []
+        for n, result in enumerate(ordered_map(build_batch_project, tasks, jobs, project_args)):
+            print(f"\n[{result['name']}]")
+            if str(n) in kept:
+                print(f"Reference layer: {kept[str(n)]} of {total} features inside the project bounds")
+            print(result["log"], end="")
+            if result["error"]:
+                print(f"Build failed: {result['error']}")
+            results.append(result)
+
+    print_batch_summary(results, time.perf_counter() - start)
+    return all(result["error"] is None for result in results)
+
+
+def print_batch_summary(results, wall):
+    """Print one row per project: status, sources rebuilt, entities and build time."""
+    print(f"\n  {'project':<24} {'status':<7} {'rebuilt':>9} {'entities':>10} {'time s':>8}")
+    for result in results:
+        summary = result["summary"]
+        rebuilt = f"{summary['rebuilt']}/{summary['sources']}" if summary else "-"
+        entities = summary.get("entities")
+        print(f"  {result['name']:<24} {'failed' if result['error'] else 'ok':<7} {rebuilt:>9} "
+              f"{'-' if entities is None else entities:>10} {result['seconds']:>8.2f}")
+    serial = sum(result["seconds"] for result in results)
+    failed = sum(1 for result in results if result["error"])
+    print(f"Built {len(results) - failed} of {len(results)} projects in {wall:.2f} s "
+          f"({serial:.2f} s of project builds)")
+
+
+def profiled_build(args, *build_args):
+    """build_project() under the --profile / --cprofile instrumentation."""
+    global PROFILER
+    if args.profile:
+        PROFILER = Profiler(memory=args.profile_memory)
+    profile = cProfile.Profile() if args.cprofile else None
+    try:
+        with span("build"):
+            if profile:
+                return profile.runcall(build_project, args, *build_args)
+            return build_project(args, *build_args)
+    finally:
+        if profile:
+            profile.dump_stats(args.cprofile)
+            print(f"cProfile: {args.cprofile} (python -m pstats {args.cprofile})")
+        if PROFILER is not None:
+            PROFILER.write(args.profile)
+            PROFILER = None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.project:
+        use_project_dir(args.project)
+    if args.all_projects:
+        if not build_all_projects(args):
+            sys.exit(1)
+    elif args.watch:
+        watch(args)
+    elif args.profile or args.cprofile:
+        profiled_build(args)
+    else:
+        build_project(args)
 
 
 if __name__ == "__main__":
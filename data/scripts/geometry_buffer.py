@@ -0,0 +1,265 @@
+"""
+Geometry buffer - every entity position in one memory-mappable binary file.
+
+build_czml.py --geometry-buffer writes entities.geom next to entities.czml.
+It holds the cartographicDegrees of every point, polyline and polygon
+packet as one contiguous little-endian float array (lon, lat, height
+triples) with a record per packet, so readers get an entity's coordinates
+as a slice of a mapped file instead of parsing JSON numbers. The CZML keeps
+its own positions; Cesium still loads it as before.
+
+Interval-valued positions (--coalesce intervals) are stored as one record
+per interval, all under the packet's id.
+
+File layout (little-endian, every section 8-byte aligned):
+
+  header   "CZGB", version u32, float_size u32 (4 or 8), records u32,
+           trailer_length u32, reserved u32
+  offsets  u64[records + 1]   record k is values[offsets[k]:offsets[k + 1]]
+  kinds    u8[records]        0 point, 1 polyline, 2 polygon (padded to 8)
+  values   f32/f64[offsets[records]]   (padded to 8)
+  trailer  UTF-8 JSON {"ids": [...], "intervals": [...]}: the packet id of
+           each record, and its interval (null if not interval-valued)
+
+In a browser the values are `new Float64Array(buffer, valuesOffset, count)`
+with no copy; valuesOffset follows from the header.
+
+Usage:
+    python scripts/geometry_buffer.py get entities.geom <packet id>
+    python scripts/geometry_buffer.py bench entities.geom entities.czml
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+
+from sidecars import little_endian
+
+try:
+    import numpy as np
+except ImportError:  # views are flat memoryviews instead of (n, 3) arrays
+    np = None
+
+MAGIC = b"CZGB"
+VERSION = 2
+HEADER = struct.Struct("<4sIIIII")
+KINDS = ("point", "polyline", "polygon")
+TYPECODES = {4: "f", 8: "d"}
+
+
+def _pad(length):
+    return -length % 8
+
+
+def packet_geometry(packet):
+    """Yield (kind, interval, cartographicDegrees) for each position set of a packet dict."""
+    for kind in ("polygon", "polyline"):
+        if kind in packet:
+            positions = packet[kind]["positions"]
+            if isinstance(positions, list):
+                for interval in positions:
+                    yield kind, interval.get("interval"), interval["cartographicDegrees"]
+            else:
+                yield kind, None, positions["cartographicDegrees"]
+            return
+    if "position" in packet and "cartographicDegrees" in packet["position"]:
+        yield "point", None, packet["position"]["cartographicDegrees"]
+
+
+# =============================================================================
+# Building
+# =============================================================================
+
+class GeometryBufferBuilder:
+    """Collect packet positions, then write a .geom file."""
+
+    def __init__(self, float_size=8):
+        if float_size not in TYPECODES:
+            raise ValueError("float_size must be 4 or 8")
+        self.float_size = float_size
+        self.values = array(TYPECODES[float_size])
+        self.offsets = array("Q", [0])
+        self.kinds = array("B")
+        self.ids = []
+        self.intervals = []
+
+    def add(self, packet_id, kind, coords, interval=None):
+        """Add one position set (a flat lon, lat, height list)."""
+        self.values.extend(coords)
+        self.offsets.append(len(self.values))
+        self.kinds.append(KINDS.index(kind))
+        self.ids.append(packet_id)
+        self.intervals.append(interval)
+
+    def add_packet(self, packet):
+        """Add every position set of a packet dict; packets without geometry are skipped."""
+        for kind, interval, coords in packet_geometry(packet):
+            self.add(packet["id"], kind, coords, interval)
+
+    def to_bytes(self):
+        trailer = {"ids": self.ids}
+        if any(interval is not None for interval in self.intervals):
+            trailer["intervals"] = self.intervals
+        trailer = json.dumps(trailer, separators=(",", ":")).encode()
+        kinds = self.kinds.tobytes()
+        values = little_endian(self.values)
+        return b"".join([
+            HEADER.pack(MAGIC, VERSION, self.float_size, len(self.ids), len(trailer), 0),
+            little_endian(self.offsets),
+            kinds, bytes(_pad(len(kinds))),
+            values, bytes(_pad(len(values))),
+            trailer,
+        ])
+
+    def write(self, path):
+        """Write the buffer atomically."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(self.to_bytes())
+        os.replace(tmp, path)
+
+
+# =============================================================================
+# Reading
+# =============================================================================
+
+class GeometryBuffer:
+    """Read-only, zero-copy view of a .geom file.
+
+    >>> geometry = GeometryBuffer.open("entities.geom")
+    >>> geometry.coordinates("manchester_cathedral_tower__os_1950s")  # (n, 3) array
+    """
+
+    def __init__(self, data):
+        magic, version, self.float_size, n, trailer_length, _ = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a version {VERSION} geometry buffer")
+        self.data = memoryview(data)
+        pos = HEADER.size
+        self.offsets = self._view(pos, "<u8", "Q", n + 1)
+        pos += 8 * (n + 1)
+        self.kinds = self.data[pos:pos + n]
+        pos += n + _pad(n)
+        count = int(self.offsets[n]) if n else 0
+        self.values_offset = pos
+        self.values = self._view(pos, f"<f{self.float_size}", TYPECODES[self.float_size], count)
+        pos += self.float_size * count
+        pos += _pad(pos)
+        trailer = json.loads(bytes(self.data[pos:pos + trailer_length]))
+        self.ids = trailer["ids"]
+        self.intervals = trailer.get("intervals") or [None] * n
+        self.records_by_id = {}
+        for k, packet_id in enumerate(self.ids):
+            self.records_by_id.setdefault(packet_id, []).append(k)
+
+    def _view(self, pos, dtype, typecode, count):
+        if np is not None:
+            return np.frombuffer(self.data, dtype=dtype, count=count, offset=pos)
+        if sys.byteorder == "big":
+            raise ValueError("reading a geometry buffer without NumPy needs a little-endian host")
+        return self.data[pos:pos + count * struct.calcsize(typecode)].cast(typecode)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a .geom file; pages are read only as records are touched."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, packet_id):
+        return packet_id in self.records_by_id
+
+    def record(self, k):
+        """(packet id, kind, interval, coordinates) of record k.
+
+        Coordinates are an (n, 3) NumPy view into the buffer, or a flat
+        memoryview without NumPy.
+        """
+        values = self.values[int(self.offsets[k]):int(self.offsets[k + 1])]
+        if np is not None:
+            values = values.reshape(-1, 3)
+        return self.ids[k], KINDS[self.kinds[k]], self.intervals[k], values
+
+    def coordinates(self, packet_id):
+        """Coordinates of a packet's (first) position set; KeyError if it has none."""
+        return self.record(self.records_by_id[packet_id][0])[3]
+
+    def records(self, packet_id):
+        """[(interval, coordinates), ...] for every position set of a packet."""
+        return [self.record(k)[2:] for k in self.records_by_id.get(packet_id, [])]
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def benchmark(geom_path, czml_path):
+    """Time reading every entity's coordinates from the buffer against parsing the CZML."""
+    t = time.perf_counter()
+    with open(czml_path) as f:
+        packets = json.load(f)
+    parsed = {}
+    for packet in packets:
+        for _, _, coords in packet_geometry(packet):
+            parsed.setdefault(packet["id"], coords)
+    czml_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    geometry = GeometryBuffer.open(geom_path)
+    open_s = time.perf_counter() - t
+    t = time.perf_counter()
+    for k in range(len(geometry)):
+        geometry.record(k)
+    views_s = time.perf_counter() - t
+
+    for packet_id, coords in parsed.items():
+        view = geometry.coordinates(packet_id)
+        flat = view.ravel().tolist() if np is not None else view.tolist()
+        if geometry.float_size == 8 and flat != [float(v) for v in coords]:
+            raise AssertionError(f"buffer disagrees with the CZML for {packet_id}")
+
+    return {
+        "records": len(geometry),
+        "vertices": len(geometry.values) // 3,
+        "bytes": os.path.getsize(geom_path),
+        "czml_bytes": os.path.getsize(czml_path),
+        "czml_parse_s": round(czml_s, 3),
+        "open_s": round(open_s, 4),
+        "views_s": round(views_s, 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read or benchmark a geometry buffer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    get = sub.add_parser("get", help="print a packet's coordinates as lon, lat, height rows")
+    get.add_argument("path")
+    get.add_argument("id")
+    bench = sub.add_parser("bench", help="compare loading every position with parsing the CZML")
+    bench.add_argument("path")
+    bench.add_argument("czml")
+    args = parser.parse_args(argv)
+
+    if args.command == "get":
+        geometry = GeometryBuffer.open(args.path)
+        for interval, coords in geometry.records(args.id):
+            if interval:
+                print(f"# {interval}")
+            rows = coords.tolist() if np is not None else [coords[i:i + 3].tolist()
+                                                            for i in range(0, len(coords), 3)]
+            for row in rows:
+                print(" ".join(repr(v) for v in row))
+    else:
+        print(json.dumps(benchmark(args.path, args.czml), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Helpers shared by build_czml.py and the sidecar writers next to it
+(geometry_buffer.py, temporal_index.py, tiles3d.py): packing arrays for
+the little-endian binary formats, and reading years out of CZML
+availability strings.
+"""
+
+import sys
+from array import array
+
+
+def little_endian(values):
+    """Bytes of an array in little-endian order, whatever the host's byte order."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(typecode, data):
+    """Array of `typecode` values from little-endian bytes."""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def iso_year(iso):
+    """Year of an ISO8601 date string (handles negative years)."""
+    return int(iso.split("T")[0].rsplit("-", 2)[0])
+
+
+def interval_years(interval):
+    """(start, stop) years of a "start/stop" ISO8601 interval."""
+    first, _, last = interval.partition("/")
+    return iso_year(first), iso_year(last)
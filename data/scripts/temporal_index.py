@@ -0,0 +1,287 @@
+"""
+Temporal index - answer "which entities are active in year Y" without
+evaluating every entity's availability.
+
+build_czml.py --time-index writes entities.timeindex next to entities.czml.
+It is a centred interval tree over the availability years of every packet,
+with the tree laid out implicitly over the year range (node k covers
+[lo, hi], its centre is the midpoint, children are 2k and 2k + 1). Each
+interval is stored at the first node whose centre it contains, twice: once
+sorted by start and once by stop (descending). A query walks one
+root-to-leaf path (log2 of the year span, ~12 nodes for 0-2100) and at
+each node reads a prefix of one sorted run, so it costs O(log n + k).
+
+File layout (little-endian):
+
+  header   "CZTI", version u32, lo i32, hi i32, depth u32,
+           intervals u32, always u32, ids_length u32
+  offsets  u32[2**depth + 1]   node k's run is [offsets[k], offsets[k + 1])
+  by start i32 starts[n], u32 entities[n]
+  by stop  i32 stops[n],  u32 entities[n]
+  always   u32[always]         entities without availability
+  ids      UTF-8 JSON array of packet ids, indexed by entity number
+
+Usage:
+    python scripts/temporal_index.py query entities.timeindex 1650
+    python scripts/temporal_index.py bench [--intervals 1000000]
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import time
+from array import array
+from bisect import bisect_right
+from operator import neg
+from pathlib import Path
+
+from sidecars import from_little_endian, interval_years, little_endian
+
+MAGIC = b"CZTI"
+VERSION = 1
+HEADER = struct.Struct("<4sIiiIIII")
+
+
+def availability_years(availability):
+    """[(start, stop), ...] years of a CZML availability string or list of intervals."""
+    if isinstance(availability, str):
+        availability = [availability]
+    years = []
+    for interval in availability:
+        years.append(interval_years(interval))
+    return years
+
+
+# =============================================================================
+# Building
+# =============================================================================
+
+def build_tree(starts, stops):
+    """Lay intervals out as an implicit centred interval tree.
+
+    Returns (lo, hi, depth, offsets, by_start, by_stop), where by_start and
+    by_stop are interval numbers grouped by node and sorted by start
+    (ascending) / stop (descending) within each node.
+    """
+    if not starts:
+        return 0, 0, 0, array("I", [0, 0]), array("I"), array("I")
+    lo, hi = min(starts), max(stops)
+    depth = max(1, (hi - lo + 1).bit_length())
+    nodes = []
+    for start, stop in zip(starts, stops):
+        node, a, b = 1, lo, hi
+        while True:
+            centre = (a + b) // 2
+            if stop < centre:
+                node, b = 2 * node, centre - 1
+            elif start > centre:
+                node, a = 2 * node + 1, centre + 1
+            else:
+                break
+        nodes.append(node)
+
+    order = range(len(starts))
+    by_start = array("I", sorted(order, key=lambda i: (nodes[i], starts[i])))
+    by_stop = array("I", sorted(order, key=lambda i: (nodes[i], -stops[i])))
+    counts = [0] * ((1 << depth) + 1)
+    for node in nodes:
+        counts[node + 1] += 1
+    offsets = array("I", counts)
+    for k in range(1, len(offsets)):
+        offsets[k] += offsets[k - 1]
+    return lo, hi, depth, offsets, by_start, by_stop
+
+
+class TemporalIndexBuilder:
+    """Collect packet ids and availability years, then write a .timeindex file."""
+
+    def __init__(self):
+        self.ids = []
+        self.starts = array("i")
+        self.stops = array("i")
+        self.entities = array("I")
+        self.always = array("I")
+
+    def add(self, packet_id, availability=None):
+        """Add an entity; without availability it is active in every year."""
+        entity = len(self.ids)
+        self.ids.append(packet_id)
+        if not availability:
+            self.always.append(entity)
+            return
+        for start, stop in availability_years(availability):
+            self.starts.append(start)
+            self.stops.append(stop)
+            self.entities.append(entity)
+
+    def to_bytes(self):
+        lo, hi, depth, offsets, by_start, by_stop = build_tree(self.starts, self.stops)
+        ids = json.dumps(self.ids, separators=(",", ":")).encode()
+        parts = [
+            HEADER.pack(MAGIC, VERSION, lo, hi, depth, len(by_start), len(self.always), len(ids)),
+            little_endian(offsets),
+            little_endian(array("i", (self.starts[i] for i in by_start))),
+            little_endian(array("I", (self.entities[i] for i in by_start))),
+            little_endian(array("i", (self.stops[i] for i in by_stop))),
+            little_endian(array("I", (self.entities[i] for i in by_stop))),
+            little_endian(self.always),
+            ids,
+        ]
+        return b"".join(parts)
+
+    def write(self, path):
+        """Write the index atomically."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(self.to_bytes())
+        os.replace(tmp, path)
+
+
+# =============================================================================
+# Querying
+# =============================================================================
+
+class TemporalIndex:
+    """Read-only view of a .timeindex file.
+
+    >>> index = TemporalIndex.load("entities.timeindex")
+    >>> index.active_ids(1650)
+    """
+
+    def __init__(self, data):
+        magic, version, self.lo, self.hi, self.depth, n, n_always, n_ids = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a version {VERSION} temporal index")
+        pos = HEADER.size
+
+        def take(typecode, count):
+            nonlocal pos
+            values = from_little_endian(typecode, data[pos:pos + 4 * count])
+            pos += 4 * count
+            return values
+
+        self.offsets = take("I", (1 << self.depth) + 1)
+        self.start_years = take("i", n)
+        self.start_entities = take("I", n)
+        self.stop_years = take("i", n)
+        self.stop_entities = take("I", n)
+        self.always = take("I", n_always)
+        self.ids = json.loads(data[pos:pos + n_ids])
+
+    @classmethod
+    def load(cls, path):
+        return cls(Path(path).read_bytes())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def active(self, year):
+        """Entity numbers active in `year` (availability start <= year <= stop)."""
+        found = list(self.always)
+        if not self.start_years or not self.lo <= year <= self.hi:
+            return found
+        node, a, b = 1, self.lo, self.hi
+        while a <= b:
+            first, last = self.offsets[node], self.offsets[node + 1]
+            centre = (a + b) // 2
+            if year < centre:
+                # every interval here reaches the centre, so it's live iff it started
+                end = bisect_right(self.start_years, year, first, last)
+                found.extend(self.start_entities[first:end])
+                node, b = 2 * node, centre - 1
+            elif year > centre:
+                # ...and here iff it hasn't ended yet (stops are descending)
+                end = bisect_right(self.stop_years, -year, first, last, key=neg)
+                found.extend(self.stop_entities[first:end])
+                node, a = 2 * node + 1, centre + 1
+            else:
+                found.extend(self.start_entities[first:last])
+                break
+        return found
+
+    def active_ids(self, year):
+        """Packet ids active in `year`."""
+        return [self.ids[i] for i in self.active(year)]
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def random_intervals(n, seed=0, lo=0, hi=2100):
+    """n seeded intervals shaped like the project's: mostly short, some to the present."""
+    rng = random.Random(seed)
+    starts, stops = array("i"), array("i")
+    for _ in range(n):
+        start = rng.randint(lo, hi)
+        stop = hi if rng.random() < 0.2 else min(hi, start + int(rng.expovariate(1 / 80)))
+        starts.append(start)
+        stops.append(stop)
+    return starts, stops
+
+
+def benchmark(n, seed=0, years=None):
+    """Time building, loading and scrubbing an index of n intervals against a full scan."""
+    starts, stops = random_intervals(n, seed)
+    builder = TemporalIndexBuilder()
+    t = time.perf_counter()
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        builder.ids.append(i)
+        builder.starts.append(start)
+        builder.stops.append(stop)
+        builder.entities.append(i)
+    data = builder.to_bytes()
+    build_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    index = TemporalIndex(data)
+    load_s = time.perf_counter() - t
+
+    scrub = years or range(0, 2101, 7)
+    t = time.perf_counter()
+    hits = sum(len(index.active(year)) for year in scrub)
+    query_s = time.perf_counter() - t
+
+    sample = scrub[::10]
+    t = time.perf_counter()
+    for year in sample:
+        expected = sorted(i for i, (start, stop) in enumerate(zip(starts, stops)) if start <= year <= stop)
+        if sorted(index.active(year)) != expected:
+            raise AssertionError(f"index disagrees with a full scan at year {year}")
+    scan_s = (time.perf_counter() - t) / len(sample)
+
+    queries = len(scrub)
+    return {
+        "intervals": n,
+        "bytes": len(data),
+        "build_s": round(build_s, 3),
+        "load_s": round(load_s, 3),
+        "queries": queries,
+        "mean_active": round(hits / queries),
+        "query_ms": round(query_s / queries * 1000, 3),
+        "full_scan_ms": round(scan_s * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or benchmark a temporal index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query = sub.add_parser("query", help="print the ids active in a year")
+    query.add_argument("path")
+    query.add_argument("year", type=int)
+    bench = sub.add_parser("bench", help="scrub a timeline over random intervals")
+    bench.add_argument("--intervals", type=int, default=1_000_000)
+    bench.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        for packet_id in TemporalIndex.load(args.path).active_ids(args.year):
+            print(packet_id)
+    else:
+        print(json.dumps(benchmark(args.intervals, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""
+3D Tiles export - bake extruded building polygons into batched glTF tiles.
+
+build_czml.py --3dtiles routes the building packets here instead of into
+entities.czml. Each map period becomes one tileset:
+
+  tiles3d/<period_id>/tileset.json   - root + one leaf per cluster of buildings
+  tiles3d/<period_id>/<n>.b3dm       - batched glTF, one primitive per color
+  tiles3d/layers.json                - "tileset" layer entries for project.json
+
+Polygons are extruded and triangulated here, at build time, and every part
+sharing a color is merged into one draw call per tile. Each part is a 3D Tiles
+feature (_BATCHID) whose id, name and start/stop years are in the batch table,
+so it stays pickable and can be filtered by year with a tileset style.
+
+Heights are relative to the ground, as in the CZML packets: vertices are
+placed at their height above the ellipsoid, in each tile's east-north-up
+frame (so the frame's curvature is kept, not flattened onto its tangent
+plane), and the viewer lifts each tile onto the terrain under it
+("clampToGround" in the layer config). Tiles are kept to TILE_MAX_EXTENT so
+one terrain sample per tile stays close to the ground under every building.
+"""
+
+import json
+import math
+import struct
+from array import array
+from pathlib import Path
+
+from sidecars import interval_years, little_endian
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_E2 = 6.69437999014e-3
+
+# Features (polygon parts) per b3dm tile, and the widest a tile may be in meters
+TILE_MAX_FEATURES = 4096
+TILE_MAX_EXTENT = 1000.0
+
+# Ellipsoid heights the root region allows for, since the viewer moves each
+# tile onto the terrain after the tileset is built
+TERRAIN_MIN_HEIGHT = -500.0
+TERRAIN_MAX_HEIGHT = 9000.0
+
+# Screen-space error inputs: leaves load once the camera is within ~20 km
+ROOT_GEOMETRIC_ERROR = 500.0
+TILESET_GEOMETRIC_ERROR = 5000.0
+
+# glTF constants
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+FLOAT = 5126
+UNSIGNED_INT = 5125
+TRIANGLES = 4
+
+
+# =============================================================================
+# Geodesy
+# =============================================================================
+
+def geodetic_to_ecef(lon, lat, height=0.0):
+    """Convert degrees + ellipsoid height to Earth-centered (ECEF) meters."""
+    lon, lat = math.radians(lon), math.radians(lat)
+    sin_lat, cos_lat = math.sin(lat), math.cos(lat)
+    n = WGS84_A / math.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    return (
+        (n + height) * cos_lat * math.cos(lon),
+        (n + height) * cos_lat * math.sin(lon),
+        (n * (1 - WGS84_E2) + height) * sin_lat,
+    )
+
+
+class LocalFrame:
+    """East-north-up frame at a tile's center; maps degrees to local meters."""
+
+    def __init__(self, lon, lat):
+        self.origin = geodetic_to_ecef(lon, lat)
+        lon, lat = math.radians(lon), math.radians(lat)
+        self.east = (-math.sin(lon), math.cos(lon), 0.0)
+        self.north = (-math.sin(lat) * math.cos(lon), -math.sin(lat) * math.sin(lon), math.cos(lat))
+        self.up = (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+    def to_local(self, lon, lat, height=0.0):
+        x, y, z = geodetic_to_ecef(lon, lat, height)
+        d = (x - self.origin[0], y - self.origin[1], z - self.origin[2])
+        return tuple(sum(a * b for a, b in zip(d, axis)) for axis in (self.east, self.north, self.up))
+
+    def transform(self):
+        """Column-major 4x4 ENU-to-ECEF matrix for tileset.json."""
+        return [*self.east, 0.0, *self.north, 0.0, *self.up, 0.0, *self.origin, 1.0]
+
+
+# =============================================================================
+# Triangulation
+# =============================================================================
+
+def signed_area(ring):
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1])) / 2
+
+
+def clean_ring(ring):
+    """Drop the closing vertex and consecutive duplicates; return a CCW ring."""
+    points = []
+    for p in ring:
+        if not points or p != points[-1]:
+            points.append(p)
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    if signed_area(points) < 0:
+        points.reverse()
+    return points
+
+
+def triangulate(ring):
+    """Ear-clip a simple CCW polygon; return triangles as index triples."""
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    def inside(p, a, b, c):
+        return cross(a, b, p) >= 0 and cross(b, c, p) >= 0 and cross(c, a, p) >= 0
+
+    remaining = list(range(len(ring)))
+    triangles = []
+    while len(remaining) > 3:
+        n = len(remaining)
+        for k in range(n):
+            i, j, l = remaining[k - 1], remaining[k], remaining[(k + 1) % n]
+            a, b, c = ring[i], ring[j], ring[l]
+            if cross(a, b, c) <= 0:
+                continue  # reflex or collinear
+            if any(inside(ring[m], a, b, c) for m in remaining if m not in (i, j, l)):
+                continue
+            triangles.append((i, j, l))
+            remaining.pop(k)
+            break
+        else:
+            break
+    if len(remaining) > 3:
+        # Self-intersecting or degenerate input: fan the rest rather than drop it
+        triangles.extend((remaining[0], remaining[k], remaining[k + 1]) for k in range(1, len(remaining) - 1))
+    elif len(remaining) == 3:
+        triangles.append(tuple(remaining))
+    return triangles
+
+
+# =============================================================================
+# Mesh Assembly
+# =============================================================================
+
+def srgb_to_linear(channel):
+    c = channel / 255
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+
+class Primitive:
+    """Flat-shaded triangles, outline edges and batch ids for one material."""
+
+    def __init__(self):
+        self.positions = array("f")
+        self.normals = array("f")
+        self.batch_ids = array("f")
+        self.indices = array("I")
+        self.outline = array("I")
+
+    def vertex(self, p, normal, batch_id):
+        # glTF is y-up: (east, north, up) -> (east, up, -north)
+        self.positions.extend((p[0], p[2], -p[1]))
+        self.normals.extend((normal[0], normal[2], -normal[1]))
+        self.batch_ids.append(batch_id)
+        return len(self.batch_ids) - 1
+
+    def add_prism(self, lower, upper, batch_id):
+        """Add an extruded polygon: a CCW ring of local (x, y, z) points and the
+        same ring at the top of the extrusion (`lower` itself if it's flat)."""
+        if len(lower) < 3:
+            return
+        triangles = triangulate([(x, y) for x, y, _ in lower])
+
+        caps = [(upper, (0.0, 0.0, 1.0), False)]
+        if upper is not lower:
+            caps.append((lower, (0.0, 0.0, -1.0), True))
+        for ring, normal, flip in caps:
+            base = [self.vertex(p, normal, batch_id) for p in ring]
+            for i, j, k in triangles:
+                self.indices.extend((base[i], base[k], base[j]) if flip else (base[i], base[j], base[k]))
+            for i in range(len(ring)):
+                self.outline.extend((base[i], base[(i + 1) % len(ring)]))
+
+        if upper is lower:
+            return
+        n = len(lower)
+        for i in range(n):
+            p0, p1, q0, q1 = lower[i], lower[(i + 1) % n], upper[i], upper[(i + 1) % n]
+            dx, dy = p1[0] - p0[0], p1[1] - p0[1]
+            length = math.hypot(dx, dy) or 1.0
+            normal = (dy / length, -dx / length, 0.0)
+            a0, b0, b1, a1 = (self.vertex(p, normal, batch_id) for p in (p0, p1, q1, q0))
+            self.indices.extend((a0, b0, b1, a0, b1, a1))
+            self.outline.extend((a0, a1))
+
+
+def make_glb(primitives):
+    """Build a binary glTF with one mesh holding a primitive per RGBA color."""
+    gltf = {
+        "asset": {"version": "2.0", "generator": "build_czml.py"},
+        "extensionsUsed": ["CESIUM_primitive_outline"],
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": []}],
+        "materials": [],
+        "accessors": [],
+        "bufferViews": [],
+        "buffers": [],
+    }
+    body = bytearray()
+
+    def accessor(values, kind, component, target, bounds=False):
+        while len(body) % 4:
+            body.append(0)
+        data = little_endian(values)
+        gltf["bufferViews"].append({"buffer": 0, "byteOffset": len(body), "byteLength": len(data), "target": target})
+        body.extend(data)
+        width = {"SCALAR": 1, "VEC3": 3}[kind]
+        entry = {"bufferView": len(gltf["bufferViews"]) - 1, "componentType": component,
+                 "count": len(values) // width, "type": kind}
+        if bounds:
+            columns = [values[i::width] for i in range(width)]
+            entry["min"] = [min(c) for c in columns]
+            entry["max"] = [max(c) for c in columns]
+        gltf["accessors"].append(entry)
+        return len(gltf["accessors"]) - 1
+
+    for rgba, primitive in primitives.items():
+        if not primitive.indices:
+            continue
+        gltf["materials"].append({
+            "pbrMetallicRoughness": {
+                "baseColorFactor": [*(srgb_to_linear(c) for c in rgba[:3]), rgba[3] / 255],
+                "metallicFactor": 0.0,
+                "roughnessFactor": 1.0,
+            },
+            **({"alphaMode": "BLEND"} if rgba[3] < 255 else {}),
+        })
+        gltf["meshes"][0]["primitives"].append({
+            "attributes": {
+                "POSITION": accessor(primitive.positions, "VEC3", FLOAT, ARRAY_BUFFER, bounds=True),
+                "NORMAL": accessor(primitive.normals, "VEC3", FLOAT, ARRAY_BUFFER),
+                "_BATCHID": accessor(primitive.batch_ids, "SCALAR", FLOAT, ARRAY_BUFFER),
+            },
+            "indices": accessor(primitive.indices, "SCALAR", UNSIGNED_INT, ELEMENT_ARRAY_BUFFER),
+            "material": len(gltf["materials"]) - 1,
+            "mode": TRIANGLES,
+            "extensions": {"CESIUM_primitive_outline": {
+                "indices": accessor(primitive.outline, "SCALAR", UNSIGNED_INT, ELEMENT_ARRAY_BUFFER)}},
+        })
+
+    while len(body) % 4:
+        body.append(0)
+    gltf["buffers"].append({"byteLength": len(body)})
+    header = _padded(json.dumps(gltf, separators=(",", ":")).encode(), 4)
+    length = 12 + 8 + len(header) + 8 + len(body)
+    return b"".join([
+        struct.pack("<4sII", b"glTF", 2, length),
+        struct.pack("<I4s", len(header), b"JSON"), header,
+        struct.pack("<I4s", len(body), b"BIN\0"), bytes(body),
+    ])
+
+
+def _padded(data, alignment, fill=b" ", offset=0):
+    """Pad data so that it ends on an `alignment` boundary when placed at `offset`."""
+    return data + fill * (-(offset + len(data)) % alignment)
+
+
+def make_b3dm(glb, batch_table, batch_length):
+    """Wrap a GLB in a Batched 3D Model with a JSON batch table."""
+    feature_table = _padded(json.dumps({"BATCH_LENGTH": batch_length}).encode(), 8, offset=28)
+    batch_table = _padded(json.dumps(batch_table, separators=(",", ":")).encode(), 8)
+    glb = _padded(glb, 8, b"\0")
+    length = 28 + len(feature_table) + len(batch_table) + len(glb)
+    header = struct.pack("<4sIIIIII", b"b3dm", 1, length, len(feature_table), 0, len(batch_table), 0)
+    return header + feature_table + batch_table + glb
+
+
+# =============================================================================
+# Tileset Writer
+# =============================================================================
+
+class TilesetWriter:
+    """Packet sink that bakes building polygons into one 3D tileset per map period.
+
+    Accepts the same write/write_text/write_file calls as the CZML writers
+    (packets as dicts or serialized text) and writes everything on exit.
+    Static packets belong to every period their availability overlaps;
+    interval-valued positions (--coalesce intervals) are split per interval.
+    """
+
+    def __init__(self, out_dir, config, max_features=TILE_MAX_FEATURES, url_prefix=""):
+        self.dir = Path(out_dir)
+        self.periods = config["map_periods"]
+        self.compact = config.get("compact")  # format of the cache fragments recorded through us
+        self.max_features = max_features
+        self.url_prefix = url_prefix
+        self.features = {period_id: [] for period_id in self.periods}
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def write(self, packet):
+        if isinstance(packet, str):
+            packet = json.loads(packet)
+        self.count += 1
+        polygon = packet.get("polygon")
+        if not polygon:
+            return
+        positions = polygon["positions"]
+        availability = packet["availability"]
+        spans = [availability] if isinstance(availability, str) else availability  # a list when periods have gaps
+        intervals = positions if isinstance(positions, list) else [
+            {"interval": span, **positions} for span in spans]
+        years = [interval_years(span) for span in spans]
+        start, stop = min(first for first, _ in years), max(last for _, last in years)
+        base_id = packet["id"].split("__")[0]
+        feature = (base_id, packet.get("name", ""), start, stop,
+                   polygon.get("height", 0), polygon.get("extrudedHeight", 0),
+                   tuple(polygon["material"]["solidColor"]["color"]["rgba"]))
+        for interval in intervals:
+            first, last = interval_years(interval["interval"])
+            flat = interval["cartographicDegrees"]
+            ring = list(zip(flat[0::3], flat[1::3]))
+            for period_id, period in self.periods.items():
+                if first <= period["stop"] and period["start"] <= last:
+                    self.features[period_id].append((*feature, ring))
+
+    def write_text(self, text, count=1):
+        self.write(text)
+
+    def write_file(self, path, count):
+        # A cached fragment is one source's comma-separated packets
+        with open(path) as f:
+            for packet in json.loads("[" + f.read() + "]"):
+                self.write(packet)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            return False
+        self.dir.mkdir(parents=True, exist_ok=True)
+        layers = []
+        for period_id, period in self.periods.items():
+            features = self.features[period_id]
+            period_dir = self.dir / period_id
+            for stale in period_dir.glob("*.b3dm"):
+                stale.unlink()
+            if not features:
+                (period_dir / "tileset.json").unlink(missing_ok=True)
+                continue
+            period_dir.mkdir(exist_ok=True)
+            tiles = [self.write_tile(period_dir / f"{n}.b3dm", cluster)
+                     for n, cluster in enumerate(self.clusters(features))]
+            children = [child for child, _ in tiles]
+            region = _union([region for _, region in tiles])
+            region[4] += TERRAIN_MIN_HEIGHT
+            region[5] += TERRAIN_MAX_HEIGHT
+            tileset = {
+                "asset": {"version": "1.0"},
+                "geometricError": TILESET_GEOMETRIC_ERROR,
+                "root": {
+                    "boundingVolume": {"region": region},
+                    "geometricError": ROOT_GEOMETRIC_ERROR,
+                    "refine": "ADD",
+                    "children": children,
+                },
+            }
+            with open(period_dir / "tileset.json", "w") as f:
+                json.dump(tileset, f, indent=2)
+            layers.append({
+                "kind": "tileset",
+                "type": "url",
+                "name": f"Buildings ({period_id})",
+                "url": f"{self.url_prefix}{period_id}/tileset.json",
+                "yearStart": period["start"],
+                "yearEnd": period["stop"],
+                "overlay": True,
+                "clampToGround": True,
+            })
+            print(f"  3D Tiles {period_id}: {len(features)} features in {len(children)} tiles")
+
+        with open(self.dir / "layers.json", "w") as f:
+            json.dump(layers, f, indent=2)
+        return False
+
+    def clusters(self, features):
+        """Split features into spatially compact groups of at most max_features,
+        spanning at most TILE_MAX_EXTENT meters of feature centres (median cuts)."""
+        def centre(feature):
+            ring = feature[-1]
+            return sum(p[0] for p in ring) / len(ring), sum(p[1] for p in ring) / len(ring)
+
+        meters_per_degree = math.radians(WGS84_A)
+        stack = [[(centre(f), f) for f in features]]
+        while stack:
+            items = stack.pop()
+            xs = [c[0] for c, _ in items]
+            ys = [c[1] for c, _ in items]
+            width = (max(xs) - min(xs)) * meters_per_degree * math.cos(math.radians(min(ys, key=abs)))
+            height = (max(ys) - min(ys)) * meters_per_degree
+            if len(items) == 1 or (len(items) <= self.max_features and max(width, height) <= TILE_MAX_EXTENT):
+                yield [f for _, f in items]
+                continue
+            axis = 0 if width >= height else 1
+            items.sort(key=lambda item: item[0][axis])
+            half = len(items) // 2
+            stack.extend((items[half:], items[:half]))
+
+    def write_tile(self, path, features):
+        """Write one b3dm tile; return its tileset.json child entry and its region
+        (west, south, east, north, min height, max height) on the ellipsoid."""
+        lons = [p[0] for f in features for p in f[-1]]
+        lats = [p[1] for f in features for p in f[-1]]
+        frame = LocalFrame((min(lons) + max(lons)) / 2, (min(lats) + max(lats)) / 2)
+
+        primitives = {}
+        batch = {"id": [], "name": [], "start": [], "stop": []}
+        corners = []
+        for batch_id, (feature_id, name, start, stop, bottom, top, rgba, ring) in enumerate(features):
+            ring = clean_ring(ring)
+            if len(ring) >= 3:
+                lower = [frame.to_local(lon, lat, bottom) for lon, lat in ring]
+                upper = lower if top == bottom else [frame.to_local(lon, lat, top) for lon, lat in ring]
+                primitives.setdefault(rgba, Primitive()).add_prism(lower, upper, batch_id)
+                corners.extend(lower)
+                corners.extend(upper)
+            for key, value in zip(batch, (feature_id, name, start, stop)):
+                batch[key].append(value)
+
+        path.write_bytes(make_b3dm(make_glb(primitives), batch, len(features)))
+        # A box in the tile's own frame, so it follows the tile when the viewer
+        # moves it onto the terrain (a region would stay behind)
+        lo = [min(p[i] for p in corners) for i in range(3)] if corners else [0.0] * 3
+        hi = [max(p[i] for p in corners) for i in range(3)] if corners else [0.0] * 3
+        centre = [(a + b) / 2 for a, b in zip(lo, hi)]
+        half = [max((b - a) / 2, 0.01) for a, b in zip(lo, hi)]
+        heights = [h for f in features for h in f[4:6]]
+        child = {
+            "boundingVolume": {"box": [*centre, half[0], 0.0, 0.0, 0.0, half[1], 0.0, 0.0, 0.0, half[2]]},
+            "geometricError": 0.0,
+            "transform": frame.transform(),
+            "content": {"uri": path.name},
+        }
+        region = [math.radians(min(lons)), math.radians(min(lats)),
+                  math.radians(max(lons)), math.radians(max(lats)),
+                  min(0, *heights), max(heights)]
+        return child, region
+
+
+def _union(regions):
+    return [min(r[0] for r in regions), min(r[1] for r in regions),
+            max(r[2] for r in regions), max(r[3] for r in regions),
+            min(r[4] for r in regions), max(r[5] for r in regions)]
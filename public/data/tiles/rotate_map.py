@@ -3,54 +3,1298 @@
 Rotate historical map images for georeferencing.
 
 Usage:
-    python rotate_map.py <input.png> <angle_degrees> [output.png]
+    python rotate_map.py <input.png> <angle_degrees> [output.png|output.tif] [--window N]
+                         [--format png|tiff]
+    python rotate_map.py <image.png> [<angle_degrees> [output.png]] --tiles DIR
+                         --bounds WEST,SOUTH,EAST,NORTH [--zoom MIN-MAX] [--jobs N]
+    python rotate_map.py <scan.png> --gcps gcps.json [--gcp X,Y,LON,LAT ...]
+                         [--fit affine|similarity] [-o warped.png] [--tiles DIR]
+    python rotate_map.py --manifest maps.json [--jobs N] [--force]
 
 Example:
     python rotate_map.py berry_1650_original.png -15 berry_1650.png
+    python rotate_map.py berry_1650.png --tiles berry_1650 \
+        --bounds=-2.2545,53.4779,-2.2365,53.4899 --zoom 13-19
 
 Positive angle = counter-clockwise
 Negative angle = clockwise
+
+The output is pixel-for-pixel Pillow's rotate(angle, expand=True,
+resample=BICUBIC) of the scan converted to RGBA, but it is produced a
+window at a time: the expanded canvas is written as strips of --window rows,
+each rendered in --window wide tiles from just the source region that tile
+maps back to. Peak memory follows the window size, not the scan size.
+
+--gcps warps the scan north-up in one resampling pass instead: an affine
+(or similarity) transform is least-squares fitted to ground control
+points, pixel (x, y) from the scan's top-left corner -> lon/lat, and the
+scan is resampled once onto a lon/lat grid at its own resolution. It
+prints each GCP's residual and the exact single_tile bounds, replacing
+rotate-then-georeference-in-QGIS and its second resampling.
+
+--tiles cuts the (rotated or warped) image, stretched over --bounds as the
+single_tile provider shows it, into a Web Mercator XYZ pyramid at
+DIR/{z}/{x}/{y}.png for the url_template provider. The deepest zoom is
+resampled from the image and each level above from the four tiles below
+it, on a thread pool; fully transparent tiles are not written.
+
+A .tif output (or --format tiff) is a tiled TIFF instead: Deflate
+compressed 256 px tiles, plus overview pages each half the size of the one
+before down to a single tile. TiledTiff reads any window of any level
+through mmap, decoding only the tiles it touches, so previews, thumbnails
+and --tiles from a .tif (whose deepest zoom comes from the closest
+overview) cost what they read rather than the whole scan:
+
+    with TiledTiff("berry_1650.tif") as tiff:
+        corner = tiff.read((4096, 2048, 4608, 2560))       # full resolution
+        sheet = tiff.read((0, 0) + tiff.levels[3].size, 3)  # 1/8 size
+        thumb = tiff.thumbnail((400, 400))
+
+Pillow, GDAL and QGIS open the file as an ordinary RGBA TIFF.
+
+--manifest processes a list of maps, several at once on a process pool.
+Paths are relative to the manifest:
+
+    {"maps": [{"name": "berry_1650", "source": "originals/berry_1650.png",
+               "angle": -15, "bounds": {"west": ..., "north": ...},
+               "outputs": ["png", "tiles"], "zoom": [14, 19],
+               "layer": {"yearStart": 1650, "credit": "..."}}]}
+
+"png" writes <name>.png (or "output"), "tiff" a tiled TIFF <name>.tif (or
+"tiff"), "tiles" a pyramid in <name>/ (or "tiles"). An entry with "gcps"
+(inline, or a JSON file as for --gcps) and optionally "fit" is warped
+instead of rotated, and takes its bounds from the warp. Each map's
+"result" is written back into the manifest: the source's hash, a hash of
+its parameters, the output's pixel size and the layer configs to paste
+into the project (with "layer" merged in). A map whose source and
+parameters match its result is skipped.
 """
 
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
 import sys
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
 from PIL import Image
 
+try:
+    import numpy as np
+except ImportError:  # tiles are then resampled by Pillow, PNG rows and TIFF tiles written unpredicted
+    np = None
+
+# Output rows per strip and columns per tile
+DEFAULT_WINDOW = 256
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Samples per pixel of each PNG colour type
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Rows filtered at a time when choosing PNG row filters
+FILTER_ROWS = 64
+
+# Samples resampled at a time by bicubic(), so its temporaries stay in cache
+BICUBIC_SAMPLES = 8192
+
+# Metres per degree of latitude (spherical Earth), for GCP residuals
+METERS_PER_DEGREE = 6371008.8 * math.pi / 180
+
+# XYZ tile edge in pixels
+TILE_SIZE = 256
+
+# TIFF Compression values for Deflate, and the field types written and read
+TIFF_DEFLATE = 8
+TIFF_DEFLATE_OLD = 32946
+TIFF_FORMATS = {1: "B", 3: "H", 4: "I"}
+
+# Files under public/ are served from the site root
+PUBLIC_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def rotation_transform(size, angle):
+    """Return (output size, affine matrix, transpose) for an expanding rotation.
+
+    Mirrors Image.rotate(expand=True): right angles are a transpose (matrix
+    None), anything else an affine map from output to source pixels.
+    """
+    w, h = size
+    angle = angle % 360.0
+    if angle == 0:
+        return size, None, None
+    if angle == 180:
+        return size, None, Image.Transpose.ROTATE_180
+    if angle in (90, 270):
+        return (h, w), None, Image.Transpose.ROTATE_90 if angle == 90 else Image.Transpose.ROTATE_270
+
+    angle = -math.radians(angle)
+    matrix = [
+        round(math.cos(angle), 15),
+        round(math.sin(angle), 15),
+        0.0,
+        round(-math.sin(angle), 15),
+        round(math.cos(angle), 15),
+        0.0,
+    ]
+
+    def transform(x, y):
+        a, b, c, d, e, f = matrix
+        return a * x + b * y + c, d * x + e * y + f
+
+    center = (w / 2, h / 2)
+    matrix[2], matrix[5] = transform(-center[0], -center[1])
+    matrix[2] += center[0]
+    matrix[5] += center[1]
+
+    corners = [transform(x, y) for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    nw = math.ceil(max(x for x, _ in corners)) - math.floor(min(x for x, _ in corners))
+    nh = math.ceil(max(y for _, y in corners)) - math.floor(min(y for _, y in corners))
+    matrix[2], matrix[5] = transform(-(nw - w) / 2.0, -(nh - h) / 2.0)
+    return (nw, nh), matrix, None
+
+
+def transposed_box(box, size, transpose):
+    """The source box a right-angle rotation (or none) maps output `box` from."""
+    x0, y0, x1, y1 = box
+    w, h = size
+    if transpose is None:
+        return box
+    if transpose == Image.Transpose.ROTATE_180:
+        return (w - x1, h - y1, w - x0, h - y0)
+    if transpose == Image.Transpose.ROTATE_90:
+        return (w - y1, x0, w - y0, x1)
+    return (y0, h - x1, y1, h - x0)
+
+
+def source_box(box, size, matrix):
+    """The source region bicubic sampling of output `box` reads, or None if outside."""
+    x0, y0, x1, y1 = box
+    a, b, c, d, e, f = matrix
+    corners = [(x, y) for x in (x0, x1) for y in (y0, y1)]
+    xs = [a * x + b * y + c for x, y in corners]
+    ys = [d * x + e * y + f for x, y in corners]
+    # Four taps around each sample: floor(x - 0.5) - 1 .. floor(x - 0.5) + 2
+    left, top = max(0, math.floor(min(xs)) - 2), max(0, math.floor(min(ys)) - 2)
+    right, bottom = min(size[0], math.ceil(max(xs)) + 3), min(size[1], math.ceil(max(ys)) + 3)
+    if left >= right or top >= bottom:
+        return None
+    return (left, top, right, bottom)
+
+
+def png_chunks(f):
+    """Yield (type, data) for each chunk of a PNG file up to IEND."""
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("not a PNG file")
+    while True:
+        length, kind = struct.unpack(">I4s", f.read(8))
+        data = f.read(length)
+        f.read(4)  # CRC
+        yield kind, data
+        if kind == b"IEND":
+            return
+
+
+def png_strips(path, mode, rawmode, rows):
+    """Yield the rows of a non-interlaced PNG as images of at most `rows` rows.
+
+    The IDAT stream is inflated a strip at a time and the strip's filtered
+    scanlines are handed to Pillow's PNG decoder behind the previous strip's
+    last scanline, stored unfiltered, since the first row's filter may refer
+    to it.
+    """
+    with open(path, "rb") as f:
+        chunks = png_chunks(f)
+        _, header = next(chunks)
+        width, height, depth, color_type = struct.unpack(">IIBB", header[:10])
+        stride = 1 + (width * PNG_CHANNELS[color_type] * depth + 7) // 8
+        idat = (data for kind, data in chunks if kind == b"IDAT")
+        inflate = zlib.decompressobj()
+        data = b""
+        previous = b""
+        for done in range(0, height, rows):
+            n = min(rows, height - done)
+            scanlines = bytearray()
+            while len(scanlines) < n * stride:
+                if not data:
+                    data = next(idat, None)
+                    if data is None:
+                        raise ValueError(f"{path}: image data ends after {done} of {height} rows")
+                scanlines += inflate.decompress(data, n * stride - len(scanlines))
+                data = inflate.unconsumed_tail
+            strip = Image.frombytes(mode, (width, n + bool(previous)),
+                                    zlib.compress(previous + scanlines, 0), "zip", rawmode)
+            if previous:
+                strip = strip.crop((0, 1, width, n + 1))
+            previous = b"\0" + strip.crop((0, n - 1, width, n)).tobytes("raw", rawmode)
+            yield strip
+
+
+class ScanSource:
+    """A scan's pixels, read back as RGBA windows.
+
+    Non-interlaced PNGs are decoded a strip at a time into an uncompressed
+    spill file in the scan's own mode (a byte per pixel for paletted and
+    greyscale scans), which windows are read from through mmap, so nothing
+    the size of the scan is held in memory. Tiled TIFFs are read in place
+    through TiledTiff, overviews included. Other images are loaded whole,
+    still in their own mode.
+    """
+
+    def __init__(self, path, rows=DEFAULT_WINDOW):
+        self.image = Image.open(path)
+        self.size = self.image.size
+        self.mode = self.image.mode
+        self.spill = self.map = self.rows = self.tiff = None
+        if self.image.format == "TIFF":
+            try:
+                self.tiff = TiledTiff(path)
+            except ValueError:  # strips, JPEG tiles and the like: loaded whole
+                pass
+        if self.tiff is not None:
+            return
+        if self.streamable():
+            self.spill = tempfile.TemporaryFile(prefix="rotate_map_")
+            for strip in png_strips(path, self.mode, self.image.tile[0].args, rows):
+                self.spill.write(strip.tobytes())
+            self.spill.flush()
+            self.map = mmap.mmap(self.spill.fileno(), 0, access=mmap.ACCESS_READ)
+            self.pixel_size = len(Image.new(self.mode, (1, 1)).tobytes())
+            if np is not None:  # rows as a 2-D byte array, so a window is one slice
+                self.rows = np.frombuffer(self.map, dtype=np.uint8).reshape(self.size[1], -1)
+        else:
+            self.image.load()
+
+    def streamable(self):
+        image = self.image
+        if image.format != "PNG" or image.info.get("interlace") or self.mode == "1":
+            return False
+        if len(image.tile) != 1 or image.tile[0].codec_name != "zip":
+            return False
+        try:  # the previous strip's last row is re-encoded in the file's raw mode
+            Image.new(self.mode, (1, 1)).tobytes("raw", image.tile[0].args)
+        except ValueError:
+            return False
+        return True
+
+    def level_for(self, scale):
+        """The overview level to read at `scale` source pixels per pixel (see TiledTiff)."""
+        return 0 if self.tiff is None else self.tiff.level_for(scale)
+
+    def read(self, box, level=0):
+        """Return the pixels in `box` (left, top, right, bottom) as an RGBA image.
+
+        `level` picks a tiled TIFF's overview; the box is then in its pixels.
+        """
+        if self.tiff is not None:
+            return self.tiff.read(box, level)
+        if self.map is None:
+            window = self.image.crop(box)
+        else:
+            left, top, right, bottom = box
+            row_size = self.size[0] * self.pixel_size
+            start, stop = left * self.pixel_size, right * self.pixel_size
+            if self.rows is not None:
+                data = self.rows[top:bottom, start:stop].tobytes()
+            else:
+                data = b"".join(self.map[y * row_size + start:y * row_size + stop] for y in range(top, bottom))
+            window = Image.frombytes(self.mode, (right - left, bottom - top), data)
+            if self.image.palette is not None and self.mode in ("P", "PA"):
+                window.putpalette(self.image.palette)
+            if "transparency" in self.image.info:
+                window.info["transparency"] = self.image.info["transparency"]
+        return window if window.mode == "RGBA" else window.convert("RGBA")
+
+    def close(self):
+        self.rows = None  # release the mmap's buffer before closing it
+        if self.map is not None:
+            self.map.close()
+            self.spill.close()
+        if self.tiff is not None:
+            self.tiff.close()
+        self.image.close()
+
+
+def filter_rows(rows, previous, pixel_size=4):
+    """PNG-filter scanlines (an (n, stride) uint8 array) following `previous`.
+
+    Each row gets whichever of the five filters leaves the smallest sum of
+    absolute (signed) bytes, as libpng and Pillow choose them.
+    """
+    up = np.vstack((previous, rows[:-1]))
+    left = np.zeros_like(rows)
+    left[:, pixel_size:] = rows[:, :-pixel_size]
+    up_left = np.zeros_like(rows)
+    up_left[:, pixel_size:] = up[:, :-pixel_size]
+
+    a, b, c = left.astype(np.int16), up.astype(np.int16), up_left.astype(np.int16)
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+    average = ((a + b) >> 1).astype(np.uint8)
+
+    candidates = np.stack((rows, rows - left, rows - up, rows - average, rows - paeth))
+    # |signed byte| as an unsigned byte (-128 stays 128), summed along each row
+    scores = np.abs(candidates.view(np.int8)).view(np.uint8).sum(axis=2, dtype=np.uint32)
+    best = scores.argmin(axis=0)
+    filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = best
+    filtered[:, 1:] = candidates[best, np.arange(len(rows))]
+    return filtered
+
+
+class PngWriter:
+    """Write an 8-bit RGBA PNG a strip of rows at a time."""
+
+    def __init__(self, path, size):
+        self.file = open(path, "wb")
+        self.size = size
+        self.deflate = zlib.compressobj()
+        self.previous = bytes(size[0] * 4)
+        self.file.write(PNG_SIGNATURE)
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, 6, 0, 0, 0))
+
+    def chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(kind + data)))
+
+    def write(self, strip):
+        data = strip.tobytes()
+        stride = self.size[0] * 4
+        if np is None:
+            scanlines = b"".join(b"\0" + data[i:i + stride] for i in range(0, len(data), stride))
+        else:
+            rows = np.frombuffer(data, dtype=np.uint8).reshape(-1, stride)
+            previous = np.frombuffer(self.previous, dtype=np.uint8)
+            parts = []
+            for i in range(0, len(rows), FILTER_ROWS):
+                parts.append(filter_rows(rows[i:i + FILTER_ROWS], previous).tobytes())
+                previous = rows[min(i + FILTER_ROWS, len(rows)) - 1]
+            scanlines = b"".join(parts)
+        self.previous = data[-stride:]
+        compressed = self.deflate.compress(scanlines)
+        if compressed:
+            self.chunk(b"IDAT", compressed)
+
+    def close(self):
+        self.chunk(b"IDAT", self.deflate.flush())
+        self.chunk(b"IEND", b"")
+        self.file.close()
+
+
+class TiledTiffWriter:
+    """Write an 8-bit RGBA tiled TIFF with overviews a strip of rows at a time.
+
+    Each level is deflated in TILE_SIZE tiles as soon as a row of its tiles
+    is complete, and those rows are halved with Pillow's reduce() (which
+    averages premultiplied) into the level below, until the whole image
+    fits one tile. The IFDs, one per level and largest first, are written
+    last, so the file is never held in memory.
+    """
+
+    def __init__(self, path, size, jobs=None):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(b"II*\0\0\0\0\0")  # first IFD offset filled in by close()
+        self.predictor = 1 if np is None else 2
+        self.sizes = [size]
+        while max(self.sizes[-1]) > TILE_SIZE:
+            width, height = self.sizes[-1]
+            self.sizes.append(((width + 1) // 2, (height + 1) // 2))
+        self.pending = [[] for _ in self.sizes]
+        self.buffered = [0] * len(self.sizes)
+        self.offsets = [[] for _ in self.sizes]
+        self.counts = [[] for _ in self.sizes]
+        self.pool = ThreadPoolExecutor(jobs or os.cpu_count())  # zlib and numpy release the GIL
+
+    def write(self, strip, level=0):
+        self.pending[level].append(strip)
+        self.buffered[level] += strip.height
+        while self.buffered[level] >= TILE_SIZE:
+            self.flush(level, TILE_SIZE)
+
+    def flush(self, level, rows):
+        """Encode the next `rows` buffered rows of a level as a row of tiles."""
+        width = self.sizes[level][0]
+        band = Image.new("RGBA", (width, rows))
+        strips = self.pending[level]
+        top = 0
+        while top < rows:
+            strip = strips.pop(0)
+            if strip.height > rows - top:
+                strips.insert(0, strip.crop((0, rows - top, width, strip.height)))
+                strip = strip.crop((0, 0, width, rows - top))
+            band.paste(strip, (0, top))
+            top += strip.height
+        self.buffered[level] -= rows
+
+        # Edge tiles are padded out to full size with transparency
+        tiles = [band.crop((left, 0, left + TILE_SIZE, TILE_SIZE)) for left in range(0, width, TILE_SIZE)]
+        for data in self.pool.map(self.encode, tiles):
+            self.offsets[level].append(self.file.tell())
+            self.counts[level].append(len(data))
+            self.file.write(data)
+        if level + 1 < len(self.sizes):
+            self.write(band.reduce(2), level + 1)
+
+    def encode(self, tile):
+        data = tile.tobytes()
+        if self.predictor == 2:  # horizontal differencing, undone by a running sum along each row
+            pixels = np.frombuffer(data, dtype=np.uint8).reshape(TILE_SIZE, TILE_SIZE, 4)
+            diff = pixels.copy()
+            diff[:, 1:] -= pixels[:, :-1]
+            data = diff.tobytes()
+        return zlib.compress(data)
+
+    def close(self):
+        try:
+            for level in range(len(self.sizes)):
+                if self.buffered[level]:
+                    self.flush(level, self.buffered[level])
+            if self.file.tell() >= 1 << 32:
+                raise ValueError(f"{self.path}: over 4 GB, too large for a classic TIFF")
+            link = 4
+            for level, (width, height) in enumerate(self.sizes):
+                entries = [(254, 4, [1 if level else 0]), (256, 4, [width]), (257, 4, [height]),
+                           (258, 3, [8] * 4), (259, 3, [TIFF_DEFLATE]), (262, 3, [2]), (277, 3, [4]),
+                           (284, 3, [1]), (317, 3, [self.predictor]), (322, 3, [TILE_SIZE]),
+                           (323, 3, [TILE_SIZE]), (324, 4, self.offsets[level]),
+                           (325, 4, self.counts[level]), (338, 3, [2])]
+                fields = []
+                for tag, kind, values in entries:
+                    data = struct.pack(f"<{len(values)}{TIFF_FORMATS[kind]}", *values)
+                    if len(data) > 4:  # stored out of line, word-aligned
+                        self.file.write(b"\0" * (self.file.tell() % 2))
+                        offset = self.file.tell()
+                        self.file.write(data)
+                        data = struct.pack("<I", offset)
+                    fields.append(struct.pack("<HHI", tag, kind, len(values)) + data.ljust(4, b"\0"))
+                self.file.write(b"\0" * (self.file.tell() % 2))
+                ifd = self.file.tell()
+                self.file.write(struct.pack("<H", len(fields)) + b"".join(fields) + b"\0\0\0\0")
+                self.file.seek(link)
+                self.file.write(struct.pack("<I", ifd))
+                self.file.seek(0, os.SEEK_END)
+                link = ifd + 2 + 12 * len(fields)
+        finally:
+            self.pool.shutdown()
+            self.file.close()
+
+
+def output_writer(path, size, jobs=None):
+    """A TiledTiffWriter (encoding on `jobs` threads) for .tif/.tiff paths, else a PngWriter."""
+    if Path(path).suffix.lower() in (".tif", ".tiff"):
+        return TiledTiffWriter(path, size, jobs)
+    return PngWriter(path, size)
+
+
+class TiffLevel:
+    """One page of a tiled TIFF: its size, tiling and where each tile is."""
+
+    __slots__ = ("size", "tile", "across", "offsets", "counts", "mode", "compression", "predictor")
+
+    def __init__(self, tags, path):
+        def tag(key, default=None):
+            value = tags.get(key, default)
+            if value is None:
+                raise ValueError(f"{path}: missing TIFF tag {key}")
+            return value
+
+        self.size = (tag(256)[0], tag(257)[0])
+        if 322 not in tags:
+            raise ValueError(f"{path}: not a tiled TIFF")
+        self.tile = (tag(322)[0], tag(323)[0])
+        self.across = -(-self.size[0] // self.tile[0])
+        self.offsets, self.counts = tag(324), tag(325)
+        samples = tag(277, (1,))[0]
+        self.compression = tag(259, (1,))[0]
+        self.predictor = tag(317, (1,))[0]
+        if (set(tag(258, (1,))) != {8} or tag(262)[0] != 2 or samples not in (3, 4)
+                or tag(284, (1,))[0] != 1):
+            raise ValueError(f"{path}: only 8-bit chunky RGB and RGBA TIFFs are read")
+        if self.compression not in (1, TIFF_DEFLATE, TIFF_DEFLATE_OLD):
+            raise ValueError(f"{path}: unsupported TIFF compression {self.compression}")
+        if self.predictor not in (1, 2) or (self.predictor == 2 and np is None):
+            raise ValueError(f"{path}: TIFF predictor {self.predictor} needs numpy or is unsupported")
+        if samples == 3:
+            self.mode = "RGB"
+        else:  # ExtraSamples 1 is premultiplied alpha
+            self.mode = "RGBa" if tags.get(338, (2,))[0] == 1 else "RGBA"
+
+
+class TiledTiff:
+    """A tiled TIFF's levels, read back a window at a time through mmap.
+
+    Reads 8-bit chunky RGB(A) TIFFs tiled with no or Deflate compression
+    and an optional horizontal predictor: what TiledTiffWriter writes, and
+    also GDAL's Deflate COGs. Each page (masks aside) is a level, largest
+    first; read() decodes only the tiles a window touches.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self.file.close()
+            raise ValueError(f"{path}: not a TIFF file")
+        try:
+            self.order = {b"II": "<", b"MM": ">"}.get(self.map[:2])
+            if self.order is None or struct.unpack(self.order + "H", self.map[2:4])[0] != 42:
+                raise ValueError(f"{path}: not a classic TIFF file")
+            self.levels = []
+            offset, = struct.unpack(self.order + "I", self.map[4:8])
+            while offset:
+                tags, offset = self.ifd(offset)
+                if not tags.get(254, (0,))[0] & 4:  # skip transparency masks
+                    self.levels.append(TiffLevel(tags, path))
+            if not self.levels:
+                raise ValueError(f"{path}: no images in TIFF")
+            self.levels.sort(key=lambda level: -level.size[0])
+        except ValueError:
+            self.close()
+            raise
+        except struct.error as e:
+            self.close()
+            raise ValueError(f"{path}: truncated TIFF") from e
+        self.size = self.levels[0].size
+
+    def ifd(self, offset):
+        """Parse the IFD at `offset` into ({tag: values}, next IFD offset)."""
+        count, = struct.unpack_from(self.order + "H", self.map, offset)
+        tags = {}
+        for i in range(count):
+            tag, kind, n, value = struct.unpack_from(self.order + "HHI4s", self.map, offset + 2 + 12 * i)
+            if kind not in TIFF_FORMATS:
+                continue
+            fmt = f"{self.order}{n}{TIFF_FORMATS[kind]}"
+            size = struct.calcsize(fmt)
+            if size > 4:
+                start, = struct.unpack(self.order + "I", value)
+                value = self.map[start:start + size]
+            tags[tag] = struct.unpack(fmt, value[:size])
+        next_ifd, = struct.unpack_from(self.order + "I", self.map, offset + 2 + 12 * count)
+        return tags, next_ifd
+
+    def level_for(self, scale):
+        """The coarsest level with at least one pixel per `scale` full-size pixels."""
+        level = 0
+        while level + 1 < len(self.levels) and self.size[0] / self.levels[level + 1].size[0] <= scale:
+            level += 1
+        return level
+
+    def tile(self, level, col, row):
+        """Tile (col, row) of a level as a full tile-size RGBA image."""
+        page = self.levels[level]
+        k = row * page.across + col
+        if not page.counts[k]:  # sparse tile
+            return Image.new("RGBA", page.tile)
+        data = self.map[page.offsets[k]:page.offsets[k] + page.counts[k]]
+        if page.compression != 1:
+            data = zlib.decompress(data)
+        samples = len(page.mode)
+        if page.predictor == 2:
+            pixels = np.frombuffer(data, dtype=np.uint8).reshape(page.tile[1], page.tile[0], samples)
+            data = np.cumsum(pixels, axis=1, dtype=np.uint8).tobytes()
+        image = Image.frombytes(page.mode, page.tile, data)
+        return image if image.mode == "RGBA" else image.convert("RGBA")
+
+    def read(self, box, level=0):
+        """Return `box` (left, top, right, bottom, in the level's pixels) as an RGBA image.
+
+        Only the tiles the box overlaps are decoded; parts outside the
+        image are transparent.
+        """
+        left, top, right, bottom = box
+        page = self.levels[level]
+        width, height = page.tile
+        rows = -(-page.size[1] // height)
+        window = Image.new("RGBA", (right - left, bottom - top))
+        for row in range(max(0, top // height), min(rows, -(-bottom // height))):
+            for col in range(max(0, left // width), min(page.across, -(-right // width))):
+                window.paste(self.tile(level, col, row), (col * width - left, row * height - top))
+        if right > page.size[0] or bottom > page.size[1]:  # clear the edge tiles' padding
+            inside = Image.new("RGBA", window.size)
+            inside.paste(window.crop((0, 0, max(0, page.size[0] - left), max(0, page.size[1] - top))))
+            window = inside
+        return window
+
+    def thumbnail(self, max_size):
+        """The whole image fitted within max_size (width, height), resized from
+        the smallest level at least that large."""
+        scale = max(self.size[0] / max_size[0], self.size[1] / max_size[1])
+        level = self.level_for(scale)
+        image = self.read((0, 0) + self.levels[level].size, level)
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        return image
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def cubic(v1, v2, v3, v4, d):
+    """Pillow's BICUBIC step: p1 + d * (p2 + d * (p3 + d * p4)), rounded the same way.
+
+    Taps may be int16 (exact, so the p terms are too) or float64.
+    """
+    p2 = v3 - v1
+    p3 = 2 * (v1 - v2) + v3 - v4
+    p4 = v2 - v1 - v3 + v4
+    value = d * p4
+    value += p3
+    value *= d
+    value += p2
+    value *= d
+    value += v2
+    return value
+
+
+def bicubic(window, region, size, matrix, box):
+    """Sample output `box` from `window` (the source pixels in `region`).
+
+    This is Pillow's bicubic affine filter, but sample positions are
+    computed from the whole canvas's pixel coordinates rather than the
+    tile's, so they round exactly as in a single full-size transform.
+    """
+    x0, y0, x1, y1 = box
+    a, b, c, d, e, f = matrix
+    xin = np.arange(x0, x1) + 0.5
+    yin = (np.arange(y0, y1) + 0.5)[:, None]
+    xs = (a * xin + b * yin + c).ravel()
+    ys = (d * xin + e * yin + f).ravel()
+    inside = np.flatnonzero((xs >= 0.0) & (xs < size[0]) & (ys >= 0.0) & (ys < size[1]))
+    xs = xs[inside] - 0.5
+    ys = ys[inside] - 0.5
+    fx, fy = np.floor(xs), np.floor(ys)
+    dx, dy = (xs - fx)[:, None], (ys - fy)[:, None]
+
+    # Taps clamp to the scan's edges, which the window includes wherever they're reached
+    pixels = np.asarray(window.convert("RGBa")).view(np.uint32)[..., 0]
+    offsets = np.arange(-1, 3)[:, None]
+    cols = np.clip(fx.astype(np.intp) + offsets, 0, size[0] - 1) - region[0]
+    rows = np.clip(fy.astype(np.intp) + offsets, 0, size[1] - 1) - region[1]
+    value = np.empty((len(inside), 4), dtype=np.uint8)
+    for start in range(0, len(inside), BICUBIC_SAMPLES):
+        part = slice(start, start + BICUBIC_SAMPLES)
+        # Every sample's 4 x 4 taps in one gather: (row, column, sample, channel)
+        taps = pixels[rows[:, None, part], cols[None, :, part]]
+        taps = taps.view(np.uint8).reshape(taps.shape + (4,)).astype(np.int16)
+        across = cubic(taps[:, 0], taps[:, 1], taps[:, 2], taps[:, 3], dx[part])  # all four rows at once
+        value[part] = np.clip(cubic(*across, dy[part]), 0.0, 255.0).astype(np.uint8)
+
+    out = np.zeros(((y1 - y0) * (x1 - x0), 4), dtype=np.uint8)
+    out[inside] = value
+    return Image.frombuffer("RGBa", (x1 - x0, y1 - y0), out, "raw", "RGBa", 0, 1).convert("RGBA")
+
+
+def render_window(source, box, matrix, transpose):
+    """Render output `box` of the rotated canvas as an RGBA image, or None if blank."""
+    x0, y0, x1, y1 = box
+    if matrix is None:
+        window = source.read(transposed_box(box, source.size, transpose))
+        return window if transpose is None else window.transpose(transpose)
+
+    region = source_box(box, source.size, matrix)
+    if region is None:
+        return None
+    if np is not None:
+        return bicubic(source.read(region), region, source.size, matrix, box)
+    # Pillow's own transform of the window; sample positions can differ from
+    # a full-size rotate in the last bit, which now and then moves a pixel by one
+    a, b, c, d, e, f = matrix
+    shifted = (a, b, a * x0 + b * y0 + c - region[0], d, e, d * x0 + e * y0 + f - region[1])
+    return source.read(region).transform((x1 - x0, y1 - y0), Image.Transform.AFFINE, shifted, Image.BICUBIC)
+
 
-def rotate_map(input_path, angle, output_path=None):
-    """Rotate image and expand canvas to fit."""
+def write_transformed(source, size, matrix, transpose, output_paths, window=DEFAULT_WINDOW, jobs=None):
+    """Render a `size` canvas from the source (see render_window) into each output, a strip at a time.
+
+    A strip's windows are rendered on `jobs` threads (default: CPU count),
+    and each strip is encoded on another thread while the next one renders;
+    NumPy, Pillow and zlib release the GIL. At most two strips are held at once.
+    """
+    writers = [output_writer(path, size, jobs) for path in output_paths]
+
+    def render(box):
+        return box[0], render_window(source, box, matrix, transpose)
+
+    def write(strip):
+        for writer in writers:
+            writer.write(strip)
+
+    pending = None
+    try:
+        with ThreadPoolExecutor(jobs or os.cpu_count()) as pool, ThreadPoolExecutor(1) as encoder:
+            for top in range(0, size[1], window):
+                bottom = min(top + window, size[1])
+                strip = Image.new("RGBA", (size[0], bottom - top))
+                boxes = [(left, top, min(left + window, size[0]), bottom) for left in range(0, size[0], window)]
+                for left, tile in pool.map(render, boxes):
+                    if tile is not None:
+                        strip.paste(tile, (left, 0))
+                if pending is not None:
+                    pending.result()
+                pending = encoder.submit(write, strip)
+            pending.result()
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+def output_paths(output_path):
+    """One output path, or several to write in the same pass, as a list."""
+    return [output_path] if isinstance(output_path, (str, os.PathLike)) else list(output_path)
+
+
+def rotate_map(input_path, angle, output_path=None, window=DEFAULT_WINDOW, jobs=None):
+    """Rotate image and expand canvas to fit.
+
+    output_path may be a list: a PNG and a tiled TIFF are written in one pass.
+    """
     if output_path is None:
         output_path = input_path.replace('.png', '_rotated.png')
 
     print(f"Loading: {input_path}")
-    img = Image.open(input_path)
+    source = ScanSource(input_path, window)
+    try:
+        print(f"Original size: {source.size}")
+        print(f"Rotating {angle} degrees...")
+
+        size, matrix, transpose = rotation_transform(source.size, angle)
+        print(f"Rotated size: {size}")
+        outputs = output_paths(output_path)
+        print(f"Saving: {', '.join(map(str, outputs))}")
+        write_transformed(source, size, matrix, transpose, outputs, window, jobs)
+    finally:
+        source.close()
+    print("Done!")
+
+    return size
+
+
+def load_gcps(path):
+    """Read ground control points from a JSON list of {"x", "y", "lon", "lat"}."""
+    with open(path) as f:
+        return [(p["x"], p["y"], p["lon"], p["lat"]) for p in json.load(f)]
+
+
+def parse_gcp(text):
+    x, y, lon, lat = (float(v) for v in text.split(","))
+    return x, y, lon, lat
+
+
+def fit_gcps(gcps, fit="affine"):
+    """Least-squares pixel -> lon/lat transform through ground control points.
+
+    gcps are (x, y, lon, lat) with pixel coordinates measured from the
+    image's top-left corner. The fit is done in local metres around the
+    points' centroid, so a similarity is a true rotation and uniform scale
+    on the ground. Returns (matrix, residuals): lon = a x + b y + c and
+    lat = d x + e y + f for matrix (a, b, c, d, e, f), and each GCP's
+    (east, north) misfit in metres.
+    """
+    if np is None:
+        raise RuntimeError("fitting GCPs needs NumPy")
+    x, y, lon, lat = np.asarray(gcps, dtype=float).T
+    needed = {"affine": 3, "similarity": 2}[fit]
+    if len(x) < needed:
+        raise ValueError(f"an {fit} fit needs at least {needed} GCPs, got {len(x)}")
+
+    lon0, lat0 = lon.mean(), lat.mean()
+    kx, ky = METERS_PER_DEGREE * math.cos(math.radians(lat0)), METERS_PER_DEGREE
+    east, north = (lon - lon0) * kx, (lat - lat0) * ky
+    ones, zeros = np.ones_like(x), np.zeros_like(x)
+    if fit == "affine":
+        design = np.column_stack((x, y, ones))
+        (a, b, c), _, rank, _ = np.linalg.lstsq(design, east, rcond=None)
+        (d, e, f), _, _, _ = np.linalg.lstsq(design, north, rcond=None)
+    else:
+        # Pixel y runs down and north up: east = p x + q y + tx, north = q x - p y + ty
+        design = np.vstack((np.column_stack((x, y, ones, zeros)), np.column_stack((-y, x, zeros, ones))))
+        (p, q, c, f), _, rank, _ = np.linalg.lstsq(design, np.concatenate((east, north)), rcond=None)
+        a, b, d, e = p, q, q, -p
+    if rank < (3 if fit == "affine" else 4):
+        raise ValueError("GCPs are degenerate (coincident or collinear)")
+
+    residuals = np.column_stack((a * x + b * y + c - east, d * x + e * y + f - north))
+    matrix = (a / kx, b / kx, c / kx + lon0, d / ky, e / ky, f / ky + lat0)
+    return tuple(float(v) for v in matrix), residuals.tolist()
+
+
+def warp_transform(size, matrix):
+    """Return (output size, bounds, output -> source matrix) for a north-up warp.
+
+    The output is a lon/lat grid, as the single_tile provider stretches
+    images, covering the warped source at its own resolution along each
+    axis; bounds are snapped out to whole output pixels.
+    """
+    a, b, c, d, e, f = matrix
+    w, h = size
+    corners = [(a * x + b * y + c, d * x + e * y + f) for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    west, east = min(lon for lon, _ in corners), max(lon for lon, _ in corners)
+    south, north = min(lat for _, lat in corners), max(lat for _, lat in corners)
+    res_x, res_y = math.hypot(a, b), math.hypot(d, e)
+    # rounding in the fit mustn't add an empty column or row to a whole-pixel extent
+    out_w, out_h = math.ceil((east - west) / res_x - 1e-6), math.ceil((north - south) / res_y - 1e-6)
+    bounds = {"west": west, "south": north - out_h * res_y, "east": west + out_w * res_x, "north": north}
+
+    # Output pixel (u, v) -> lon/lat -> source pixel through the inverse of [[a, b], [d, e]]
+    det = a * e - b * d
+    ia, ib, id_, ie = e / det, -b / det, -d / det, a / det
+    inverse = (ia * res_x, -ib * res_y, ia * (west - c) + ib * (north - f),
+               id_ * res_x, -ie * res_y, id_ * (west - c) + ie * (north - f))
+    return (out_w, out_h), bounds, inverse
+
+
+def warp_map(input_path, gcps, output_path=None, fit="affine", window=DEFAULT_WINDOW, jobs=None):
+    """Warp a scan north-up through its GCPs in one resampling pass.
+
+    Returns (size, bounds), bounds ready for the single_tile provider.
+    output_path may be a list, as for rotate_map().
+    """
+    if output_path is None:
+        output_path = input_path.replace('.png', '_warped.png')
+
+    matrix, residuals = fit_gcps(gcps, fit)
+    print(f"Loading: {input_path}")
+    source = ScanSource(input_path, window)
+    try:
+        size, bounds, inverse = warp_transform(source.size, matrix)
+        pixel_m = METERS_PER_DEGREE * math.hypot(matrix[3], matrix[4])
+        print(f"GCP residuals ({fit} fit):")
+        print(f"  {'#':>3} {'x':>9} {'y':>9} {'east m':>9} {'north m':>9} {'error m':>9} {'px':>6}")
+        for i, ((x, y, _, _), (de, dn)) in enumerate(zip(gcps, residuals), 1):
+            error = math.hypot(de, dn)
+            print(f"  {i:>3} {x:>9.1f} {y:>9.1f} {de:>9.2f} {dn:>9.2f} {error:>9.2f} {error / pixel_m:>6.2f}")
+        rms = math.sqrt(sum(de * de + dn * dn for de, dn in residuals) / len(residuals))
+        print(f"  RMS error: {rms:.2f} m ({rms / pixel_m:.2f} px)")
+
+        print(f"Warped size: {size}")
+        outputs = output_paths(output_path)
+        print(f"Saving: {', '.join(map(str, outputs))}")
+        write_transformed(source, size, inverse, None, outputs, window, jobs)
+    finally:
+        source.close()
+    print("single_tile bounds:")
+    print(json.dumps(bounds, indent=2))
+    print("Done!")
+
+    return size, bounds
+
+
+def tile_x(lon, zoom):
+    """Fractional XYZ tile column of a longitude."""
+    return (lon + 180.0) / 360.0 * 2 ** zoom
+
+
+def tile_y(lat, zoom):
+    """Fractional XYZ tile row of a latitude (Web Mercator)."""
+    return (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * 2 ** zoom
+
+
+def tile_lon(x, zoom):
+    return x / 2 ** zoom * 360.0 - 180.0
+
+
+def tile_lat(y, zoom):
+    return math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * y / 2 ** zoom))))
+
+
+def parse_bounds(text):
+    """"west,south,east,north" -> a config-style bounds dict."""
+    west, south, east, north = (float(v) for v in text.split(","))
+    if west >= east or south >= north:
+        raise ValueError(f"bounds must be west,south,east,north: {text}")
+    return {"west": west, "south": south, "east": east, "north": north}
+
+
+def default_zooms(size, bounds):
+    """(min, max) zoom: max where a tile pixel is no coarser than an image
+    pixel, min where the whole map is about one tile."""
+    degrees_per_pixel = (bounds["east"] - bounds["west"]) / size[0]
+    top = max(0, math.ceil(math.log2(360.0 / (TILE_SIZE * degrees_per_pixel))))
+    bottom = max(0, math.floor(math.log2(360.0 / (bounds["east"] - bounds["west"]))))
+    return min(bottom, top), top
+
 
-    # Convert to RGBA if needed (for transparency in expanded areas)
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
+def covering_tiles(bounds, zoom):
+    """Every (x, y) tile at `zoom` that overlaps bounds."""
+    x0, x1 = int(tile_x(bounds["west"], zoom)), math.ceil(tile_x(bounds["east"], zoom))
+    y0, y1 = int(tile_y(bounds["north"], zoom)), math.ceil(tile_y(bounds["south"], zoom))
+    return [(x, y) for x in range(x0, x1) for y in range(y0, y1)]
 
-    print(f"Original size: {img.size}")
-    print(f"Rotating {angle} degrees...")
 
-    # Rotate with expand=True to fit the whole rotated image
-    # Use BICUBIC for quality
-    rotated = img.rotate(angle, expand=True, resample=Image.BICUBIC)
+def render_tile(source, bounds, zoom, x, y):
+    """Resample tile (x, y) at `zoom` from the image, or None if it's blank.
 
-    print(f"Rotated size: {rotated.size}")
-    print(f"Saving: {output_path}")
+    Tile pixels map linearly onto image pixels between the tile's edges
+    (the Mercator curvature inside one tile is far below a pixel at map
+    zooms). The image region is padded with transparency where the tile
+    runs off it, so edge tiles fade out as the single tile does.
+    """
+    width, height = source.size
+    span_x = bounds["east"] - bounds["west"]
+    span_y = bounds["north"] - bounds["south"]
+    left = (tile_lon(x, zoom) - bounds["west"]) / span_x * width
+    right = (tile_lon(x + 1, zoom) - bounds["west"]) / span_x * width
+    top = (bounds["north"] - tile_lat(y, zoom)) / span_y * height
+    bottom = (bounds["north"] - tile_lat(y + 1, zoom)) / span_y * height
+    scale_x, scale_y = (right - left) / TILE_SIZE, (bottom - top) / TILE_SIZE
 
-    rotated.save(output_path, 'PNG')
+    # A tiled TIFF is read from its coarsest overview that's still no coarser than the tile
+    level = source.level_for(min(scale_x, scale_y))
+    if level:
+        factor = 2 ** level
+        left, right, top, bottom = left / factor, right / factor, top / factor, bottom / factor
+        scale_x, scale_y = scale_x / factor, scale_y / factor
+        width, height = width / factor, height / factor
+
+    # Tile pixels that see any of the image
+    ox0, ox1 = max(0, math.floor(-left / scale_x)), min(TILE_SIZE, math.ceil((width - left) / scale_x))
+    oy0, oy1 = max(0, math.floor(-top / scale_y)), min(TILE_SIZE, math.ceil((height - top) / scale_y))
+    if ox0 >= ox1 or oy0 >= oy1:
+        return None
+    box = (left + ox0 * scale_x, top + oy0 * scale_y, left + ox1 * scale_x, top + oy1 * scale_y)
+
+    # Room for the resampling filter's support around the box
+    margin = 3 * math.ceil(max(1.0, scale_x, scale_y)) + 1
+    region = (math.floor(box[0]) - margin, math.floor(box[1]) - margin,
+              math.ceil(box[2]) + margin, math.ceil(box[3]) + margin)
+    inside = (max(0, region[0]), max(0, region[1]),
+              min(math.ceil(width), region[2]), min(math.ceil(height), region[3]))
+    canvas = Image.new("RGBA", (region[2] - region[0], region[3] - region[1]))
+    canvas.paste(source.read(inside, level), (inside[0] - region[0], inside[1] - region[1]))
+    part = canvas.resize((ox1 - ox0, oy1 - oy0), Image.Resampling.LANCZOS,
+                         box=(box[0] - region[0], box[1] - region[1], box[2] - region[0], box[3] - region[1]))
+
+    if part.getextrema()[3][1] == 0:
+        return None
+    tile = Image.new("RGBA", (TILE_SIZE, TILE_SIZE))
+    tile.paste(part, (ox0, oy0))
+    return tile
+
+
+def overview_tile(out_dir, zoom, x, y):
+    """Downsample tile (x, y) at `zoom` from its written children, or None."""
+    canvas = Image.new("RGBA", (2 * TILE_SIZE, 2 * TILE_SIZE))
+    found = False
+    for dx in (0, 1):
+        for dy in (0, 1):
+            child = out_dir / str(zoom + 1) / str(2 * x + dx) / f"{2 * y + dy}.png"
+            if child.exists():
+                with Image.open(child) as image:
+                    canvas.paste(image.convert("RGBA"), (dx * TILE_SIZE, dy * TILE_SIZE))
+                found = True
+    if not found:
+        return None
+    return canvas.resize((TILE_SIZE, TILE_SIZE), Image.Resampling.BOX)
+
+
+def tile_map(image_path, bounds, out_dir, zooms=None, jobs=None):
+    """Write an XYZ tile pyramid of the image over `bounds` into out_dir.
+
+    Returns {zoom: tiles written}.
+    """
+    out_dir = Path(out_dir)
+    print(f"Tiling: {image_path}")
+    source = ScanSource(image_path)
+    try:
+        min_zoom, max_zoom = zooms or default_zooms(source.size, bounds)
+        print(f"Zoom levels {min_zoom}-{max_zoom} -> {out_dir}")
+
+        def save(zoom, x, y, tile):
+            if tile is None:
+                return None
+            path = out_dir / str(zoom) / str(x) / f"{y}.png"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tile.save(path, "PNG")
+            return x, y
+
+        def deepest(xy):
+            return save(max_zoom, *xy, render_tile(source, bounds, max_zoom, *xy))
+
+        def overview(zoom):
+            return lambda xy: save(zoom, *xy, overview_tile(out_dir, zoom, *xy))
+
+        counts = {}
+        with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+            written = [xy for xy in pool.map(deepest, covering_tiles(bounds, max_zoom)) if xy]
+            counts[max_zoom] = len(written)
+            for zoom in range(max_zoom - 1, min_zoom - 1, -1):
+                parents = sorted({(x // 2, y // 2) for x, y in written})
+                written = [xy for xy in pool.map(overview(zoom), parents) if xy]
+                counts[zoom] = len(written)
+            for zoom in sorted(counts):
+                print(f"  z{zoom}: {counts[zoom]} tiles")
+    finally:
+        source.close()
+
+    print("url_template layer config:")
+    print(json.dumps(tiles_layer(out_dir, bounds, counts), indent=2))
     print("Done!")
+    return counts
+
+
+def public_url(path):
+    """The site URL of a file under public/, else its filesystem path."""
+    path = Path(path).resolve()
+    return f"/{path.relative_to(PUBLIC_DIR).as_posix()}" if path.is_relative_to(PUBLIC_DIR) else path.as_posix()
+
+
+def tiles_layer(out_dir, bounds, counts):
+    """url_template layer config for a pyramid tile_map() wrote."""
+    return {"type": "url_template", "url": public_url(out_dir) + "/{z}/{x}/{y}.png",
+            "minimumLevel": min(counts), "maximumLevel": max(counts), "bounds": bounds}
+
+
+def file_digest(path, previous=None):
+    """Return {"mtime_ns", "size", "sha256"} for a file.
+
+    The hash is reused from `previous` when mtime and size are unchanged, so
+    an untouched scan costs a stat() rather than a full read.
+    """
+    st = path.stat()
+    if previous and previous.get("mtime_ns") == st.st_mtime_ns and previous.get("size") == st.st_size:
+        return previous
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": h.hexdigest()}
+
+
+def map_outputs(entry, base_dir):
+    """{format: path} for a manifest entry's outputs, relative to the manifest."""
+    outputs = {}
+    for fmt in entry.get("outputs", ["png"]):
+        if fmt == "png":
+            outputs[fmt] = base_dir / entry.get("output", f"{entry['name']}.png")
+        elif fmt == "tiff":
+            outputs[fmt] = base_dir / entry.get("tiff", f"{entry['name']}.tif")
+        elif fmt == "tiles":
+            outputs[fmt] = base_dir / entry.get("tiles", entry["name"])
+        else:
+            raise ValueError(f"{entry['name']}: unknown output format {fmt!r}")
+    return outputs
+
 
-    return rotated.size
+def entry_gcps(entry, base_dir):
+    """A manifest entry's GCPs, given inline or as a file relative to the manifest."""
+    gcps = entry.get("gcps")
+    if isinstance(gcps, str):
+        return load_gcps(base_dir / gcps)
+    return [(p["x"], p["y"], p["lon"], p["lat"]) for p in gcps or []]
+
+
+def map_params(entry, base_dir):
+    """Hash of everything besides the source pixels that affects a map's outputs."""
+    keys = ("angle", "bounds", "fit", "outputs", "output", "tiff", "tiles", "zoom", "layer")
+    params = {key: entry.get(key) for key in keys}
+    params["gcps"] = entry_gcps(entry, base_dir)
+    h = hashlib.sha256(Path(__file__).read_bytes())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def process_map(entry, base_dir, source_digest, params, jobs):
+    """Produce one manifest entry's outputs; return its "result" record."""
+    source = base_dir / entry["source"]
+    outputs = map_outputs(entry, base_dir)
+    bounds = entry.get("bounds")
+    gcps = entry_gcps(entry, base_dir)
+    if "tiles" in outputs and not bounds and not gcps:
+        raise ValueError(f"{entry['name']}: tiles need bounds or gcps")
+
+    # Tiles are cut from the tiled TIFF when there is one: its windows and overviews read fastest
+    images = [str(outputs[fmt]) for fmt in ("tiff", "png") if fmt in outputs]
+    image, scratch = source, None
+    layers = []
+    extra = entry.get("layer", {})
+    try:
+        if gcps or entry.get("angle"):
+            if images:
+                image = images[0]
+            else:
+                outputs["tiles"].parent.mkdir(parents=True, exist_ok=True)
+                scratch = tempfile.NamedTemporaryFile(suffix=".tif", dir=outputs["tiles"].parent, delete=False)
+                scratch.close()
+                image = scratch.name
+                images = [image]
+            if gcps:  # the warp's bounds replace any given ones
+                size, bounds = warp_map(str(source), gcps, images, entry.get("fit", "affine"), jobs=jobs)
+            else:
+                size = rotate_map(str(source), entry["angle"], images, jobs=jobs)
+        elif images:
+            size = rotate_map(str(source), 0, images, jobs=jobs)
+            image = images[0]
+        else:
+            with Image.open(source) as opened:
+                size = opened.size
+
+        if "png" in outputs:
+            layer = {"kind": "imagery", "type": "single_tile", "name": entry["name"],
+                     "url": public_url(outputs["png"]), "tileWidth": size[0], "tileHeight": size[1]}
+            if bounds:
+                layer["bounds"] = bounds
+            layers.append({**layer, **extra})
+        if "tiles" in outputs:
+            zoom = tuple(entry["zoom"]) if entry.get("zoom") else None
+            counts = tile_map(str(image), bounds, outputs["tiles"], zoom, jobs)
+            layers.append({"kind": "imagery", "name": entry["name"],
+                           **tiles_layer(outputs["tiles"], bounds, counts), **extra})
+    finally:
+        if scratch is not None:
+            os.unlink(scratch.name)
+
+    result = {"source": source_digest, "params": params, "width": size[0], "height": size[1]}
+    if bounds:
+        result["bounds"] = bounds
+    result["layers"] = layers
+    return result
+
+
+def up_to_date(entry, base_dir, source_digest, params):
+    result = entry.get("result")
+    return (result is not None and result.get("params") == params
+            and result.get("source", {}).get("sha256") == source_digest["sha256"]
+            and all(path.exists() for path in map_outputs(entry, base_dir).values()))
+
+
+def write_manifest(path, manifest):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2) + "\n")
+    os.replace(tmp, path)
+
+
+def run_manifest(manifest_path, jobs=None, force=False):
+    """Process every map in a manifest, skipping those unchanged since their recorded result.
+
+    Maps run concurrently on a process pool of up to `jobs` processes, each
+    rendering and tiling on its share of `jobs` threads. Each finished map's "result"
+    (source digest, parameter hash, pixel size and layer configs) is written
+    back into the manifest. Returns the number of maps that failed.
+    """
+    manifest_path = Path(manifest_path)
+    base_dir = manifest_path.parent
+    manifest = json.loads(manifest_path.read_text())
+    pending = []
+    unchanged = processed = failed = 0
+    for entry in manifest["maps"]:
+        previous = entry.get("result", {}).get("source")
+        try:
+            digest = file_digest(base_dir / entry["source"], previous)
+        except OSError as e:
+            failed += 1
+            print(f"{entry['name']}: failed: {e}", file=sys.stderr)
+            continue
+        params = map_params(entry, base_dir)
+        if not force and up_to_date(entry, base_dir, digest, params):
+            entry["result"]["source"] = digest
+            unchanged += 1
+            print(f"{entry['name']}: unchanged")
+        else:
+            pending.append((entry, digest, params))
+
+    if pending:
+        jobs = jobs or os.cpu_count()
+        workers = min(jobs, len(pending))
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(process_map, entry, base_dir, digest, params, max(1, jobs // workers)): entry
+                       for entry, digest, params in pending}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    entry["result"] = future.result()
+                    processed += 1
+                    print(f"{entry['name']}: {entry['result']['width']}x{entry['result']['height']}")
+                except Exception as e:
+                    failed += 1
+                    print(f"{entry['name']}: failed: {e}", file=sys.stderr)
+                write_manifest(manifest_path, manifest)
+    else:
+        write_manifest(manifest_path, manifest)
+
+    print(f"{unchanged} unchanged, {processed} processed, {failed} failed")
+    return failed
+
+
+def parse_zooms(text):
+    low, _, high = text.partition("-")
+    return int(low), int(high or low)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rotate historical map images for georeferencing.")
+    parser.add_argument("input", nargs="?", help="scan to rotate (or, with --tiles and no angle, to tile)")
+    parser.add_argument("angle", type=float, nargs="?", help="degrees, positive = counter-clockwise")
+    parser.add_argument("output", nargs="?",
+                        help="output PNG, or tiled TIFF if it ends in .tif (default: <input>_rotated.png)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, metavar="N",
+                        help=f"output rows per strip and columns per tile (default: {DEFAULT_WINDOW})")
+    parser.add_argument("--tiles", metavar="DIR", help="write an XYZ tile pyramid of the (rotated) image into DIR")
+    parser.add_argument("--bounds", type=parse_bounds, metavar="W,S,E,N",
+                        help="the image's extent in degrees, as the single_tile provider's bounds")
+    parser.add_argument("--zoom", type=parse_zooms, metavar="MIN-MAX",
+                        help="zoom levels to tile (default: from the image's resolution)")
+    parser.add_argument("--jobs", type=int, metavar="N",
+                        help="rendering threads, or with --manifest, processes (default: CPU count)")
+    parser.add_argument("--gcps", metavar="JSON", help="warp through ground control points: a JSON list of "
+                                                      "{x, y, lon, lat}, pixels from the top-left corner")
+    parser.add_argument("--gcp", type=parse_gcp, action="append", metavar="X,Y,LON,LAT",
+                        help="a ground control point (repeatable, adds to --gcps)")
+    parser.add_argument("--fit", choices=("affine", "similarity"), default="affine",
+                        help="transform fitted to the GCPs (default: affine)")
+    parser.add_argument("-o", dest="output_option", metavar="OUTPUT",
+                        help="output PNG or .tif, for warps (which take no angle)")
+    parser.add_argument("--format", choices=("png", "tiff"),
+                        help="output format (default: from the output's extension, else png); tiff "
+                             "writes a tiled TIFF with overviews that TiledTiff reads a window at a time")
+    parser.add_argument("--manifest", metavar="JSON", help="process every map listed in a manifest")
+    parser.add_argument("--force", action="store_true", help="with --manifest, redo maps that are unchanged")
+    args = parser.parse_args(argv)
+    if args.manifest:
+        return 1 if run_manifest(args.manifest, args.jobs, args.force) else 0
+    if args.input is None:
+        parser.error("an input image or --manifest is required")
+    gcps = (load_gcps(args.gcps) if args.gcps else []) + (args.gcp or [])
+    if gcps and args.angle is not None:
+        parser.error("GCPs replace the angle")
+    if args.angle is None and not args.tiles and not gcps:
+        parser.error("an angle, GCPs or --tiles is required")
+    if args.tiles and not args.bounds and not gcps:
+        parser.error("--tiles needs --bounds")
+
+    image = args.input
+    bounds = args.bounds
+    output = args.output_option or args.output
+    suffix = ".tif" if args.format == "tiff" else ".png"
+    if output and args.format and (Path(output).suffix.lower() in (".tif", ".tiff")) != (args.format == "tiff"):
+        parser.error(f"{output} is not a {args.format} path")
+    if gcps:
+        image = output or args.input.replace('.png', '_warped' + suffix)
+        _, bounds = warp_map(args.input, gcps, image, args.fit, args.window, args.jobs)
+    elif args.angle is not None:
+        image = output or args.input.replace('.png', '_rotated' + suffix)
+        rotate_map(args.input, args.angle, image, args.window, args.jobs)
+    if args.tiles:
+        tile_map(image, bounds, args.tiles, args.zoom, args.jobs)
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
+    if len(sys.argv) < 2:
         print(__doc__)
         sys.exit(1)
-
-    input_file = sys.argv[1]
-    angle = float(sys.argv[2])
-    output_file = sys.argv[3] if len(sys.argv) > 3 else None
-
-    rotate_map(input_file, angle, output_file)
+    sys.exit(main())
@@ -12,6 +12,11 @@ import * as Cesium from 'cesium';
  * @param {string} [config.credit] - Attribution text
  * @param {number} [config.minimumLevel=0] - Minimum zoom level
  * @param {number} [config.maximumLevel=18] - Maximum zoom level
+ * @param {Object} [config.bounds] - Geographic bounds to request tiles within
+ * @param {number} config.bounds.west - Western longitude
+ * @param {number} config.bounds.south - Southern latitude
+ * @param {number} config.bounds.east - Eastern longitude
+ * @param {number} config.bounds.north - Northern latitude
  * @returns {Cesium.UrlTemplateImageryProvider}
  */
 export function createUrlTemplateProvider(config) {
@@ -23,6 +28,12 @@ export function createUrlTemplateProvider(config) {
     return new Cesium.UrlTemplateImageryProvider({
         url,
         credit: config.credit,
+        rectangle: config.bounds ? Cesium.Rectangle.fromDegrees(
+            config.bounds.west,
+            config.bounds.south,
+            config.bounds.east,
+            config.bounds.north
+        ) : undefined,
         minimumLevel: config.minimumLevel || 0,
         maximumLevel: config.maximumLevel || 18
     });
@@ -177,11 +177,11 @@ export class TilesetManager {
         }
 
         // Find matching tilesets (now including newly loaded ones)
-        const matching = this.getTilesetsForYear(year);
+        const matching = this.getTilesetsForYear(year).filter(t => !t.config.overlay);
 
-        // Hide all tilesets
+        // Hide all tilesets; overlays (baked buildings) show whenever in range
         for (const t of this.tilesets) {
-            t.tileset.show = false;
+            t.tileset.show = !!t.config.overlay && year >= t.yearStart && year <= t.yearEnd;
         }
 
         // Show the first matching tileset (highest priority)
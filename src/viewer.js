@@ -48,13 +48,24 @@ export class Viewer {
         // State
         this._layers = [];
         this._tilesets = [];
+        this._dataSources = [];
+        this._hiddenGroups = new Set();
+        this._groups = new Set();
+        this._shards = null;
+        this._activeShard = null;
+        this._tiles = null;
+        this._tilesView = null;
+        this._tilesYear = null;
         this._baseExaggeration = 1.0;
         this.onYearChange = null;  // Callback instead of event bus
+        this.onGroupsChange = null;
 
         // Year change listener
         Cesium.knockout.getObservable(this.cesium.clockViewModel, 'currentTime').subscribe(() => {
             const year = this.year;
             this._updateVisibility(year);
+            this._updateShard(year);
+            if (year !== this._tilesYear) this._updateTiles();
             this.onYearChange?.(year);
             this.cesium.scene.requestRender();
         });
@@ -95,7 +106,8 @@ export class Viewer {
 
         // Terrain
         if (config.terrain?.enabled) {
-            this.cesium.scene.setTerrain(Cesium.Terrain.fromWorldTerrain());
+            this._terrain = Cesium.Terrain.fromWorldTerrain();
+            this.cesium.scene.setTerrain(this._terrain);
         }
         this._baseExaggeration = config.terrain?.exaggeration || 1.0;
 
@@ -116,7 +128,11 @@ export class Viewer {
                     if (tileset) {
                         tileset._yearStart = cfg.yearStart ?? -Infinity;
                         tileset._yearEnd = cfg.yearEnd ?? Infinity;
+                        tileset._overlay = !!cfg.overlay;
                         tileset.show = false;
+                        if (cfg.clampToGround) {
+                            this._clampToGround(tileset).catch(e => console.warn(`Clamp ${cfg.name}:`, e.message));
+                        }
                         this.cesium.scene.primitives.add(tileset);
                         this._tilesets.push(tileset);
                     }
@@ -124,15 +140,17 @@ export class Viewer {
             } catch (e) { console.warn(`Layer ${cfg.name}:`, e.message); }
         }
 
-        // Entities (CZML)
+        // Entities (CZML): one document, a per-period shard manifest or a tile index
         if (config.entities) {
             const url = config.entities.startsWith('/')
                 ? `${import.meta.env.BASE_URL}${config.entities.slice(1)}`
                 : config.entities;
-            const ds = await Cesium.CzmlDataSource.load(url);
-            this.cesium.dataSources.add(ds);
-            this._dataSource = ds;
-            console.log(`Loaded ${ds.entities.values.length} entities`);
+            if (url.endsWith('.json')) {
+                await this._loadEntityManifest(url);
+            } else {
+                const ds = await this._addDataSource(url);
+                console.log(`Loaded ${ds.entities.values.length} entities`);
+            }
         }
 
         this._updateVisibility(this.year);
@@ -144,12 +162,118 @@ export class Viewer {
         }
         let active = null;
         for (const t of this._tilesets) {
+            if (t._overlay) {
+                // Baked building tilesets (build_czml.py --3dtiles) sit on top of
+                // everything else; features carry their own start/stop years
+                t.show = year >= t._yearStart && year <= t._yearEnd;
+                if (t.show) t.style = new Cesium.Cesium3DTileStyle({ show: `\${start} <= ${year} && \${stop} >= ${year}` });
+                continue;
+            }
             t.show = year >= t._yearStart && year <= t._yearEnd && !active;
             if (t.show) active = t;
         }
         this.cesium.scene.verticalExaggeration = active ? 1.0 : this._baseExaggeration;
     }
 
+    async _addDataSource(url) {
+        const ds = await Cesium.CzmlDataSource.load(url);
+        const known = this._groups.size;
+        for (const e of ds.entities.values) {
+            const group = e.properties?.group?.getValue?.() || e.properties?.group;
+            if (!group) continue;
+            this._groups.add(group);
+            if (this._hiddenGroups.has(group)) e.show = false;
+        }
+        this.cesium.dataSources.add(ds);
+        this._dataSources.push(ds);
+        if (this._groups.size !== known) this.onGroupsChange?.(this.getGroups());
+        return ds;
+    }
+
+    async _loadEntityManifest(url) {
+        const manifest = await (await fetch(url)).json();
+        const base = url.slice(0, url.lastIndexOf('/') + 1);
+        if (manifest.tiles) {
+            this._tiles = manifest.tiles.map(t => ({
+                ...t, url: base + t.url, loading: null,
+                rect: Cesium.Rectangle.fromDegrees(...t.bbox)
+            }));
+            this._tilesView = this.cesium.camera.computeViewRectangle();
+            this.cesium.camera.moveEnd.addEventListener(() => {
+                this._tilesView = this.cesium.camera.computeViewRectangle();
+                this._updateTiles();
+            });
+            await this._updateTiles();
+            return;
+        }
+        this._shards = manifest.shards.map(s => ({ ...s, url: base + s.url, loading: null }));
+        if (manifest.common?.entities) {
+            await this._addDataSource(base + manifest.common.url);
+        }
+        await this._updateShard(this.year);
+    }
+
+    // Show only the shard for the current period, fetching it on first use
+    async _updateShard(year) {
+        const shard = this._shards?.find(s => year >= s.start && year <= s.stop);
+        if (!shard || shard === this._activeShard) return;
+        const previous = this._activeShard;
+        this._activeShard = shard;
+
+        shard.loading ??= this._addDataSource(shard.url);
+        const ds = await shard.loading;
+        if (this._activeShard !== shard) return;  // year moved on while loading
+        ds.show = true;
+        if (previous?.loading) (await previous.loading).show = false;
+        console.log(`Shard ${shard.id}: ${shard.entities} entities`);
+        this.cesium.scene.requestRender();
+    }
+
+    // Show tiles that overlap the view and the current year, fetching each on first use.
+    // The view rectangle is only recomputed when the camera stops moving.
+    async _updateTiles() {
+        if (!this._tiles) return;
+        const view = this._tilesView;
+        const year = this.year;
+        this._tilesYear = year;
+        const pending = [];
+        for (const tile of this._tiles) {
+            tile.wanted = !!view && Cesium.Rectangle.intersection(view, tile.rect) !== undefined
+                && (tile.start ?? -Infinity) <= year && year <= (tile.stop ?? Infinity);
+            if (tile.wanted) tile.loading ??= this._addDataSource(tile.url);
+            if (tile.loading) pending.push(tile.loading.then(ds => { ds.show = tile.wanted; }));
+        }
+        await Promise.all(pending);
+        this.cesium.scene.requestRender();
+    }
+
+    // Lift each tile of a tileset built on the ellipsoid onto the terrain under it.
+    // Baked tiles (build_czml.py --3dtiles) are at most a kilometre across and
+    // have box bounding volumes, which follow their transform.
+    async _clampToGround(tileset) {
+        if (!this._terrain) return;
+        if (!this._terrain.ready) {
+            await new Promise(resolve => this._terrain.readyEvent.addEventListener(resolve));
+        }
+        const tiles = [];
+        const stack = [tileset.root];
+        while (stack.length) {
+            const tile = stack.pop();
+            if (tile.children.length) stack.push(...tile.children);
+            else tiles.push(tile);
+        }
+        const places = tiles.map(tile => Cesium.Cartographic.fromCartesian(tile.boundingSphere.center));
+        const ground = await Cesium.sampleTerrainMostDetailed(this.cesium.terrainProvider, places.map(p => p.clone()));
+        tiles.forEach((tile, i) => {
+            const { longitude, latitude } = places[i];
+            const base = Cesium.Cartesian3.fromRadians(longitude, latitude, 0);
+            const top = Cesium.Cartesian3.fromRadians(longitude, latitude, ground[i].height ?? 0);
+            const lift = Cesium.Matrix4.fromTranslation(Cesium.Cartesian3.subtract(top, base, new Cesium.Cartesian3()));
+            tile.transform = Cesium.Matrix4.multiply(lift, tile.transform, new Cesium.Matrix4());
+        });
+        this.cesium.scene.requestRender();
+    }
+
     async _createTileset(cfg) {
         switch (cfg.type) {
             case 'google_3d': return Cesium.createGooglePhotorealistic3DTileset({ onlyUsingWithGoogleGeocoder: true });
@@ -176,10 +300,18 @@ export class Viewer {
         }
     }
 
+    getGroups() {
+        return [...this._groups];
+    }
+
     toggleGroup(group, visible) {
-        for (const e of this._dataSource?.entities.values || []) {
-            if ((e.properties?.group?.getValue?.() || e.properties?.group) === group) {
-                e.show = visible;
+        if (visible) this._hiddenGroups.delete(group);
+        else this._hiddenGroups.add(group);
+        for (const ds of this._dataSources) {
+            for (const e of ds.entities.values) {
+                if ((e.properties?.group?.getValue?.() || e.properties?.group) === group) {
+                    e.show = visible;
+                }
             }
         }
         this.cesium.scene.requestRender();
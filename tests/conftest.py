@@ -0,0 +1,39 @@
+"""Put the build and tile scripts on the import path; they aren't a package."""
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "data" / "scripts"), str(ROOT / "public" / "data" / "tiles")]
+
+EXAMPLE = ROOT / "public" / "data" / "projects" / "example"
+EXAMPLE_INPUTS = ("project.json", "entity_styles.json", "buildings_1650.json", "sites.json")
+
+
+@pytest.fixture
+def example_project(tmp_path):
+    """Point build_czml at a scratch copy of the example project's inputs."""
+    import build_czml as bc
+
+    for name in EXAMPLE_INPUTS:
+        shutil.copy(EXAMPLE / name, tmp_path / name)
+    shutil.copytree(EXAMPLE / "buildings", tmp_path / "buildings")
+    bc.use_project_dir(tmp_path, tmp_path / "unified_sites.geojson")
+    yield tmp_path
+    bc.use_project_dir(EXAMPLE)
+
+
+@pytest.fixture
+def synthetic_project(tmp_path):
+    """Point build_czml at a bench_czml project: every generator type, map overrides and
+    custom buildings, in more buildings than one expansion batch."""
+    import bench_czml
+    import build_czml as bc
+
+    bench_czml.generate_project(tmp_path, 3000, seed=1, designs=4)
+    bc.use_project_dir(tmp_path, tmp_path / "unified_sites.geojson")
+    yield tmp_path
+    bc.use_project_dir(EXAMPLE)
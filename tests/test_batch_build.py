@@ -0,0 +1,54 @@
+import json
+import shutil
+
+import pytest
+
+import build_czml as bc
+
+
+@pytest.fixture
+def projects(example_project, monkeypatch):
+    """Three copies of the example project, clipped to different bounds, and a reference layer."""
+    root = example_project / "projects"
+    inputs = list(example_project.iterdir())
+    bounds = {"wide": {"west": -2.75, "south": 53.35, "east": -1.9, "north": 53.7},
+              "narrow": {"west": -2.26, "south": 53.47, "east": -2.23, "north": 53.49},
+              "unclipped": None}
+    for name, box in bounds.items():
+        (root / name).mkdir(parents=True)
+        for path in inputs:
+            (shutil.copytree if path.is_dir() else shutil.copy)(path, root / name / path.name)
+        project = json.loads((root / name / "project.json").read_text())
+        if box:
+            project["bounds"] = box
+        else:
+            del project["bounds"]
+        (root / name / "project.json").write_text(json.dumps(project))
+
+    features = [{"type": "Feature",
+                 "properties": {"name": f"Site {i % 7}", "source": "he", "start_year": 1600, "end_year": 1900},
+                 "geometry": {"type": "Point", "coordinates": [-2.9 + i * 0.01, 53.48]}}
+                for i in range(120)]
+    features += [{**feature, "geometry": {"type": "Point", "coordinates": [x + 1e-5, y]}}  # duplicates to merge
+                 for feature in features[60:70] for x, y in [feature["geometry"]["coordinates"]]]
+    features.append({"type": "Feature", "properties": {"name": "Nowhere", "source": "osm"}})
+    (example_project / "unified_sites.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    monkeypatch.setattr(bc, "PROJECTS_DIR", root)
+    return root
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_batch_matches_standalone_builds(projects, capsys, jobs):
+    unified_file = bc.UNIFIED_FILE
+    assert bc.build_all_projects(bc.parse_args(["--all-projects", "--no-cache", "--dedupe", "50", "--jobs", jobs]))
+    log = capsys.readouterr().out
+    assert "Splitting unified_sites.geojson for 2 projects" in log
+    assert "Reference layer: 8 of 131 features inside the project bounds" in log  # narrow, and the one without geometry
+
+    batch = {path.name: (path / "entities.czml").read_text() for path in bc.find_projects()}
+    for path in bc.find_projects():
+        bc.use_project_dir(path, unified_file)
+        bc.build_project(bc.parse_args(["--no-cache", "--dedupe", "50"]))
+        assert (path / "entities.czml").read_text() == batch[path.name], path.name
+    sizes = {name: len(json.loads(czml)) for name, czml in batch.items()}
+    assert sizes["narrow"] < sizes["wide"] < sizes["unclipped"]
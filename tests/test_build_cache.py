@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+import build_czml as bc
+
+
+@pytest.fixture
+def project(example_project):
+    """The example project with a small reference layer."""
+    features = [{"type": "Feature",
+                 "properties": {"name": f"Site {i}", "source": "he", "start_year": 1600, "end_year": 1900},
+                 "geometry": {"type": "Point", "coordinates": [-2.245 + i * 1e-3, 53.48]}}
+                for i in range(5)]
+    (example_project / "unified_sites.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    return example_project
+
+
+def build(*argv):
+    bc.build_project(bc.parse_args(list(argv)))
+    return bc.OUTPUT_FILE.read_text()
+
+
+def test_reference_fragment_survives_a_count_change(project, capsys):
+    build()
+    buildings = json.loads((project / "buildings_1650.json").read_text())
+    buildings["buildings"].pop()
+    (project / "buildings_1650.json").write_text(json.dumps(buildings))
+    capsys.readouterr()
+
+    cached = build()
+    rebuilt = capsys.readouterr().out
+    assert "  Unified: unified_sites.geojson\n" not in rebuilt
+    assert cached == build("--no-cache")
+    # ids are numbered from each packet's place in the document, cached or not
+    reference = [(n, packet["id"]) for n, packet in enumerate(json.loads(cached)) if packet["id"].startswith("he_")]
+    assert [packet_id for _, packet_id in reference] == [f"he_{n}" for n, _ in reference]
+    assert len(reference) == 5
@@ -0,0 +1,57 @@
+from array import array
+
+import build_czml as bc
+
+
+def record(entity, period, start, stop, lonlat=(-2.25, 53.48, -2.24, 53.48, -2.24, 53.49)):
+    return bc.PolygonRecord(f"{entity}__{period}", "Hall", bc.availability_interval(start, stop),
+                            array("d", lonlat), 0, 10, (200, 180, 150, 255))
+
+
+def visible(packets, year):
+    """Ids of the packets whose availability covers 1 July of `year`."""
+    when = bc.year_to_iso(year)
+    ids = []
+    for packet in packets:
+        availability = packet.availability if isinstance(packet, bc.PolygonRecord) else packet["availability"]
+        intervals = [availability] if isinstance(availability, str) else availability
+        if any(start <= when <= stop for start, _, stop in (i.partition("/") for i in intervals)):
+            ids.append(packet.id if isinstance(packet, bc.PolygonRecord) else packet["id"])
+    return ids
+
+
+def test_adjacent_periods_merge():
+    packets = [record("hall", "berry_1650", 1650, 1749), record("hall", "berry_1750", 1750, 1844)]
+    merged = bc.coalesce_packets(packets)
+    assert [p.id for p in merged] == ["hall__berry_1650..berry_1750"]
+    assert merged[0].availability == bc.availability_interval(1650, 1844)
+
+
+def test_runs_do_not_bridge_a_gap():
+    packets = [record("hall", "a", 1650, 1700), record("hall", "b", 1750, 1800)]
+    before = {year: visible(packets, year) for year in range(1640, 1810)}
+    merged = bc.coalesce_packets(packets)
+    assert [p.id for p in merged] == ["hall__a", "hall__b"]
+    assert visible(merged, 1725) == []
+    assert {year: bool(visible(merged, year)) for year in before} == {y: bool(v) for y, v in before.items()}
+
+
+def test_changed_geometry_splits_runs():
+    moved = (-2.26, 53.48, -2.25, 53.48, -2.25, 53.49)
+    packets = [record("hall", "a", 1650, 1749), record("hall", "b", 1750, 1844),
+               record("hall", "c", 1845, 1889, moved)]
+    merged = bc.coalesce_packets(packets)
+    assert [p.id for p in merged] == ["hall__a..b", "hall__c"]
+
+
+def test_intervals_keep_the_gap():
+    moved = (-2.26, 53.48, -2.25, 53.48, -2.25, 53.49)
+    packets = [record("hall", "a", 1650, 1700), record("hall", "b", 1701, 1720, moved),
+               record("hall", "c", 1750, 1800)]
+    before = {year: bool(visible(packets, year)) for year in range(1640, 1810)}
+    [packet] = bc.coalesce_packets(packets, "intervals")
+    assert packet["id"] == "hall"
+    assert packet["availability"] == [bc.availability_interval(1650, 1720), bc.availability_interval(1750, 1800)]
+    assert len(packet["polygon"]["positions"]) == 3
+    assert {year: bool(visible([packet], year)) for year in before} == before
+    assert bc.packet_extent(packet)[4:] == (1650, 1800)
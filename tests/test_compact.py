@@ -0,0 +1,62 @@
+import gzip
+import json
+
+import pytest
+
+import build_czml as bc
+
+
+def build(*argv):
+    bc.build_project(bc.parse_args(["--no-cache", *argv]))
+    return bc.OUTPUT_FILE.read_text()
+
+
+def assert_close(compact, full, tolerance):
+    """compact equals full with every number within tolerance (and no other change)."""
+    if isinstance(full, dict):
+        assert compact.keys() == full.keys()
+        for key in full:
+            assert_close(compact[key], full[key], tolerance)
+    elif isinstance(full, list):
+        assert len(compact) == len(full)
+        for a, b in zip(compact, full):
+            assert_close(a, b, tolerance)
+    elif isinstance(full, (int, float)) and not isinstance(full, bool):
+        assert abs(compact - full) <= tolerance
+    else:
+        assert compact == full
+
+
+@pytest.mark.parametrize("digits", [7, 5])
+def test_compact_round_trip_precision(example_project, digits):
+    full_text = build()
+    text = build("--compact", "--precision", str(digits))
+    full, compact = json.loads(full_text), json.loads(text)
+    assert "\n " not in text and ": " not in text  # minified
+    assert len(text) < len(full_text) * 0.6
+
+    bound = 0.5 * 10 ** -digits + 1e-12
+    for a, b in zip(compact, full):
+        assert_close(a, b, 0.5 * 10 ** -bc.COMPACT_HEIGHT_PRECISION + 1e-9)
+        positions, expected = bc.packet_positions(a), bc.packet_positions(b)
+        if expected:
+            assert max(abs(x - y) for i, (x, y) in enumerate(zip(positions, expected)) if i % 3 != 2) <= bound
+            assert all(type(h) is int or h != int(h) for h in positions[2::3])  # whole heights as integers
+
+
+def test_sidecars_follow_the_profile(example_project):
+    text = build("--compact")
+    gz = bc.OUTPUT_FILE.with_name(bc.OUTPUT_FILE.name + ".gz")
+    assert gzip.decompress(gz.read_bytes()).decode() == text
+    if bc.brotli is not None:
+        br = bc.OUTPUT_FILE.with_name(bc.OUTPUT_FILE.name + ".br")
+        assert bc.brotli.decompress(br.read_bytes()).decode() == text
+    build()
+    assert not gz.exists()
+
+
+def test_precision_needs_compact(capsys):
+    with pytest.raises(SystemExit):
+        bc.parse_args(["--precision", "5"])
+    assert "--precision only applies with --compact" in capsys.readouterr().err
+    assert bc.parse_args(["--compact"]).precision == bc.COMPACT_PRECISION
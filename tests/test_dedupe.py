@@ -0,0 +1,44 @@
+import build_czml as bc
+
+BOUNDS = {"west": -2.3, "south": 53.4, "east": -2.2, "north": 53.5}
+
+
+def point(name, source, start, end, lon=-2.25, lat=53.45, **props):
+    return {"type": "Feature",
+            "properties": {"name": name, "source": source, "start_year": start, "end_year": end, **props},
+            "geometry": {"type": "Point", "coordinates": [lon, lat]}}
+
+
+def dedupe(features, distance=10):
+    stats = {}
+    kept = list(bc.filter_unified_sites(lambda: iter(features), BOUNDS, distance, stats))
+    return kept, stats
+
+
+def test_survivor_lists_its_own_source():
+    kept, stats = dedupe([point("St Ann's Church", "he", 1700, 1900),
+                          point("St Anns Church", "osm", 1800, 2100, lon=-2.25003)])
+    assert stats == {"clipped": 0, "merged": 1}
+    props = kept[0]["properties"]
+    assert (props["start_year"], props["end_year"]) == (1700, 2100)
+    assert props["merged_sources"] == ["he", "osm"]
+
+
+def test_different_names_or_categories_are_kept():
+    kept, stats = dedupe([point("Mill", "he", 1700, 1900, category="industry"),
+                          point("Wharf", "he", 1700, 1900),
+                          point("Mill", "osm", 1700, 1900, category="religion"),
+                          point("Mill", "osm", 1700, 1900, category="industry", lat=53.46)])
+    assert stats["merged"] == 0
+    assert len(kept) == 4
+
+
+def test_merge_does_not_widen_matching_years():
+    # The second feature merges into the first; the third overlaps only the
+    # merged union, not the survivor's own years, so it must stay separate.
+    kept, stats = dedupe([point("Cross", "he", 1600, 1700),
+                          point("Cross", "osm", 1650, 1900),
+                          point("Cross", "os", 1800, 2000)])
+    assert stats["merged"] == 1
+    assert [f["properties"]["source"] for f in kept] == ["he", "os"]
+    assert kept[0]["properties"]["end_year"] == 1900
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+import bench_czml
+import build_czml as bc
+
+
+def normalized(entities):
+    return [{key: [tuple(p) for p in value] if key == "offsets" else value for key, value in entity.items()}
+            for entity in entities]
+
+
+@pytest.mark.parametrize("building_type", sorted(bc.TEMPLATE_PARAMS))
+def test_template_instantiates_the_generator_output(building_type):
+    rng = random.Random(building_type)
+    for i in range(20):
+        building = bench_czml.make_building(rng, i, building_type, ["berry_1650"])
+        template = bc.FootprintTemplate(bc.run_generator(building_type, {**building, "id": "", "name": ""}))
+        assert normalized(template.instantiate(building)) == normalized(bc.run_generator(building_type, building))
+
+
+def test_lru_keeps_the_most_recent_templates():
+    templates = bc.FootprintTemplates(maxsize=2)
+    houses = [{"id": f"h{n}", "name": "House", "length": 10 + n, "width": 6, "height": 7} for n in range(3)]
+
+    def cached():
+        return [key[1][0] for key in templates.templates]  # lengths, least recently used first
+
+    assert [templates.get("house", house) for house in houses] == [None] * 3  # seen once: not cached yet
+    for house in houses:
+        templates.get("house", house)
+    assert cached() == [11, 12]
+    templates.get("house", houses[1])
+    templates.get("house", {**houses[0], "id": "other", "name": "Other"})  # same shape, other building
+    assert cached() == [11, 10]
+    assert templates.stats() == {"hits": 1, "misses": 7, "size": 2}
+
+
+@pytest.mark.parametrize("kernel", [True, False])
+def test_cached_build_matches_uncached(synthetic_project, monkeypatch, capsys, kernel):
+    if not kernel:
+        monkeypatch.setattr(bc, "np", None)
+    bc.FOOTPRINT_TEMPLATES.clear()
+    bc.build_project(bc.parse_args(["--no-cache"]))
+    cached = bc.OUTPUT_FILE.read_bytes()
+    assert "Footprint templates: " in capsys.readouterr().out
+
+    monkeypatch.setattr(bc, "TEMPLATE_PARAMS", {})
+    bc.build_project(bc.parse_args(["--no-cache"]))
+    assert bc.OUTPUT_FILE.read_bytes() == cached
+    assert "Footprint templates: " not in capsys.readouterr().out
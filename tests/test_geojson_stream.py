@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import build_czml as bc
+
+
+FEATURES = [
+    {"type": "Feature", "properties": {"name": 'Quote " and \\ brace } bracket ]', "start_year": -43},
+     "geometry": {"type": "Point", "coordinates": [-2.245, 53.48, 12.5]}},
+    {"type": "Feature", "properties": {"name": "Café — \U0001f3f0", "tags": [], "note": None},
+     "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1e-3, 0], [1e-3, 1e-3], [0, 0]]]}},
+    {"type": "Feature", "properties": {}, "geometry": None},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_feature_collection_streams_like_json_load(tmp_path, chunk_size):
+    path = tmp_path / "sites.geojson"
+    # members on both sides of "features", and a BOM, as some exporters write
+    document = {"type": "FeatureCollection", "name": "sites", "features": FEATURES,
+                "crs": {"type": "name", "properties": {"name": "EPSG:4326"}}}
+    path.write_text("\ufeff\n " + json.dumps(document, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    assert list(bc.iter_geojson_features(path, chunk_size)) == json.loads(path.read_text(encoding="utf-8-sig"))["features"]
+
+
+def test_empty_and_single_feature_documents(tmp_path):
+    empty, single = tmp_path / "empty.geojson", tmp_path / "single.geojson"
+    empty.write_text('{"type": "FeatureCollection", "features": []}')
+    single.write_text(json.dumps(FEATURES[0]))
+
+    assert list(bc.iter_geojson_features(empty)) == []
+    assert list(bc.iter_geojson_features(single)) == [FEATURES[0]]
+    assert list(bc.iter_geojson_features(tmp_path / "missing.geojson")) == []
+
+
+@pytest.mark.parametrize("suffix, separator", [(".geojsonl", ""), (".geojsons", "\x1e")])
+def test_sequences_stream_one_record_per_line(tmp_path, capsys, suffix, separator):
+    path = tmp_path / f"sites{suffix}"
+    lines = [separator + json.dumps(feature, ensure_ascii=False) for feature in FEATURES]
+    lines.insert(1, "{not json")
+    path.write_text("\n".join(lines) + "\n\n", encoding="utf-8")
+
+    assert list(bc.iter_geojson_features(path)) == FEATURES
+    assert "malformed GeoJSON record on line 2" in capsys.readouterr().out
@@ -0,0 +1,20 @@
+import pytest
+
+from geometry_buffer import HEADER, GeometryBuffer, GeometryBufferBuilder
+
+
+@pytest.mark.parametrize("float_size", [4, 8])
+def test_round_trip_with_aligned_sections(float_size):
+    builder = GeometryBufferBuilder(float_size)
+    builder.add("cross", "point", [-2.25, 53.5, 0.0])  # an odd number of floats
+    builder.add("road", "polyline", [-2.25, 53.5, 0.0, -2.5, 53.75, 0.0], "1650-07-01T00:00:00Z/1749-07-01T00:00:00Z")
+    data = builder.to_bytes()
+    geometry = GeometryBuffer(data)
+
+    assert geometry.values_offset % 8 == 0
+    trailer_length = HEADER.unpack_from(data)[4]
+    assert (len(data) - trailer_length) % 8 == 0
+    packet_id, kind, interval, coords = geometry.record(1)
+    assert (packet_id, kind, interval) == ("road", "polyline", "1650-07-01T00:00:00Z/1749-07-01T00:00:00Z")
+    assert [float(v) for v in coords.flatten()] == [-2.25, 53.5, 0.0, -2.5, 53.75, 0.0]
+    assert geometry.records("cross")[0][0] is None
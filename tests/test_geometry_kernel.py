@@ -0,0 +1,24 @@
+import math
+
+import build_czml as bc
+
+
+def build(*argv):
+    bc.build_project(bc.parse_args(["--no-cache", *argv]))
+    return bc.OUTPUT_FILE.read_bytes()
+
+
+def test_kernel_matches_the_scalar_path(synthetic_project, monkeypatch):
+    vectorized = build()
+    monkeypatch.setattr(bc, "np", None)
+    assert build() == vectorized
+
+
+def test_offsets_to_coords_matches_rotate_point():
+    # the hoisted cos/sin must give the per-point rotation's exact floats
+    offsets = [(0, 0), (12.5, -3), (-7.25, 40), (1e-3, 1e3)]
+    lon_m = 111000 * math.cos(math.radians(53.4853))
+    for rotation in (0, -15, 33.3, 90, 180):
+        expected = [[-2.2442 + x / lon_m, 53.4853 + y / 111000]
+                    for x, y in (bc.rotate_point(dx, dy, rotation) for dx, dy in offsets)]
+        assert bc.offsets_to_coords(-2.2442, 53.4853, offsets, rotation) == expected
@@ -0,0 +1,27 @@
+import json
+
+import build_czml as bc
+
+
+def build(*argv):
+    bc.build_project(bc.parse_args(list(argv)))
+    return bc.OUTPUT_FILE.read_bytes()
+
+
+def test_jobs_match_a_serial_build(synthetic_project):
+    serial = build("--no-cache")
+    assert build("--no-cache", "--jobs", "2") == serial
+    assert build("--no-cache", "--jobs", "3", "--compact") == build("--no-cache", "--compact")
+
+
+def test_jobs_rebuild_only_the_changed_building(synthetic_project, capsys):
+    build("--jobs", "2")
+    path = synthetic_project / "buildings" / "bench_custom_3.json"
+    building = json.loads(path.read_text())
+    building["entities"][0]["extrudedHeight"] += 1
+    path.write_text(json.dumps(building))
+    capsys.readouterr()
+
+    cached = build("--jobs", "2")
+    assert "Rebuilt 1 of " in capsys.readouterr().out
+    assert cached == build("--no-cache")
@@ -0,0 +1,32 @@
+import json
+from array import array
+
+import pytest
+
+import build_czml as bc
+
+LONLAT = [-2.2442, 53.4853, -2.24419871234567, 53.48541, -180.0, -0.0, 1e-7, 5e-324]
+COMPACT = {"precision": 7, "height_precision": 2}
+
+
+@pytest.mark.parametrize("lonlat", [array("d", LONLAT), memoryview(array("d", LONLAT)), array("d")])
+@pytest.mark.parametrize("name, height, extruded", [
+    ("Collegiate Church (Cathedral) - Nave", 0, 18),
+    ('The "Old" Wellington – Inn \\ Ñ', 2.5, 7.125),
+])
+@pytest.mark.parametrize("compact", [None, COMPACT])
+def test_record_serializes_like_the_packet(lonlat, name, height, extruded, compact):
+    record = bc.PolygonRecord("hall__berry_1650", name, bc.availability_interval(1650, 1749), lonlat,
+                              height, extruded, (201, 184, 150, 255))
+    coords = [[lon, lat] for lon, lat in zip(lonlat[0::2], lonlat[1::2])]
+    packet = bc.make_polygon_packet("hall__berry_1650", name, coords, height, extruded, [201, 184, 150, 255],
+                                    bc.availability_interval(1650, 1749))
+
+    assert record.to_packet() == packet
+    assert bc.serialize_packet(record, compact) == bc.serialize_packet(packet, compact)
+
+
+def test_build_output_is_plain_json_dump(example_project):
+    bc.build_project(bc.parse_args(["--no-cache"]))
+    text = bc.OUTPUT_FILE.read_text()
+    assert text.rstrip("\n") == json.dumps(json.loads(text), indent=2)
@@ -0,0 +1,47 @@
+import json
+import pstats
+
+import build_czml as bc
+
+
+def test_nested_spans():
+    profiler = bc.Profiler(memory=True)
+    with profiler.span("outer") as outer:
+        outer.items = 10
+        with profiler.span("inner"):
+            bytearray(1 << 20)
+        with profiler.span("inner"):
+            pass
+    report = profiler.report()
+    bc.tracemalloc.stop()  # write() would, after writing the report
+
+    outer, inner = report["stages"]["outer"], report["stages"]["inner"]
+    assert (outer["calls"], outer["items"], inner["calls"], inner["items"]) == (1, 10, 2, 2)
+    assert abs(outer["self_s"] - (outer["wall_s"] - inner["wall_s"])) < 1e-5
+    assert inner["peak_alloc_mb"] >= 1 and outer["peak_alloc_mb"] >= inner["peak_alloc_mb"]
+    assert [event["name"] for event in report["traceEvents"]] == ["inner", "inner", "outer"]
+
+
+def test_profiled_build(example_project, tmp_path):
+    bc.build_project(bc.parse_args(["--no-cache"]))
+    plain = bc.OUTPUT_FILE.read_bytes()
+    report_path, cprofile_path = tmp_path / "profile.json", tmp_path / "build.prof"
+    args = bc.parse_args(["--no-cache", "--profile", str(report_path), "--profile-memory", "--cprofile", str(cprofile_path)])
+    bc.profiled_build(args)
+
+    assert bc.OUTPUT_FILE.read_bytes() == plain
+    assert bc.PROFILER is None
+    report = json.loads(report_path.read_text())
+    for stage in ("build", "load.json", "expand.positions", "expand.periods", "serialize"):
+        stats = report["stages"][stage]
+        assert stats["calls"] > 0 and 0 <= stats["self_s"] <= stats["wall_s"] + 1e-6, stage
+        assert "peak_alloc_mb" in stats
+    assert report["stages"]["build"]["calls"] == 1
+
+    # a Chrome trace: complete events, all inside the build span
+    events = report["traceEvents"]
+    [build] = [event for event in events if event["name"] == "build"]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    assert all(build["ts"] - 1 <= event["ts"] and event["ts"] + event["dur"] <= build["ts"] + build["dur"] + 1
+               for event in events)
+    assert pstats.Stats(str(cprofile_path)).total_calls > 0
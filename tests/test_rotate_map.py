@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import rotate_map as rm
+
+
+@pytest.fixture
+def scan(tmp_path):
+    """A noisy RGBA scan with transparent holes, and a paletted copy of it."""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (203, 311, 4), dtype=np.uint8)
+    pixels[..., 3] = np.where(rng.random((203, 311)) < 0.2, 0, 255)
+    rgba, paletted = tmp_path / "scan.png", tmp_path / "scan_p.png"
+    Image.fromarray(pixels, "RGBA").save(rgba)
+    Image.fromarray(pixels[..., :3], "RGB").quantize(32).save(paletted)
+    return rgba, paletted
+
+
+def pillow_rotate(path, angle):
+    return Image.open(path).convert("RGBA").rotate(angle, expand=True, resample=Image.BICUBIC)
+
+
+@pytest.mark.parametrize("angle", [-15, 33.3, 90, 180, 270, 0.5])
+def test_windowed_rotation_matches_pillow(scan, tmp_path, angle):
+    for path in scan:
+        out = tmp_path / "out.png"
+        size = rm.rotate_map(str(path), angle, str(out), window=64)
+        expected = pillow_rotate(path, angle)
+        with Image.open(out) as rotated:
+            assert rotated.size == size == expected.size
+            assert rotated.tobytes() == expected.tobytes(), path.name
+
+
+def test_window_size_does_not_change_the_output(scan, tmp_path):
+    outputs = []
+    for window in (17, 64, 1000):
+        out = tmp_path / f"out_{window}.png"
+        rm.rotate_map(str(scan[1]), -15, str(out), window=window)
+        outputs.append(Image.open(out).tobytes())
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def test_tiled_tiff_matches_the_png(tmp_path):
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 256, (450, 700, 4), dtype=np.uint8)
+    pixels[..., 3] = np.where(rng.random((450, 700)) < 0.2, 0, 255)
+    Image.fromarray(pixels, "RGBA").save(tmp_path / "scan.png")
+    png, tif = tmp_path / "out.png", tmp_path / "out.tif"
+    size = rm.rotate_map(str(tmp_path / "scan.png"), -15, [str(png), str(tif)], window=64)
+    expected = Image.open(png)
+
+    with Image.open(tif) as level0:  # Pillow reads the full-size page
+        assert level0.size == size
+        assert level0.convert("RGBA").tobytes() == expected.tobytes()
+    with rm.TiledTiff(tif) as tiff:
+        sizes = [level.size for level in tiff.levels]
+        assert sizes[0] == size and max(sizes[-1]) <= rm.TILE_SIZE < max(sizes[-2])
+        for (width, height), (half_width, half_height) in zip(sizes, sizes[1:]):
+            assert (half_width, half_height) == ((width + 1) // 2, (height + 1) // 2)
+        for box in [(0, 0) + size, (250, 3, 513, 260), (-20, -7, 40, 30), (size[0] - 30, size[1] - 9, size[0] + 11, size[1] + 5)]:
+            assert tiff.read(box).tobytes() == expected.crop(box).tobytes(), box
+        assert tiff.read((0, 0) + sizes[1], 1).tobytes() == expected.reduce(2).tobytes()
+
+    # and a rotation read back from the TIFF is the same as one from the PNG
+    rm.rotate_map(str(tif), 40, str(tmp_path / "from_tif.png"), window=64)
+    rm.rotate_map(str(png), 40, str(tmp_path / "from_png.png"), window=64)
+    assert Image.open(tmp_path / "from_tif.png").tobytes() == Image.open(tmp_path / "from_png.png").tobytes()
+
+
+def test_thread_pools_take_the_jobs_share(scan, tmp_path, monkeypatch):
+    sizes = []
+
+    class Pool(rm.ThreadPoolExecutor):
+        def __init__(self, max_workers=None):
+            sizes.append(max_workers)
+            super().__init__(max_workers)
+
+    monkeypatch.setattr(rm, "ThreadPoolExecutor", Pool)
+    entry = {"name": "scan", "source": scan[0].name, "angle": 10, "outputs": ["png", "tiff", "tiles"],
+             "bounds": {"west": -2.3, "south": 53.47, "east": -2.2, "north": 53.5}, "zoom": [12, 13]}
+    rm.process_map(entry, tmp_path, "digest", "params", 2)
+    # rendering, the TIFF's encoder and tiling; the strip encoder is one thread
+    assert sorted(sizes) == [1, 2, 2, 2]
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import build_czml as bc
+
+
+def build(*argv):
+    bc.build_project(bc.parse_args(list(argv)))
+
+
+def shard_packets(shard):
+    return json.loads((bc.SHARD_DIR / f"{shard}.czml").read_text())
+
+
+@pytest.mark.parametrize("coalesce", [[], ["--coalesce", "runs"]])
+def test_shards_split_the_single_file(example_project, coalesce):
+    build("--no-cache", *coalesce)
+    document, *packets = json.loads(bc.OUTPUT_FILE.read_text())
+    build("--no-cache", "--shard-periods", *coalesce)
+    manifest = json.loads((bc.SHARD_DIR / "manifest.json").read_text())
+    periods = [shard["id"] for shard in manifest["shards"]]
+    assert periods == [period["id"] for period in json.loads(bc.PROJECT_FILE.read_text())["mapPeriods"]]
+
+    def shards(packet):
+        """The period ids a packet belongs to, from its "__{first}..{last}" suffix."""
+        base, _, suffix = packet["id"].rpartition("__")
+        first, _, last = suffix.partition("..")
+        if not base or first not in periods:
+            return ["common"]
+        return periods[periods.index(first):periods.index(last or first) + 1]
+
+    for entry in [*manifest["shards"], {"id": "common", **manifest["common"]}]:
+        shard = entry["id"]
+        head, *routed = shard_packets(shard)
+        assert head == document
+        assert routed == [packet for packet in packets if shard in shards(packet)], shard
+        assert entry["entities"] == len(routed)
+        assert entry["bytes"] == (bc.SHARD_DIR / entry["url"]).stat().st_size
+    assert sum(entry["entities"] for entry in manifest["shards"]) >= len([p for p in packets if "__" in p["id"]]) > 0
+
+
+def test_cached_fragments_route_like_fresh_ones(example_project):
+    build("--shard-periods")
+    fresh = {path.name: path.read_bytes() for path in bc.SHARD_DIR.iterdir()}
+    build("--shard-periods")
+    assert {path.name: path.read_bytes() for path in bc.SHARD_DIR.iterdir()} == fresh
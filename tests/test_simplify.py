@@ -0,0 +1,77 @@
+import math
+import random
+
+import build_czml as bc
+
+TOLERANCES = (5, 25, 100)
+
+
+def circle(n, radius_m, noise_m, seed=0):
+    """A closed, noisy ring of n vertices around Manchester, as [lon, lat] pairs."""
+    rng = random.Random(seed)
+    kx, ky = 111320 * math.cos(math.radians(53.48)), 110540
+    ring = []
+    for k in range(n):
+        angle = 2 * math.pi * k / n
+        r = radius_m + rng.uniform(-noise_m, noise_m)
+        ring.append([-2.24 + r * math.cos(angle) / kx, 53.48 + r * math.sin(angle) / ky])
+    return ring + [ring[0]]
+
+
+def positions(packet, kind):
+    flat = packet[kind]["positions"]["cartographicDegrees"]
+    return [flat[i:i + 2] for i in range(0, len(flat), 3)]
+
+
+def max_deviation(original, simplified):
+    """Farthest any original vertex lies from the simplified line, in local meters."""
+    kx, ky = 111320 * math.cos(math.radians(original[0][1])), 110540
+    line = [(x * kx, y * ky) for x, y in simplified]
+    worst = 0
+    for x, y in original:
+        px, py = x * kx, y * ky
+        nearest = math.inf
+        for (ax, ay), (bx, by) in zip(line, line[1:]):
+            dx, dy = bx - ax, by - ay
+            t = max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy or 1)))
+            nearest = min(nearest, math.hypot(px - ax - t * dx, py - ay - t * dy))
+        worst = max(worst, nearest)
+    return worst
+
+
+def test_polygon_levels():
+    ring = circle(400, 500, 3)
+    packet = bc.make_polygon_packet("he_0", "Park", ring, 0, 0, [0, 128, 0, 255], "1600-07-01T00:00:00Z/2100-07-01T00:00:00Z")
+    levels = bc.lod_packets(packet, TOLERANCES)
+
+    assert [level["id"] for level in levels] == ["he_0"] + [f"he_0~lod{n}" for n in range(1, len(levels))]
+    assert positions(levels[0], "polygon") == positions(packet, "polygon")
+    bands = [level["polygon"]["distanceDisplayCondition"]["distanceDisplayCondition"] for level in levels]
+    assert bands[0][0] == 0 and bands[-1][1] == 1e12
+    assert all(far == near for (_, far), (near, _) in zip(bands, bands[1:]))
+
+    counts = [len(positions(level, "polygon")) for level in levels]
+    assert counts == sorted(counts, reverse=True) and len(set(counts)) == len(counts)
+    for level, tolerance in zip(levels[1:], TOLERANCES):
+        coords = positions(level, "polygon")
+        assert coords[0] == coords[-1] and bc.ring_is_simple(coords)
+        assert all(c in ring for c in coords)  # a subset of the original vertices
+        assert max_deviation(ring, coords) <= tolerance
+
+
+def test_polyline_keeps_its_ends():
+    line = [[-2.25 + k * 1e-4, 53.48 + 2e-5 * math.sin(k)] for k in range(200)]
+    packet = bc.make_polyline_packet("osm_0", "Road", line, [0, 0, 0, 255], "1600-07-01T00:00:00Z/2100-07-01T00:00:00Z")
+    levels = bc.lod_packets(packet, TOLERANCES)
+    assert len(levels) > 1
+    for level in levels[1:]:
+        coords = positions(level, "polyline")
+        assert coords[0] == line[0] and coords[-1] == line[-1]
+        assert max_deviation(line, coords) <= TOLERANCES[-1]
+
+
+def test_small_shapes_are_left_alone():
+    square = [[-2.24, 53.48], [-2.2399, 53.48], [-2.2399, 53.4801], [-2.24, 53.4801], [-2.24, 53.48]]
+    packet = bc.make_polygon_packet("he_1", "Hut", square, 0, 0, [0, 0, 0, 255], "1600-07-01T00:00:00Z/2100-07-01T00:00:00Z")
+    assert bc.lod_packets(packet, TOLERANCES) == [packet]
+    assert not bc.ring_is_simple([[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]])  # a bow tie
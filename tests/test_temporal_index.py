@@ -0,0 +1,38 @@
+import json
+import random
+
+import build_czml as bc
+from temporal_index import TemporalIndex, TemporalIndexBuilder, availability_years, random_intervals
+
+
+def full_scan(entities, year):
+    """Entity numbers whose intervals cover `year`; None means always active."""
+    return sorted(n for n, years in enumerate(entities)
+                  if years is None or any(start <= year <= stop for start, stop in years))
+
+
+def test_matches_a_full_scan_every_year():
+    rng = random.Random(1)
+    starts, stops = random_intervals(1000, seed=1)
+    entities = [[(start, stop)] for start, stop in zip(starts, stops)]
+    entities += [[(rng.randint(0, 900), rng.randint(901, 1200)), (rng.randint(1300, 1500), 2100)] for _ in range(200)]
+    entities += [None] * 10
+    builder = TemporalIndexBuilder()
+    for n, years in enumerate(entities):
+        builder.add(f"e{n}", years and [bc.availability_interval(start, stop) for start, stop in years])
+    index = TemporalIndex(builder.to_bytes())
+
+    assert len(index) == len(entities)
+    for year in range(-5, 2106):
+        assert sorted(index.active(year)) == full_scan(entities, year), year
+
+
+def test_build_writes_an_index_of_the_document(example_project):
+    bc.build_project(bc.parse_args(["--no-cache", "--time-index", "--coalesce", "intervals"]))
+    packets = json.loads(bc.OUTPUT_FILE.read_text())[1:]
+    index = TemporalIndex.load(bc.TIME_INDEX_FILE)
+
+    entities = [availability_years(p["availability"]) if p.get("availability") else None for p in packets]
+    assert index.ids == [p["id"] for p in packets]
+    for year in range(0, 2101, 25):
+        assert sorted(index.active(year)) == full_scan(entities, year), year
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import rotate_map as rm
+
+BOUNDS = {"west": -2.30, "south": 53.45, "east": -2.20, "north": 53.51}
+
+
+@pytest.fixture
+def image(tmp_path):
+    """An opaque 600x400 gradient over BOUNDS with a red block at a known spot."""
+    y, x = np.mgrid[0:400, 0:600]
+    pixels = np.stack([x * 255 // 600, y * 255 // 400, np.full_like(x, 128), np.full_like(x, 255)], axis=2)
+    pixels[200:240, 300:360] = [255, 0, 0, 255]  # lon -2.25 to -2.24, lat 53.48 to 53.474
+    path = tmp_path / "map.png"
+    Image.fromarray(pixels.astype(np.uint8), "RGBA").save(path)
+    return path
+
+
+def tile_pixel(out_dir, zoom, lon, lat):
+    """The pixel of the written pyramid at (lon, lat)."""
+    fx, fy = rm.tile_x(lon, zoom), rm.tile_y(lat, zoom)
+    with Image.open(out_dir / str(zoom) / str(int(fx)) / f"{int(fy)}.png") as tile:
+        return tile.convert("RGBA").getpixel((int(fx % 1 * rm.TILE_SIZE), int(fy % 1 * rm.TILE_SIZE)))
+
+
+def test_tile_coordinates_round_trip():
+    assert (rm.tile_x(-180, 3), rm.tile_y(0, 3)) == (0, 4)
+    for zoom in (0, 5, 14):
+        for lon, lat in [(-2.25, 53.48), (151.2, -33.9), (0, 0)]:
+            assert rm.tile_lon(rm.tile_x(lon, zoom), zoom) == pytest.approx(lon, abs=1e-9)
+            assert rm.tile_lat(rm.tile_y(lat, zoom), zoom) == pytest.approx(lat, abs=1e-9)
+
+
+def test_pyramid(image, tmp_path):
+    out = tmp_path / "tiles"
+    counts = rm.tile_map(str(image), BOUNDS, out)
+    low, high = rm.default_zooms((600, 400), BOUNDS)
+    assert sorted(counts) == list(range(low, high + 1))
+
+    # the deepest level has every tile over the bounds, and each overview the parents of those below
+    written = {zoom: {(int(p.parent.name), int(p.stem)) for p in (out / str(zoom)).glob("*/*.png")} for zoom in counts}
+    assert written[high] == set(rm.covering_tiles(BOUNDS, high))
+    for zoom in range(low, high):
+        assert written[zoom] == {(x // 2, y // 2) for x, y in written[zoom + 1]}
+    assert {zoom: len(tiles) for zoom, tiles in written.items()} == counts
+    assert len(written[low]) <= 4
+
+    # georeferenced: the red block is red at every level; off the map is transparent
+    for zoom in counts:
+        assert tile_pixel(out, zoom, -2.245, 53.477)[:3] == (255, 0, 0)
+    assert tile_pixel(out, high, -2.3005, 53.48)[3] == 0
+    assert tile_pixel(out, high, -2.2995, 53.48)[3] == 255
+
+    layer = rm.tiles_layer(out, BOUNDS, counts)
+    assert (layer["minimumLevel"], layer["maximumLevel"], layer["bounds"]) == (low, high, BOUNDS)
+    assert layer["url"].endswith("/tiles/{z}/{x}/{y}.png")
+
+
+def test_tiff_overviews_give_the_same_tiles(image, tmp_path):
+    tif = tmp_path / "map.tif"
+    rm.rotate_map(str(image), 0, str(tif))
+    zooms = (12, 14)
+    png_counts = rm.tile_map(str(image), BOUNDS, tmp_path / "from_png", zooms)
+    assert rm.tile_map(str(tif), BOUNDS, tmp_path / "from_tif", zooms) == png_counts
+    for path in (tmp_path / "from_png").rglob("*.png"):
+        with Image.open(path) as a, Image.open(tmp_path / "from_tif" / path.relative_to(tmp_path / "from_png")) as b:
+            assert np.abs(np.asarray(a, dtype=int) - np.asarray(b, dtype=int)).max() <= 1
@@ -0,0 +1,48 @@
+import json
+
+import build_czml as bc
+
+
+def build(*argv):
+    bc.build_project(bc.parse_args(["--no-cache", *argv]))
+
+
+def quadkey_cell(key, bounds):
+    """The (west, south, east, north) cell a quadkey names within the root bounds."""
+    w, s, e, n = bounds["west"], bounds["south"], bounds["east"], bounds["north"]
+    for digit in map(int, key):
+        mx, my = (w + e) / 2, (s + n) / 2
+        w, e = (mx, e) if digit & 1 else (w, mx)
+        s, n = (s, my) if digit & 2 else (my, n)
+    return [w, s, e, n]
+
+
+def test_tiles_split_the_single_file(synthetic_project):
+    build()
+    document, *packets = json.loads(bc.OUTPUT_FILE.read_text())
+    build("--tiles", "200")
+    index = json.loads((bc.TILE_DIR / "index.json").read_text())
+    assert index["bounds"] == json.loads(bc.PROJECT_FILE.read_text())["bounds"]
+
+    tiled = []
+    for tile in index["tiles"]:
+        head, *items = json.loads((bc.TILE_DIR / tile["url"]).read_text())
+        assert head == document
+        assert 0 < len(items) == tile["entities"] <= 200
+        assert tile["bytes"] == (bc.TILE_DIR / tile["url"]).stat().st_size
+        assert tile["cell"] == quadkey_cell(tile["id"], index["bounds"])
+        west, south, east, north = tile["cell"]
+        for packet in items:
+            x0, y0, x1, y1, start, stop = bc.packet_extent(packet)
+            if x0 is not None:  # centres outside the root bounds go to the edge cells
+                x = min(max((x0 + x1) / 2, index["bounds"]["west"]), index["bounds"]["east"])
+                y = min(max((y0 + y1) / 2, index["bounds"]["south"]), index["bounds"]["north"])
+                assert west <= x <= east and south <= y <= north
+                assert tile["bbox"][0] <= x0 and tile["bbox"][1] <= y0
+                assert x1 <= tile["bbox"][2] and y1 <= tile["bbox"][3]
+            assert tile["start"] <= start and stop <= tile["stop"]
+        tiled += items
+
+    # every packet lands in exactly one tile
+    assert len(index["tiles"]) > 10
+    assert sorted(tiled, key=lambda p: p["id"]) == sorted(packets, key=lambda p: p["id"])
@@ -0,0 +1,123 @@
+import json
+import struct
+from array import array
+
+import build_czml as bc
+import tiles3d
+
+
+def read_b3dm(data):
+    """(feature table, batch table, glTF JSON, BIN chunk) of a b3dm."""
+    magic, version, length, ft_json, ft_bin, bt_json, bt_bin = struct.unpack_from("<4sIIIIII", data)
+    assert (magic, version, length) == (b"b3dm", 1, len(data))
+    pos = 28
+    feature_table = json.loads(data[pos:pos + ft_json])
+    pos += ft_json + ft_bin
+    batch_table = json.loads(data[pos:pos + bt_json])
+    pos += bt_json + bt_bin
+    glb = data[pos:]
+    magic, version, glb_length = struct.unpack_from("<4sII", glb)
+    assert (magic, version) == (b"glTF", 2) and glb_length <= len(glb)
+    json_length, = struct.unpack_from("<I", glb, 12)
+    gltf = json.loads(glb[20:20 + json_length])
+    bin_length, = struct.unpack_from("<I", glb, 20 + json_length)
+    body = glb[28 + json_length:28 + json_length + bin_length]
+    return feature_table, batch_table, gltf, body
+
+
+def accessor(gltf, body, index, typecode):
+    view = gltf["bufferViews"][gltf["accessors"][index]["bufferView"]]
+    values = array(typecode)
+    values.frombytes(body[view["byteOffset"]:view["byteOffset"] + view["byteLength"]])
+    return values
+
+
+def to_ecef(transform, x, y, z):
+    """A glTF (y-up) position through a column-major tile transform."""
+    east, north, up = x, -z, y  # undo (east, north, up) -> (east, up, -north)
+    m = transform
+    return tuple(m[12 + i] + east * m[i] + north * m[4 + i] + up * m[8 + i] for i in range(3))
+
+
+def packet(id, ring, height, extruded, availability="1600-07-01T00:00:00Z/1700-07-01T00:00:00Z"):
+    flat = [v for lon, lat in ring for v in (lon, lat, 0)]
+    return {"id": id, "name": id.title(), "availability": availability,
+            "polygon": {"positions": {"cartographicDegrees": flat}, "height": height, "extrudedHeight": extruded,
+                        "material": {"solidColor": {"color": {"rgba": [200, 180, 150, 255]}}}}}
+
+
+def square(lon, lat, size=0.0002):
+    return [(lon, lat), (lon + size, lat), (lon + size, lat + size), (lon, lat + size), (lon, lat)]
+
+
+def test_b3dm_round_trip_keeps_curvature(tmp_path):
+    # Two buildings ~40 km apart in one tile: flattening onto the tangent
+    # plane would put them tens of meters off the ellipsoid
+    features = [("west", "West", 1600, 1700, 0, 12, (200, 180, 150, 255), square(-2.63, 53.26)),
+                ("east", "East", 1650, 1700, 5, 20, (90, 90, 90, 128), square(-2.0, 53.62))]
+    writer = tiles3d.TilesetWriter(tmp_path, {"map_periods": {}})
+    child, region = writer.write_tile(tmp_path / "0.b3dm", features)
+    feature_table, batch_table, gltf, body = read_b3dm((tmp_path / "0.b3dm").read_bytes())
+
+    assert feature_table == {"BATCH_LENGTH": 2}
+    assert batch_table == {"id": ["west", "east"], "name": ["West", "East"], "start": [1600, 1650], "stop": [1700, 1700]}
+    assert len(gltf["meshes"][0]["primitives"]) == 2
+
+    expected = {name: [tiles3d.geodetic_to_ecef(lon, lat, h) for lon, lat in ring[:-1] for h in (bottom, top)]
+                for name, _, _, _, bottom, top, _, ring in features}
+    for primitive in gltf["meshes"][0]["primitives"]:
+        positions = accessor(gltf, body, primitive["attributes"]["POSITION"], "f")
+        batch_ids = accessor(gltf, body, primitive["attributes"]["_BATCHID"], "f")
+        for k, batch_id in enumerate(batch_ids):
+            point = to_ecef(child["transform"], *positions[3 * k:3 * k + 3])
+            nearest = min(sum((a - b) ** 2 for a, b in zip(point, target)) ** 0.5
+                          for target in expected[features[int(batch_id)][0]])
+            assert nearest < 0.01
+
+    assert region[4:] == [0, 20]
+    box = child["boundingVolume"]["box"]
+    assert box[3] > 20000 and box[7] > 20000
+
+
+def test_tileset_caps_tile_extent(tmp_path):
+    config = {"map_periods": {"p": {"start": 1600, "stop": 1700}}}
+    with tiles3d.TilesetWriter(tmp_path, config) as writer:
+        for i in range(20):
+            writer.write(packet(f"b{i}__p", square(-2.30 + 0.004 * i, 53.48), 0, 10))
+        writer.write(json.dumps(packet("late__p", square(-2.25, 53.47), 0, 10,
+                                       "1800-07-01T00:00:00Z/1900-07-01T00:00:00Z")))
+
+    tileset = json.loads((tmp_path / "p" / "tileset.json").read_text())
+    children = tileset["root"]["children"]
+    assert 2 <= len(children) <= 20
+    assert sum(read_b3dm((tmp_path / "p" / c["content"]["uri"]).read_bytes())[0]["BATCH_LENGTH"]
+               for c in children) == 20
+    for c in children:
+        box = c["boundingVolume"]["box"]
+        assert max(box[3], box[7]) <= tiles3d.TILE_MAX_EXTENT / 2 + 20
+    root = tileset["root"]["boundingVolume"]["region"]
+    assert root[4] <= tiles3d.TERRAIN_MIN_HEIGHT and root[5] >= tiles3d.TERRAIN_MAX_HEIGHT
+    assert json.loads((tmp_path / "layers.json").read_text())[0]["clampToGround"] is True
+
+
+def test_build_with_gapped_interval_packets(example_project):
+    # A decade with no map leaves a gap in every building standing across it
+    project = json.loads((example_project / "project.json").read_text())
+    periods = {period["id"]: period for period in project["mapPeriods"]}
+    periods["berry_1750"]["start"] = 1760
+    (example_project / "project.json").write_text(json.dumps(project))
+    bc.build_project(bc.parse_args(["--no-cache", "--3dtiles", "--coalesce", "intervals"]))
+
+    spans = {}
+    for period_id in ("berry_1650", "berry_1750"):
+        tileset = json.loads((bc.TILES3D_DIR / period_id / "tileset.json").read_text())
+        for child in tileset["root"]["children"]:
+            batch = read_b3dm((bc.TILES3D_DIR / period_id / child["content"]["uri"]).read_bytes())[1]
+            for id, start, stop in zip(batch["id"], batch["start"], batch["stop"]):
+                spans.setdefault(id, set()).add((period_id, start, stop))
+    # one packet per building, in the tilesets either side of the gap, spanning both
+    across = {id: found for id, found in spans.items() if len(found) == 2}
+    assert across
+    for id, found in across.items():
+        [(start, stop)] = {(start, stop) for _, start, stop in found}
+        assert "__" not in id and start <= 1749 and stop >= 1760
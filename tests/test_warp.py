@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import rotate_map as rm
+
+LON0, LAT0 = -2.25, 53.48
+
+
+def ground(x, y, angle=15, scale=(2.0, 2.0), shear=0.0):
+    """lon/lat of pixel (x, y) under a rotation, scale and shear in local metres about (1500, 1000)."""
+    kx, ky = rm.METERS_PER_DEGREE * math.cos(math.radians(LAT0)), rm.METERS_PER_DEGREE
+    t = math.radians(angle)
+    x, y = x - 1500, y - 1000
+    u, v = scale[0] * x + shear * y, -scale[1] * y  # pixel y runs down
+    east, north = u * math.cos(t) - v * math.sin(t), u * math.sin(t) + v * math.cos(t)
+    return LON0 + east / kx, LAT0 + north / ky
+
+
+def gcps_for(points, **transform):
+    return [(x, y, *ground(x, y, **transform)) for x, y in points]
+
+
+# A grid centred on (1500, 1000), so the GCPs' mean latitude, where fit_gcps
+# measures its metres, is LAT0
+POINTS = [(x, y) for y in (0, 1000, 2000) for x in (0, 1500, 3000)]
+
+
+@pytest.mark.parametrize("fit, transform", [
+    ("affine", {"angle": 15, "scale": (2.0, 1.5), "shear": 0.3}),
+    ("similarity", {"angle": -40, "scale": (0.8, 0.8)}),
+    ("affine", {"angle": -40, "scale": (0.8, 0.8)}),
+])
+def test_exact_gcps_fit_with_no_residual(fit, transform):
+    matrix, residuals = rm.fit_gcps(gcps_for(POINTS, **transform), fit)
+    assert max(abs(v) for residual in residuals for v in residual) < 1e-6
+    a, b, c, d, e, f = matrix
+    for x, y in [(0, 0), (1234.5, 678.9), (-100, 5000)]:
+        assert (a * x + b * y + c, d * x + e * y + f) == pytest.approx(ground(x, y, **transform), abs=1e-10)
+
+
+def test_residuals_report_the_misfit():
+    gcps = gcps_for(POINTS)
+    kx = rm.METERS_PER_DEGREE * math.cos(math.radians(LAT0))
+    x, y, lon, lat = gcps[4]
+    gcps[4] = (x, y, lon + 10 / kx, lat)  # the centre point 10 m east of where it should be
+    _, residuals = rm.fit_gcps(gcps)
+    # the grid centre has leverage 1/9: the fit moves 10/9 m towards it everywhere
+    expected = [(10 / 9, 0)] * 9
+    expected[4] = (10 / 9 - 10, 0)
+    assert residuals == [pytest.approx(residual, abs=1e-6) for residual in expected]
+
+
+def test_degenerate_gcps_are_rejected():
+    with pytest.raises(ValueError, match="at least 3"):
+        rm.fit_gcps(gcps_for(POINTS[:2]))
+    with pytest.raises(ValueError, match="degenerate"):
+        rm.fit_gcps(gcps_for([(0, 0), (100, 100), (200, 200), (300, 300)]))
+
+
+def test_north_up_gcps_warp_to_the_same_image(tmp_path):
+    rng = np.random.default_rng(2)
+    pixels = rng.integers(0, 256, (90, 120, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    Image.fromarray(pixels, "RGBA").save(tmp_path / "scan.png")
+    res = 1e-4
+    gcps = [(x, y, LON0 + x * res, LAT0 - y * res) for x, y in [(0, 0), (120, 0), (0, 90), (120, 90)]]
+
+    size, bounds = rm.warp_map(str(tmp_path / "scan.png"), gcps, str(tmp_path / "out.png"))
+    assert size == (120, 90)
+    assert bounds == pytest.approx({"west": LON0, "south": LAT0 - 90 * res, "east": LON0 + 120 * res, "north": LAT0})
+    with Image.open(tmp_path / "out.png") as warped:
+        assert np.abs(np.asarray(warped, dtype=int) - pixels).max() <= 1
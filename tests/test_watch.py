@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import build_czml as bc
+
+
+def edit_building(project):
+    path = project / "buildings" / "ordsall_hall.json"
+    building = json.loads(path.read_text())
+    building["entities"][0]["extrudedHeight"] += 1
+    path.write_text(json.dumps(building))
+
+
+def fresh_build():
+    bc.build_project(bc.parse_args(["--no-cache"]))
+    return bc.OUTPUT_FILE.read_text()
+
+
+def test_resident_rebuild_regenerates_only_the_change(example_project):
+    args = bc.parse_args([])
+    cache = bc.build_project(args, bc.ResidentCache)
+    on_disk = sorted(bc.CACHE_DIR.rglob("*"))
+    edit_building(example_project)
+
+    cache = bc.build_project(args, bc.ResidentCache, cache)
+    assert cache.summary["rebuilt"] == 1
+    rebuilt = bc.OUTPUT_FILE.read_text()
+    assert sorted(bc.CACHE_DIR.rglob("*")) == on_disk  # fragments stay in memory
+    assert rebuilt == fresh_build()
+
+
+def test_failed_build_keeps_the_baseline(example_project):
+    args = bc.parse_args([])
+    cache = bc.build_project(args, bc.ResidentCache)
+    project = (example_project / "project.json").read_text()
+    (example_project / "project.json").write_text("{")
+    with pytest.raises(ValueError):
+        bc.build_project(args, bc.ResidentCache, cache)
+    cache.rollback()
+
+    (example_project / "project.json").write_text(project)
+    edit_building(example_project)
+    cache = bc.build_project(args, bc.ResidentCache, cache)
+    assert cache.summary["rebuilt"] == 1
+    assert bc.OUTPUT_FILE.read_text() == fresh_build()
+
+
+def test_watch_rebuilds_on_change(example_project, monkeypatch, capsys):
+    snapshot_files = bc.snapshot_files
+    calls = []
+
+    def snapshots():
+        calls.append(None)
+        if len(calls) == 2:  # the first poll sees an edit
+            edit_building(example_project)
+        elif len(calls) == 4:  # the poll after the rebuild
+            raise KeyboardInterrupt
+        return snapshot_files()
+
+    monkeypatch.setattr(bc, "snapshot_files", snapshots)
+    bc.watch(bc.parse_args([]))
+    log = capsys.readouterr().out
+    assert "ms (ordsall_hall.json)" in log and log.endswith("Stopped watching\n")
+    assert bc.OUTPUT_FILE.read_text() == fresh_build()